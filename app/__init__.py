@@ -5,7 +5,14 @@ __init__.py — инициализация Flask-приложения
 
 import os
 from flask import Flask, redirect, url_for, flash
-from app.db import init_db
+from app.db import init_db, engine, replica_engines
+from app.metrics import init_metrics
+from app.slow_queries import init_slow_query_log
+from app.profiling import init_profiling
+from app.jobs import init_jobs
+from app.migrations import migrate
+from app.services.partitions import ensure_partitions
+from app.services.outbox import init_outbox
 from app.gui import gui_bp
 from app.client_routes import client_bp
 from app.admin_routes import admin_bp
@@ -24,8 +31,28 @@ def create_app():
     app.config.from_object("app.config.Config")
     app.secret_key = "supersecret"  # нужен для flash-сообщений
 
-    # инициализация базы данных
+    # инициализация базы данных и миграции схемы
     init_db()
+    if app.config["MIGRATE_ON_STARTUP"]:
+        migrate(engine, log=app.logger.info)
+
+    # секции bookings/payments/transactions на месяцы вперёд (только PostgreSQL)
+    ensure_partitions(engine, app.config["PARTITION_MONTHS_AHEAD"])
+
+    # метрики запросов и SQL (/admin/metrics)
+    init_metrics(app, engine, replica_engines)
+
+    # журнал медленных SQL с планами (/admin/slow-queries)
+    init_slow_query_log(app, engine, replica_engines)
+
+    # профилирование отдельных запросов (/admin/profiles)
+    init_profiling(app)
+
+    # фоновые задачи: выгрузки, графики, импорт (/admin/jobs)
+    init_jobs(app)
+
+    # события броней для внешних систем: публикация и вебхуки (/admin/events)
+    init_outbox(app)
 
     # регистрация blueprints
     app.register_blueprint(gui_bp)
@@ -2,29 +2,102 @@
 """
 admin_routes.py — маршруты для администратора:
 - просмотр всех данных (bookings, payments, transactions)
-- экспорт в JSON/CSV
+- экспорт в JSON/CSV (с ETag/304 и сжатием gzip)
 - запуск анализа и построение графиков
+- метрики в формате Prometheus
+- журнал медленных SQL-запросов
+- профили запросов
+- массовый импорт клиентов
+- поиск и слияние дубликатов клиентов
+- фоновые задачи: выгрузки, графики, импорт
+- календарь занятости номеров
+- сезонные тарифы
 """
 
 import csv
-from flask import Blueprint, jsonify, render_template, request, Response, url_for
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from flask import (Blueprint, jsonify, render_template, request, Response, url_for, redirect, abort,
+                   flash, send_from_directory, make_response, current_app)
 from sqlalchemy.orm import Session
 
-from app.db import SessionLocal
-from app.models import Booking, Payment, Transaction
+from app.db import ReadSessionLocal, SessionLocal, engine, router, write_engine
+from app.models import Booking, Payment, Transaction, Category, RateRule
 from app.analysis import income_by_category, guests_by_month, top_rooms
+from app.metrics import render_metrics
+from app.slow_queries import slow_query_log
+from app.profiling import request_profiler
+from app.services.customer_import import FORMATS, import_customers
+from app.services.customer_dedupe import find_duplicates, merge_duplicates
+from app.services.table_versions import etag_for
+from app.services import job_tasks  # noqa: F401 — регистрирует виды задач
+from app.jobs import job_runner
+from app.services.occupancy import occupancy_grid, free_rooms
+from app.services.rate_calendar import parse_weekdays, rate_grid
+from app.services import outbox
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates")
 
 
+# -----------------------------
+# CONDITIONAL REQUESTS + GZIP
+# -----------------------------
+def _not_modified(etag: str):
+    """Ответ 304, если у клиента уже есть эта версия данных, иначе None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return None
+
+
+def _with_etag(response, etag: str):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _accepts_gzip() -> bool:
+    return "gzip" in request.accept_encodings
+
+
+def _gzip_stream(chunks):
+    """Сжимает поток строк на лету, не собирая файл целиком в памяти."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _csv_response(generate, filename: str, etag: str):
+    headers = {"Content-Disposition": f"attachment;filename={filename}", "Vary": "Accept-Encoding"}
+    if _accepts_gzip():
+        headers["Content-Encoding"] = "gzip"
+        response = Response(_gzip_stream(generate()), mimetype="text/csv", headers=headers)
+    else:
+        response = Response(generate(), mimetype="text/csv", headers=headers)
+    return _with_etag(response, etag)
+
+
 # -----------------------------
 # BOOKINGS JSON + CSV
 # -----------------------------
 @admin_bp.route("/bookings", methods=["GET"])
 def get_bookings():
     """Возвращает список всех бронирований (JSON)."""
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Booking)
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         bookings = session.query(Booking).all()
         result = []
         for b in bookings:
@@ -40,7 +113,7 @@ def get_bookings():
                 "status": b.status,
                 "created_at": b.created_at.isoformat() if b.created_at else None
             })
-        return render_template("bookings_json.html", bookings=result)
+        return _with_etag(make_response(render_template("bookings_json.html", bookings=result)), etag)
     finally:
         session.close()
 
@@ -48,8 +121,13 @@ def get_bookings():
 @admin_bp.route("/download/bookings.csv")
 def download_bookings_csv():
     """Выгрузка всех бронирований в CSV."""
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Booking, variant="gzip" if _accepts_gzip() else "")
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         rows = session.query(Booking).all()
         header = ["id", "room_id", "customer_id", "start_date", "end_date",
                   "guests_count", "total_amount", "final_amount", "status", "created_at"]
@@ -70,8 +148,7 @@ def download_bookings_csv():
                     str(b.created_at)
                 ]) + "\n"
 
-        return Response(generate(), mimetype="text/csv",
-                        headers={"Content-Disposition": "attachment;filename=bookings.csv"})
+        return _csv_response(generate, "bookings.csv", etag)
     finally:
         session.close()
 
@@ -82,8 +159,13 @@ def download_bookings_csv():
 @admin_bp.route("/payments", methods=["GET"])
 def get_payments():
     """Возвращает список всех платежей (JSON)."""
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Payment)
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         payments = session.query(Payment).all()
         result = []
         for p in payments:
@@ -95,7 +177,7 @@ def get_payments():
                 "status": p.status,
                 "payment_date": p.payment_date.isoformat() if p.payment_date else None
             })
-        return render_template("payments_json.html", payments=result)
+        return _with_etag(make_response(render_template("payments_json.html", payments=result)), etag)
     finally:
         session.close()
 
@@ -103,8 +185,13 @@ def get_payments():
 @admin_bp.route("/download/payments.csv")
 def download_payments_csv():
     """Выгрузка всех платежей в CSV."""
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Payment, variant="gzip" if _accepts_gzip() else "")
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         rows = session.query(Payment).all()
         header = ["id", "booking_id", "amount", "method", "status", "payment_date"]
 
@@ -120,8 +207,7 @@ def download_payments_csv():
                     str(p.payment_date)
                 ]) + "\n"
 
-        return Response(generate(), mimetype="text/csv",
-                        headers={"Content-Disposition": "attachment;filename=payments.csv"})
+        return _csv_response(generate, "payments.csv", etag)
     finally:
         session.close()
 
@@ -132,8 +218,13 @@ def download_payments_csv():
 @admin_bp.route("/transactions", methods=["GET"])
 def get_transactions():
     """Возвращает список всех транзакций (JSON)."""
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Transaction)
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         transactions = session.query(Transaction).all()
         result = []
         for t in transactions:
@@ -144,7 +235,7 @@ def get_transactions():
                 "type": t.type,
                 "transaction_date": t.transaction_date.isoformat() if t.transaction_date else None
             })
-        return render_template("transactions_json.html", transactions=result)
+        return _with_etag(make_response(render_template("transactions_json.html", transactions=result)), etag)
     finally:
         session.close()
 
@@ -152,8 +243,13 @@ def get_transactions():
 @admin_bp.route("/download/transactions.csv")
 def download_transactions_csv():
     """Выгрузка всех транзакций в CSV."""
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
+        etag = etag_for(session, Transaction, variant="gzip" if _accepts_gzip() else "")
+        cached = _not_modified(etag)
+        if cached is not None:
+            return cached
+
         rows = session.query(Transaction).all()
         header = ["id", "payment_id", "amount", "type", "transaction_date"]
 
@@ -168,8 +264,7 @@ def download_transactions_csv():
                     str(t.transaction_date)
                 ]) + "\n"
 
-        return Response(generate(), mimetype="text/csv",
-                        headers={"Content-Disposition": "attachment;filename=transactions.csv"})
+        return _csv_response(generate, "transactions.csv", etag)
     finally:
         session.close()
 
@@ -197,4 +292,433 @@ def admin_dashboard():
         top_plot=top_plot,
         start_date=start_date or "",
         end_date=end_date or ""
-    )
\ No newline at end of file
+    )
+
+
+# -----------------------------
+# METRICS (PROMETHEUS)
+# -----------------------------
+@admin_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Метрики запросов, SQL и пула соединений в текстовом формате Prometheus."""
+    return Response(render_metrics(engine), mimetype="text/plain; version=0.0.4")
+
+
+# -----------------------------
+# READ REPLICAS
+# -----------------------------
+@admin_bp.route("/replicas", methods=["GET"])
+def replicas():
+    """Реплики для чтения: отставание и доступность (JSON)."""
+    return jsonify({
+        "max_lag_seconds": router.max_lag,
+        "replicas": router.status(),
+    })
+
+
+# -----------------------------
+# SLOW QUERIES
+# -----------------------------
+@admin_bp.route("/slow-queries", methods=["GET"])
+def slow_queries():
+    """Медленные SQL-запросы: текст, параметры (без значений), маршрут, план."""
+    return render_template(
+        "admin_slow_queries.html",
+        entries=slow_query_log.snapshot(),
+        threshold_ms=slow_query_log.threshold * 1000,
+    )
+
+
+@admin_bp.route("/slow-queries/<int:entry_id>/explain", methods=["POST"])
+def slow_query_explain(entry_id):
+    """Снимает план для записи журнала по требованию."""
+    if slow_query_log.explain(entry_id) is None:
+        abort(404)
+    return redirect(url_for("admin.slow_queries") + f"#q{entry_id}")
+
+
+
+# -----------------------------
+# PROFILES
+# -----------------------------
+@admin_bp.route("/profiles", methods=["GET"])
+def profiles():
+    """Список снятых профилей и доля случайной выборки."""
+    return render_template(
+        "admin_profiles.html",
+        files=request_profiler.list_files(),
+        sample_rate=request_profiler.sample_rate,
+        mode=request_profiler.default_mode,
+    )
+
+
+@admin_bp.route("/profiles/settings", methods=["POST"])
+def profile_settings():
+    """Меняет долю профилируемых запросов и режим без перезапуска."""
+    try:
+        rate = float(request.form.get("sample_rate", "0"))
+    except ValueError:
+        rate = -1
+    if not 0 <= rate <= 1:
+        flash("Доля выборки должна быть числом от 0 до 1.", "error")
+        return redirect(url_for("admin.profiles"))
+    request_profiler.sample_rate = rate
+    if request.form.get("mode") in ("sample", "cprofile"):
+        request_profiler.default_mode = request.form["mode"]
+    flash("Настройки профилирования сохранены.", "success")
+    return redirect(url_for("admin.profiles"))
+
+
+@admin_bp.route("/profiles/<path:name>", methods=["GET"])
+def profile_download(name):
+    """Скачивание файла профиля (.collapsed или .prof)."""
+    if name not in {f["name"] for f in request_profiler.list_files()}:
+        abort(404)
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
+
+
+
+# -----------------------------
+# CUSTOMERS IMPORT
+# -----------------------------
+@admin_bp.route("/customers/import", methods=["GET", "POST"])
+def customers_import():
+    """Загрузка CSV/JSONL с клиентами: проверка, удаление дубликатов, вставка пачками."""
+    if request.method == "GET":
+        return render_template("admin_import.html", report=None)
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Выберите файл для импорта.", "error")
+        return redirect(url_for("admin.customers_import"))
+
+    fmt = request.form.get("format")
+    if fmt not in FORMATS:
+        fmt = "jsonl" if os.path.splitext(upload.filename)[1].lower() in (".jsonl", ".ndjson") else "csv"
+    dry_run = request.form.get("dry_run") == "yes"
+
+    if request.form.get("background") == "yes":
+        filename = "upload.jsonl" if fmt == "jsonl" else "upload.csv"
+        job_id = job_runner.create("import", {"format": fmt, "dry_run": dry_run, "filename": filename})
+        upload.save(os.path.join(job_runner.job_dir(job_id), filename))
+        job_runner.start(job_id)
+        flash(f"Импорт поставлен в очередь: задача №{job_id}.", "info")
+        return redirect(url_for("admin.jobs"))
+
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    try:
+        report = import_customers(stream, fmt, dry_run=dry_run)
+    except Exception as e:
+        flash(f"Ошибка импорта: {e}", "error")
+        return redirect(url_for("admin.customers_import"))
+    return render_template("admin_import.html", report=report)
+
+
+# -----------------------------
+# CUSTOMER DUPLICATES
+# -----------------------------
+@admin_bp.route("/customers/duplicates", methods=["GET"])
+def customer_duplicates():
+    """Группы вероятных дубликатов клиентов (JSON); ?fuzzy=1 — нечёткий режим."""
+    session: Session = ReadSessionLocal()
+    try:
+        groups = find_duplicates(session, fuzzy=request.args.get("fuzzy") == "1")
+        return jsonify({"groups": [group.as_dict() for group in groups]})
+    finally:
+        session.close()
+
+
+@admin_bp.route("/customers/duplicates/merge", methods=["POST"])
+def customer_duplicates_merge():
+    """Сливает найденные группы: брони переносятся на основную запись."""
+    session: Session = SessionLocal()
+    try:
+        groups = find_duplicates(session)
+    finally:
+        session.close()
+    # поиск долгий и только читает; слияние — отдельной пишущей транзакцией
+    session = SessionLocal(bind=write_engine)
+    try:
+        return jsonify(merge_duplicates(session, groups))
+    finally:
+        session.close()
+
+
+# -----------------------------
+# BACKGROUND JOBS
+# -----------------------------
+def _wants_json() -> bool:
+    return request.is_json or request.accept_mimetypes.best == "application/json"
+
+
+@admin_bp.route("/jobs", methods=["GET"])
+def jobs():
+    """Список фоновых задач и формы запуска."""
+    if _wants_json():
+        return jsonify({"jobs": job_runner.recent()})
+    return render_template("admin_jobs.html", jobs=job_runner.recent(), tables=sorted(job_tasks.EXPORTS))
+
+
+@admin_bp.route("/jobs", methods=["POST"])
+def job_submit():
+    """
+    Ставит задачу в очередь и сразу отвечает: 202 + ссылка на статус (JSON)
+    или перенаправление на список задач (форма).
+    """
+    data = request.get_json(silent=True) or request.form
+    kind = data.get("kind")
+    if kind == "export":
+        params = {"table": data.get("table")}
+        if params["table"] not in job_tasks.EXPORTS:
+            abort(400, "Неизвестная таблица")
+    elif kind == "dashboard":
+        params = {"start_date": data.get("start_date") or "", "end_date": data.get("end_date") or ""}
+    else:
+        abort(400, "Неизвестный вид задачи")
+
+    job_id = job_runner.submit(kind, params)
+    if _wants_json():
+        status_url = url_for("admin.job_status", job_id=job_id)
+        return jsonify({"id": job_id, "status_url": status_url}), 202, {"Location": status_url}
+    flash(f"Задача №{job_id} поставлена в очередь.", "info")
+    return redirect(url_for("admin.jobs"))
+
+
+@admin_bp.route("/jobs/<int:job_id>", methods=["GET"])
+def job_status(job_id):
+    """Статус и прогресс задачи (JSON)."""
+    job = job_runner.get(job_id)
+    if job is None:
+        abort(404)
+    if job["status"] == "done" and job["artifact"]:
+        job["download_url"] = url_for("admin.job_download", job_id=job_id)
+    return jsonify(job)
+
+
+@admin_bp.route("/jobs/<int:job_id>/download", methods=["GET"])
+def job_download(job_id):
+    """Файл-результат задачи."""
+    path = job_runner.artifact_path(job_id)
+    if path is None:
+        abort(404)
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
+
+
+@admin_bp.route("/jobs/<int:job_id>/files/<name>", methods=["GET"])
+def job_file(job_id, name):
+    """Отдельный файл задачи (например, график из расчёта дашборда)."""
+    path = job_runner.artifact_path(job_id, name)
+    if path is None:
+        abort(404)
+    return send_from_directory(os.path.dirname(path), name)
+
+
+@admin_bp.route("/jobs/<int:job_id>/dashboard", methods=["GET"])
+def job_dashboard(job_id):
+    """Дашборд, рассчитанный фоновой задачей."""
+    path = job_runner.artifact_path(job_id, "dashboard.json")
+    if path is None:
+        abort(404)
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    plots = result.pop("plots")
+    return render_template(
+        "admin_dashboard.html",
+        job_id=job_id,
+        income_plot=plots.get("income"),
+        guests_plot=plots.get("guests"),
+        top_plot=plots.get("top"),
+        **result
+    )
+
+
+# -----------------------------
+# OCCUPANCY CALENDAR
+# -----------------------------
+MAX_OCCUPANCY_DAYS = 366
+
+
+def _occupancy_args():
+    """start (ГГГГ-ММ-ДД, по умолчанию сегодня), days, rooms=1,2,3."""
+    start_raw = request.args.get("start")
+    start = datetime.strptime(start_raw, "%Y-%m-%d").date() if start_raw else date.today()
+    days = int(request.args.get("days", 90))
+    if not 1 <= days <= MAX_OCCUPANCY_DAYS:
+        raise ValueError(f"days должно быть от 1 до {MAX_OCCUPANCY_DAYS}")
+    rooms_raw = request.args.get("rooms")
+    room_ids = [int(x) for x in rooms_raw.split(",") if x.strip()] if rooms_raw else None
+    return start, days, room_ids
+
+
+@admin_bp.route("/occupancy", methods=["GET"])
+def occupancy():
+    """Занятость номеров × дней (JSON): 0 — свободно, 1 — создана, 2 — оплачена."""
+    try:
+        start, days, room_ids = _occupancy_args()
+        return jsonify(occupancy_grid(start, days, room_ids))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@admin_bp.route("/occupancy/free", methods=["GET"])
+def occupancy_free():
+    """Номера и дни заезда, когда номер свободен nights ночей подряд (JSON)."""
+    try:
+        start, days, room_ids = _occupancy_args()
+        nights = int(request.args.get("nights", 1))
+        if nights < 1:
+            raise ValueError("nights должно быть положительным")
+        return jsonify(free_rooms(start, days, nights, room_ids))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@admin_bp.route("/occupancy/grid", methods=["GET"])
+def occupancy_page():
+    """Сетка занятости для стойки регистрации."""
+    try:
+        start, days, room_ids = _occupancy_args()
+        grid = occupancy_grid(start, days, room_ids)
+    except ValueError as e:
+        flash(str(e), "error")
+        start, days = date.today(), 90
+        grid = occupancy_grid(start, days)
+    return render_template("admin_occupancy.html", grid=grid, start=start.isoformat(), days=days)
+
+
+# -----------------------------
+# RATE RULES
+# -----------------------------
+def _rate_rule_from(data) -> RateRule:
+    start_date = datetime.strptime(data.get("start_date") or "", "%Y-%m-%d").date()
+    end_date = datetime.strptime(data.get("end_date") or "", "%Y-%m-%d").date()
+    if end_date <= start_date:
+        raise ValueError("Дата окончания должна быть позже даты начала")
+    multiplier = float(data.get("multiplier") or 0)
+    if multiplier <= 0:
+        raise ValueError("Коэффициент должен быть положительным")
+    weekdays = parse_weekdays(data.get("weekdays"))
+    return RateRule(
+        name=(data.get("name") or "").strip() or "Сезон",
+        category_id=int(data["category_id"]) if data.get("category_id") else None,
+        start_date=start_date,
+        end_date=end_date,
+        weekdays=",".join(map(str, weekdays)) or None,
+        multiplier=multiplier,
+    )
+
+
+@admin_bp.route("/rates", methods=["GET"])
+def rates():
+    """Сезонные правила и тарифная сетка по категориям (HTML или JSON)."""
+    session: Session = SessionLocal()
+    try:
+        start_raw = request.args.get("start")
+        start = datetime.strptime(start_raw, "%Y-%m-%d").date() if start_raw else date.today()
+        days = min(max(int(request.args.get("days", 30)), 1), MAX_OCCUPANCY_DAYS)
+        grid = rate_grid(session, start, days)
+        rules = session.query(RateRule).order_by(RateRule.start_date, RateRule.id).all()
+        if _wants_json():
+            grid["rules"] = [
+                {"id": r.id, "name": r.name, "category_id": r.category_id,
+                 "start_date": r.start_date.isoformat(), "end_date": r.end_date.isoformat(),
+                 "weekdays": r.weekdays, "multiplier": r.multiplier}
+                for r in rules
+            ]
+            return jsonify(grid)
+        categories = session.query(Category.id, Category.name).order_by(Category.id).all()
+        return render_template("admin_rates.html", grid=grid, rules=rules, categories=categories,
+                               start=start.isoformat(), days=days)
+    finally:
+        session.close()
+
+
+@admin_bp.route("/rates", methods=["POST"])
+def rate_create():
+    """Добавляет сезонное правило (форма или JSON)."""
+    data = request.get_json(silent=True) or request.form
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        rule = _rate_rule_from(data)
+        session.add(rule)
+        session.commit()
+        rule_id = rule.id
+    except (ValueError, KeyError) as e:
+        session.rollback()
+        if _wants_json():
+            return jsonify({"error": str(e)}), 400
+        flash(f"Ошибка: {e}", "error")
+        return redirect(url_for("admin.rates"))
+    finally:
+        session.close()
+
+    if _wants_json():
+        return jsonify({"id": rule_id}), 201
+    flash(f"Правило №{rule_id} добавлено.", "info")
+    return redirect(url_for("admin.rates"))
+
+
+@admin_bp.route("/rates/<int:rule_id>/delete", methods=["POST"])
+def rate_delete(rule_id):
+    """Удаляет сезонное правило."""
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        rule = session.get(RateRule, rule_id)
+        if rule is None:
+            abort(404)
+        session.delete(rule)
+        session.commit()
+    finally:
+        session.close()
+    if _wants_json():
+        return jsonify({"deleted": rule_id})
+    flash(f"Правило №{rule_id} удалено.", "info")
+    return redirect(url_for("admin.rates"))
+
+
+# -----------------------------
+# BOOKING EVENTS (OUTBOX)
+# -----------------------------
+@admin_bp.route("/events", methods=["GET"])
+def events():
+    """
+    События броней по порядку (JSON): ?after=<курсор>&limit=N&type=booking.paid,...
+    Ответ — события с seq > after и cursor для следующего запроса; если
+    has_more, следующая пачка уже готова.
+    """
+    try:
+        after = int(request.args.get("after", 0))
+        limit = int(request.args.get("limit", 100))
+        if not 1 <= limit <= current_app.config["OUTBOX_PULL_LIMIT"]:
+            raise ValueError(f"limit должно быть от 1 до {current_app.config['OUTBOX_PULL_LIMIT']}")
+        types = [t.strip() for t in request.args.get("type", "").split(",") if t.strip()]
+        unknown = sorted(set(types) - set(outbox.EVENT_TYPES))
+        if unknown:
+            raise ValueError(f"Неизвестные типы: {', '.join(unknown)}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session: Session = ReadSessionLocal()
+    try:
+        # сначала граница потока, потом события до неё: опубликованное между
+        # двумя запросами не проскочит мимо курсора
+        head = outbox.last_seq(session)
+        # на одно больше, чтобы знать, есть ли продолжение
+        batch = outbox.read_events(session, after=after, upto=head, limit=limit + 1, types=types)
+    finally:
+        session.close()
+
+    has_more = len(batch) > limit
+    batch = batch[:limit]
+    if has_more:
+        cursor = batch[-1]["seq"]
+    else:
+        # всё до head прочитано (с фильтром — в том числе пропущенные типы)
+        cursor = max(head, after)
+    return jsonify({"events": batch, "cursor": cursor, "has_more": has_more})
+
+
+@admin_bp.route("/events/consumers", methods=["GET"])
+def event_consumers():
+    """Подписчики-вебхуки: позиция, отставание, последняя ошибка (JSON)."""
+    return jsonify({"consumers": outbox.consumers_status()})
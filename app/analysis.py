@@ -12,8 +12,11 @@ matplotlib.use("Agg")  # использовать неблокирующий б
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sqlalchemy.orm import Session
-from app.db import SessionLocal
+from app.config import Config
+from app.db import ReadSessionLocal
 from app.models import Booking, Room, Category
+from app.services import snapshot
+from app.services.archive import read_archived
 
 # Абсолютный путь к папке static/plots
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # папка app
@@ -26,23 +29,49 @@ def _ensure_plots_dir():
         os.makedirs(PLOTS_DIR, exist_ok=True)
 
 
-def _load_bookings_df(session: Session) -> pd.DataFrame:
-    rows = (
-        session.query(
-            Booking.id,
-            Booking.room_id,
-            Booking.start_date,
-            Booking.end_date,
-            Booking.created_at,
-            Booking.guests_count,
-            Booking.final_amount,
-            Booking.status,
-        ).all()
+BOOKING_COLUMNS = [
+    "id", "room_id", "start_date", "end_date",
+    "created_at", "guests_count", "final_amount", "status"
+]
+
+
+def _load_bookings_df(session: Session, start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    Брони из базы и, если период задевает заархивированные месяцы, из архива
+    (services.archive). Границы периода — по дате заезда, включительно.
+    При ANALYTICS_SNAPSHOT — из колоночного снимка (services.snapshot).
+    """
+    if Config.ANALYTICS_SNAPSHOT:
+        return _prepare(snapshot.current(session).frame(start_date, end_date))
+
+    query = session.query(
+        Booking.id,
+        Booking.room_id,
+        Booking.start_date,
+        Booking.end_date,
+        Booking.created_at,
+        Booking.guests_count,
+        Booking.final_amount,
+        Booking.status,
     )
-    df = pd.DataFrame(rows, columns=[
-        "id", "room_id", "start_date", "end_date",
-        "created_at", "guests_count", "final_amount", "status"
-    ])
+    if start_date:
+        query = query.filter(Booking.start_date >= pd.to_datetime(start_date).date())
+    if end_date:
+        query = query.filter(Booking.start_date <= pd.to_datetime(end_date).date())
+    df = pd.DataFrame(query.all(), columns=BOOKING_COLUMNS)
+
+    archived = read_archived("bookings", start_date, end_date, columns=BOOKING_COLUMNS,
+                             exclude_ids=df["id"])
+    if not archived.empty:
+        if start_date:
+            archived = archived[pd.to_datetime(archived["start_date"]) >= pd.to_datetime(start_date)]
+        if end_date:
+            archived = archived[pd.to_datetime(archived["start_date"]) <= pd.to_datetime(end_date)]
+        df = pd.concat([df, archived], ignore_index=True) if not df.empty else archived.reset_index(drop=True)
+    return _prepare(df)
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
     df["start_date"] = pd.to_datetime(df["start_date"])
@@ -65,17 +94,12 @@ def _load_categories_df(session: Session) -> pd.DataFrame:
 def income_by_category(start_date=None, end_date=None):
     """Доходы по категориям за период"""
     _ensure_plots_dir()
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
-        bdf = _load_bookings_df(session)
+        bdf = _load_bookings_df(session, start_date, end_date)
         if bdf.empty:
             return pd.DataFrame(), None
 
-        if start_date:
-            bdf = bdf[bdf["start_date"] >= pd.to_datetime(start_date)]
-        if end_date:
-            bdf = bdf[bdf["start_date"] <= pd.to_datetime(end_date)]
-
         rdf = _load_rooms_df(session)
         cdf = _load_categories_df(session)
 
@@ -104,7 +128,7 @@ def income_by_category(start_date=None, end_date=None):
 def guests_by_month():
     """Количество гостей по месяцам"""
     _ensure_plots_dir()
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
         bdf = _load_bookings_df(session)
         if bdf.empty:
@@ -131,7 +155,7 @@ def guests_by_month():
 def top_rooms(limit=5):
     """Топ популярных номеров"""
     _ensure_plots_dir()
-    session: Session = SessionLocal()
+    session: Session = ReadSessionLocal()
     try:
         bdf = _load_bookings_df(session)
         if bdf.empty:
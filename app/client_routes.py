@@ -1,19 +1,18 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from sqlalchemy.orm import Session
 
 from app.db import SessionLocal
-from app.models import Room, Customer
-from app.services.booking_service import calculate_booking, create_booking
+from app.services.booking_service import (calculate_booking, create_booking, create_group_booking,
+                                          suggest_room, BookingConflictError)
+from app.services.room_assignment import assign_rooms
+from app.services.catalog_cache import booking_form_context
+from app.services.customer_search import search_customers
+from app.services.quote_service import issue_quote, load_quote
 
 client_bp = Blueprint("client", __name__)
 
-def _load_form_lists(session: Session):
-    rooms = session.query(Room).all()
-    customers = session.query(Customer).all()
-    return rooms, customers
-
 def _parse_dates(start: str, end: str):
     try:
         start_date = datetime.strptime(start, "%Y-%m-%d").date()
@@ -26,26 +25,34 @@ def _parse_dates(start: str, end: str):
 
 def _build_data(form):
     room_id = form.get("room_id")
+    category_id = form.get("category_id")
     start = form.get("start_date")
     end = form.get("end_date")
-    if not room_id or not start or not end:
+    if not (room_id or category_id) or not start or not end:
         return None, "Не хватает данных."
     start_date, end_date, err = _parse_dates(start, end)
     if err:
         return None, err
     nights = (end_date - start_date).days
     try:
-        return {
-            "room_id": int(room_id),
+        data = {
+            "room_id": int(room_id) if room_id else None,
+            # без конкретного номера — подберём свободный номер категории
+            "category_id": int(category_id) if category_id and not room_id else None,
             "nights": nights,
             "guests_count": int(form.get("guests_count", "1")),
             "lunch_count": int(form.get("lunch_count", "0")),
             "dinner_count": int(form.get("dinner_count", "0")),
             "start_date": start_date.strftime("%Y-%m-%d"),
             "end_date": end_date.strftime("%Y-%m-%d"),
-        }, None
-    except ValueError:
+        }
+    except (TypeError, ValueError):
         return None, "Некорректные числовые значения."
+    if data["guests_count"] <= 0:
+        return None, "Количество гостей должно быть больше 0."
+    if data["lunch_count"] < 0 or data["dinner_count"] < 0:
+        return None, "Количество обедов/ужинов не может быть отрицательным."
+    return data, None
 
 # -----------------------------
 # Форма брони
@@ -54,11 +61,22 @@ def _build_data(form):
 def client_booking_form():
     session: Session = SessionLocal()
     try:
-        rooms, customers = _load_form_lists(session)
-        return render_template("client_create.html", rooms=rooms, customers=customers)
+        return render_template("client_create.html", **booking_form_context(session))
     finally:
         session.close()
 
+# -----------------------------
+# Поиск клиента (подсказки в форме брони)
+# -----------------------------
+@client_bp.route("/customers/search", methods=["GET"])
+def client_customer_search():
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", "0")) or None
+    except ValueError:
+        limit = None
+    return jsonify({"results": search_customers(query, limit)})
+
 # -----------------------------
 # Первый шаг: показать расчёт и кнопку подтверждения
 # -----------------------------
@@ -92,22 +110,104 @@ def client_booking_preview():
             data["email"] = email
 
     try:
+        if data["category_id"]:
+            # предварительный номер для расчёта; при подтверждении, если его
+            # займут, create_booking подберёт другой той же категории
+            data["room_id"] = suggest_room(data)
         result = calculate_booking(data)
     except Exception as e:
         flash(f"Ошибка расчёта: {e}")
         return redirect(url_for("client.client_booking_form"))
 
-    return render_template("client_preview.html", data=data, result=result)
+    quote = issue_quote(data, result)
+    return render_template("client_preview.html", data=data, result=result, quote=quote)
 
 # -----------------------------
 # Второй шаг: подтверждение и сохранение
 # -----------------------------
 @client_bp.route("/booking/confirm", methods=["POST"])
 def client_booking_confirm():
-    data = dict(request.form)
     try:
-        result = create_booking(data)
+        data, quote = load_quote(request.form.get("quote"))
+        result = create_booking(data, quote=quote)
     except Exception as e:
         flash(f"Ошибка создания брони: {e}")
         return redirect(url_for("client.client_booking_form"))
-    return render_template("client_result.html", result=result)
\ No newline at end of file
+    return render_template("client_result.html", result=result)
+
+# -----------------------------
+# Групповая бронь (JSON API для туроператоров)
+# -----------------------------
+@client_bp.route("/booking/group", methods=["POST"])
+def client_group_booking():
+    """
+    Тело: {"customer_id": 1, "rooms": [{"room_id": 5, "start_date": "2025-07-01",
+    "end_date": "2025-07-05", "guests_count": 2, "lunch_count": 0, "dinner_count": 0}, ...]}.
+    Вместо room_id можно передать category_id — номер будет подобран.
+    201 — все брони созданы; 409 — часть номеров занята, не создано ничего.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        customer_id = int(payload.get("customer_id") or 0)
+    except (TypeError, ValueError):
+        customer_id = 0
+    rooms = payload.get("rooms")
+    if not customer_id or not isinstance(rooms, list):
+        return jsonify({"error": "Нужны customer_id и список rooms."}), 400
+
+    items = []
+    for i, room in enumerate(rooms):
+        if not isinstance(room, dict):
+            return jsonify({"error": f"rooms[{i}]: ожидается объект."}), 400
+        data, err = _build_data(room)
+        if err:
+            return jsonify({"error": f"rooms[{i}]: {err}"}), 400
+        if room.get("customer_id"):
+            try:
+                data["customer_id"] = int(room["customer_id"])
+            except (TypeError, ValueError):
+                return jsonify({"error": f"rooms[{i}]: некорректный customer_id."}), 400
+        items.append(data)
+
+    try:
+        result = create_group_booking(items, customer_id)
+    except BookingConflictError as e:
+        return jsonify({"error": str(e), "conflicts": e.conflicts}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 201
+
+
+# -----------------------------
+# Подбор номеров по категории (без создания броней)
+# -----------------------------
+@client_bp.route("/booking/assign", methods=["POST"])
+def client_assign_rooms():
+    """
+    Тело: {"requests": [{"category_id": 2, "guests_count": 2, "start_date": "2025-07-01",
+    "end_date": "2025-07-05"}, ...]}. Ответ: {"rooms": [room_id или null, ...]} в том же порядке.
+    """
+    payload = request.get_json(silent=True) or {}
+    raw = payload.get("requests")
+    if not isinstance(raw, list):
+        return jsonify({"error": "Нужен список requests."}), 400
+
+    requests_ = []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict) or not item.get("category_id"):
+            return jsonify({"error": f"requests[{i}]: нужен category_id."}), 400
+        start_date, end_date, err = _parse_dates(item.get("start_date"), item.get("end_date"))
+        if err:
+            return jsonify({"error": f"requests[{i}]: {err}"}), 400
+        try:
+            requests_.append({"category_id": int(item["category_id"]),
+                              "guests_count": int(item.get("guests_count", 1)),
+                              "start_date": start_date, "end_date": end_date})
+        except (TypeError, ValueError):
+            return jsonify({"error": f"requests[{i}]: некорректные числовые значения."}), 400
+
+    session: Session = SessionLocal()
+    try:
+        return jsonify({"rooms": assign_rooms(session, requests_)})
+    finally:
+        session.close()
@@ -1,13 +1,260 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from app.config import Config
 
+
+def _is_sqlite_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in (url.database or "")
+
+
+def _sqlite_engine_options(url):
+    """
+    Настройки движка для SQLite.
+    - файл: WAL, пул соединений (читатели не блокируют писателя), busy_timeout;
+    - память: одно соединение на процесс — база живёт, пока живёт
+      соединение, и все сессии видят одни и те же таблицы. Пул из одного
+      соединения без переполнения: фоновые потоки (диспетчер outbox, задачи)
+      ждут, пока сессия другого потока не вернёт соединение, а не вклиниваются
+      в её транзакцию. Поэтому in-memory режим — для тестов и бенчмарков.
+    """
+    connect_args = {
+        "check_same_thread": False,
+        "timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    }
+    if _is_sqlite_memory(url):
+        return url, {
+            "connect_args": connect_args,
+            "poolclass": QueuePool,
+            "pool_size": 1,
+            "max_overflow": 0,
+            "pool_timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+
+    directory = os.path.dirname(os.path.abspath(url.database))
+    os.makedirs(directory, exist_ok=True)
+    return url, {
+        "connect_args": connect_args,
+        "poolclass": QueuePool,
+        "pool_size": Config.SQLITE_POOL_SIZE,
+        "max_overflow": Config.SQLITE_MAX_OVERFLOW,
+        "pool_timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    }
+
+
+def _setup_sqlite(engine, memory: bool):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        # транзакциями управляет SQLAlchemy (см. _begin), а не драйвер pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        # pysqlite открывает транзакцию только перед DML, из-за чего чтение
+        # перед записью идёт вне транзакции. Явный BEGIN даёт ту же семантику,
+        # что и в PostgreSQL. Но в WAL транзакция, начатая с чтения, не может
+        # стать писателем, если кто-то успел закоммитить: «database is
+        # locked» сразу, без busy_timeout. Поэтому пишущие транзакции просят
+        # BEGIN IMMEDIATE (write_engine, services.room_locks) и берут
+        # блокировку записи в самом начале, дожидаясь её по busy_timeout.
+        mode = conn.get_execution_options().get("sqlite_begin")
+        conn.exec_driver_sql(f"BEGIN {mode}" if mode in ("IMMEDIATE", "EXCLUSIVE") else "BEGIN")
+
+
+def create_db_engine(uri: str):
+    """Создаёт движок для PostgreSQL или SQLite (файл / память)."""
+    url = make_url(uri)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url)
+
+    memory = _is_sqlite_memory(url)
+    url, options = _sqlite_engine_options(url)
+    sqlite_engine = create_engine(url, **options)
+    _setup_sqlite(sqlite_engine, memory)
+    return sqlite_engine
+
+
 # Создаём движок SQLAlchemy
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+engine = create_db_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+
+
+def _dispose_after_fork():
+    # дочерний процесс (воркер gunicorn, multiprocessing) не должен
+    # использовать сокеты родителя: старый пул забываем, не закрывая
+    # соединения, — ими продолжает пользоваться родитель
+    engine.dispose(close=False)
+    for replica in replica_engines:
+        replica.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
 
 # Создаём фабрику сессий
 SessionLocal = sessionmaker(bind=engine)
 
+# движок для сессий, которые пишут: SessionLocal(bind=write_engine). На SQLite
+# каждая их транзакция (и после commit) начинается с BEGIN IMMEDIATE, см. _begin;
+# пул и обработчики событий — общие с engine
+write_engine = engine.execution_options(sqlite_begin="IMMEDIATE")
+
+
+# -----------------------------
+# Реплики для чтения
+# -----------------------------
+class ReplicaRouter:
+    """
+    Выбор базы для тяжёлых чтений (админка, выгрузки, аналитика).
+
+    Отставание реплики измеряется по «пульсу»: процесс приложения раз в
+    REPLICA_HEARTBEAT_SECONDS записывает время в таблицу replica_heartbeat
+    основной базы, а на реплике оно видно с задержкой репликации:
+    lag = сейчас - beat_at на реплике. Так отставание видно и тогда, когда
+    других записей нет. Проверка кэшируется на REPLICA_CHECK_SECONDS.
+
+    Чтение идёт на реплики по кругу; реплика, отставшая больше
+    REPLICA_MAX_LAG_SECONDS или недоступная, пропускается, а если подходящих
+    нет — читаем из основной базы.
+    """
+
+    def __init__(self, primary, replicas, max_lag: float, check_interval: float,
+                 heartbeat_interval: float):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.lock = threading.Lock()
+        self.checks = {}            # индекс реплики → (время проверки, lag или None, ошибка)
+        self.turn = 0
+        self.heartbeat_pid = None
+
+    # -- пульс --
+    def beat(self):
+        with self.primary.begin() as conn:
+            now = time.time()
+            updated = conn.execute(text("UPDATE replica_heartbeat SET beat_at = :now WHERE id = 1"),
+                                   {"now": now}).rowcount
+            if not updated:
+                conn.execute(text("INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, :now)"),
+                             {"now": now})
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                self.beat()
+            except SQLAlchemyError:
+                pass  # основная база недоступна — реплики просто начнут «отставать»
+            time.sleep(self.heartbeat_interval)
+
+    def _ensure_heartbeat(self):
+        # поток не переживает fork: в каждом процессе запускаем свой
+        if self.heartbeat_pid == os.getpid():
+            return
+        with self.lock:
+            if self.heartbeat_pid == os.getpid():
+                return
+            self.heartbeat_pid = os.getpid()
+            self.checks.clear()
+            threading.Thread(target=self._heartbeat_loop, name="replica-heartbeat", daemon=True).start()
+
+    # -- отставание --
+    def _measure(self, replica):
+        try:
+            with replica.connect() as conn:
+                beat_at = conn.execute(text("SELECT beat_at FROM replica_heartbeat WHERE id = 1")).scalar()
+        except SQLAlchemyError as e:
+            return None, str(e.__class__.__name__)
+        if beat_at is None:
+            return None, "нет пульса"
+        return max(time.time() - beat_at, 0.0), None
+
+    def lag(self, index: int):
+        with self.lock:
+            checked = self.checks.get(index)
+            if checked and time.monotonic() - checked[0] < self.check_interval:
+                return checked[1]
+        lag, error = self._measure(self.replicas[index])
+        with self.lock:
+            self.checks[index] = (time.monotonic(), lag, error)
+        return lag
+
+    # -- выбор --
+    def read_engine(self):
+        if not self.replicas:
+            return self.primary
+        self._ensure_heartbeat()
+        count = len(self.replicas)
+        with self.lock:
+            start = self.turn
+            self.turn = (self.turn + 1) % count
+        for step in range(count):
+            index = (start + step) % count
+            lag = self.lag(index)
+            if lag is not None and lag <= self.max_lag:
+                return self.replicas[index]
+        return self.primary
+
+    def status(self) -> list:
+        result = []
+        for index, replica in enumerate(self.replicas):
+            lag = self.lag(index)
+            error = self.checks.get(index, (0, None, None))[2]
+            result.append({
+                "replica": replica.url.render_as_string(hide_password=True),
+                "lag_seconds": None if lag is None else round(lag, 3),
+                "healthy": lag is not None and lag <= self.max_lag,
+                "error": error,
+            })
+        return result
+
+
+replica_engines = [create_db_engine(url) for url in Config.DATABASE_REPLICA_URLS]
+
+router = ReplicaRouter(
+    engine,
+    replica_engines,
+    max_lag=Config.REPLICA_MAX_LAG_SECONDS,
+    check_interval=Config.REPLICA_CHECK_SECONDS,
+    heartbeat_interval=Config.REPLICA_HEARTBEAT_SECONDS,
+)
+
+
+class ReadSession(Session):
+    """Сессия только для чтения: реплика или, если все отстают, основная база."""
+
+    def __init__(self, **kwargs):
+        if kwargs.get("bind") is None:
+            kwargs["bind"] = router.read_engine()
+        super().__init__(**kwargs)
+
+
+# фабрика сессий для админки, выгрузок и аналитики
+ReadSessionLocal = sessionmaker(class_=ReadSession)
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _forbid_writes(session, flush_context, instances):
+    raise RuntimeError("ReadSessionLocal — только для чтения, изменения пишутся через SessionLocal")
+
+
 # Базовый класс для моделей
 Base = declarative_base()
 
@@ -21,4 +268,4 @@ def init_db():
         Base.metadata.create_all(bind=engine)
         print("База данных инициализирована.")
     except Exception as e:
-        print(f"Ошибка инициализации базы данных: {e}")
\ No newline at end of file
+        print(f"Ошибка инициализации базы данных: {e}")
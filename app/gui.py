@@ -1,11 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from sqlalchemy.orm import Session
 from datetime import datetime, date
-import re
 
-from app.db import SessionLocal
+from app.db import SessionLocal, write_engine
 from app.models import Room, Customer, Booking, Payment
 from app.services.booking_service import calculate_booking, create_booking
+from app.services.catalog_cache import booking_form_context
+from app.services.outbox import record as record_event
+from app.validation import is_valid_phone, is_valid_email
 
 # Папка templates ожидается в корне проекта (../templates относительно app/)
 gui_bp = Blueprint("gui", __name__, template_folder="../templates")
@@ -21,12 +23,10 @@ def index():
 # -----------------------------
 @gui_bp.route("/client/booking/create", methods=["GET", "POST"])
 def gui_client_create():
-    session: Session = SessionLocal()
+    session: Session = SessionLocal(bind=write_engine)
     try:
         if request.method == "GET":
-            rooms = session.query(Room).all()
-            customers = session.query(Customer).all()
-            return render_template("client_create.html", rooms=rooms, customers=customers)
+            return render_template("client_create.html", **booking_form_context(session))
 
         data = request.form
 
@@ -35,11 +35,11 @@ def gui_client_create():
         email = data.get("email", "").strip()
         full_name = data.get("full_name", "").strip()
 
-        if not re.fullmatch(r"^\+?\d{10,15}$", phone):
+        if not is_valid_phone(phone):
             flash("Некорректный телефон. Разрешены только цифры и +, длина 10–15.", "error")
             return redirect(url_for("gui.gui_client_create"))
 
-        if not re.fullmatch(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", email):
+        if not is_valid_email(email):
             flash("Некорректный email.", "error")
             return redirect(url_for("gui.gui_client_create"))
 
@@ -145,7 +145,7 @@ def gui_client_calculate():
 # -----------------------------
 @gui_bp.route("/client/booking/pay", methods=["GET", "POST"])
 def gui_client_pay():
-    session: Session = SessionLocal()
+    session: Session = SessionLocal(bind=write_engine)
     try:
         if request.method == "GET":
             return render_template("client_pay.html")
@@ -172,6 +172,9 @@ def gui_client_pay():
         )
         booking.status = "paid"
         session.add(payment)
+        session.flush()
+        record_event(session, "booking.paid", booking, payment_id=payment.id,
+                     payment_amount=payment.amount, payment_method=method)
         session.commit()
 
         result = {"booking_id": booking_id, "payment_id": payment.id, "status": "paid"}
@@ -189,7 +192,7 @@ def gui_client_pay():
 # -----------------------------
 @gui_bp.route("/client/booking/cancel", methods=["GET", "POST"])
 def gui_client_cancel():
-    session: Session = SessionLocal()
+    session: Session = SessionLocal(bind=write_engine)
     try:
         if request.method == "GET":
             return render_template("client_cancel.html")
@@ -206,6 +209,7 @@ def gui_client_cancel():
 
         was_paid = booking.status == "paid"
         booking.status = "cancelled"
+        record_event(session, "booking.cancelled", booking, was_paid=was_paid)
         session.commit()
 
         msg = {"booking_id": booking_id, "status": "cancelled"}
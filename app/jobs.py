@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+jobs.py — фоновые задачи внутри процесса.
+
+Долгие операции (полная выгрузка CSV, построение графиков, импорт) не
+выполняются в обработчике запроса: запрос создаёт строку в таблице jobs и
+сразу отвечает, а задачу выполняет пул потоков процесса. Прогресс и статус
+пишутся в ту же таблицу, результат — в каталог Config.JOB_DIR/<id>/.
+
+Виды задач регистрируются декоратором @job_kind (см. app/services/job_tasks.py).
+Задачи, не обновлявшиеся дольше JOB_STALE_SECONDS (процесс был остановлен),
+при старте приложения помечаются как failed; задачи старше JOB_KEEP_DAYS
+удаляются вместе с файлами.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, write_engine
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "done", "failed")
+JOB_KINDS = {}
+
+# не чаще одной записи прогресса в БД за столько секунд
+PROGRESS_INTERVAL = 0.5
+
+
+def job_kind(name: str):
+    """Регистрирует обработчик вида задачи: handler(ctx, params) -> имя файла-результата или None."""
+    def decorator(handler):
+        JOB_KINDS[name] = handler
+        return handler
+    return decorator
+
+
+def _update(job_id: int, **values):
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        values["updated_at"] = datetime.now()
+        session.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+class JobContext:
+    """То, что видит обработчик задачи: каталог для файлов и отчёт о прогрессе."""
+
+    def __init__(self, job_id: int, directory: str):
+        self.job_id = job_id
+        self.directory = directory
+        self._reported_at = 0.0
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def progress(self, fraction: float, message: str = None, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._reported_at < PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        values = {"progress": max(0.0, min(1.0, fraction))}
+        if message is not None:
+            values["message"] = message
+        _update(self.job_id, **values)
+
+
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.directory = None
+        self.workers = 2
+        self.keep_days = 7
+        self.executor = None
+        self.lock = threading.Lock()
+
+    # -- пул потоков создаётся лениво: в воркерах gunicorn — уже после fork --
+    def _executor(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            return self.executor
+
+    def _reset_after_fork(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def job_dir(self, job_id: int) -> str:
+        return os.path.join(self.directory, str(job_id))
+
+    # -- постановка задачи --
+    def create(self, kind: str, params: dict = None) -> int:
+        """Создаёт строку задачи и её каталог, но не запускает (например, чтобы сохранить загруженный файл)."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Неизвестный вид задачи: {kind}")
+        session: Session = SessionLocal(bind=write_engine)
+        try:
+            now = datetime.now()
+            job = Job(kind=kind, params=json.dumps(params or {}, ensure_ascii=False),
+                      status="queued", progress=0.0, created_at=now, updated_at=now)
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        finally:
+            session.close()
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return job_id
+
+    def start(self, job_id: int):
+        self._executor().submit(self._run, job_id)
+
+    def submit(self, kind: str, params: dict = None) -> int:
+        job_id = self.create(kind, params)
+        self.start(job_id)
+        self.prune()
+        return job_id
+
+    # -- выполнение --
+    def _run(self, job_id: int):
+        with self.app.app_context():
+            session: Session = SessionLocal()
+            try:
+                job = session.get(Job, job_id)
+                kind, params = job.kind, json.loads(job.params or "{}")
+            finally:
+                session.close()
+
+            _update(job_id, status="running", started_at=datetime.now())
+            ctx = JobContext(job_id, self.job_dir(job_id))
+            try:
+                artifact = JOB_KINDS[kind](ctx, params)
+            except Exception as e:
+                logger.exception("Задача %s (%s) завершилась с ошибкой", job_id, kind)
+                _update(job_id, status="failed", error=f"{e}\n\n{traceback.format_exc()}",
+                        message=str(e), finished_at=datetime.now())
+                return
+            _update(job_id, status="done", progress=1.0, artifact=artifact, finished_at=datetime.now())
+
+    # -- чтение --
+    def get(self, job_id: int):
+        session: Session = SessionLocal()
+        try:
+            job = session.get(Job, job_id)
+            return as_dict(job) if job else None
+        finally:
+            session.close()
+
+    def recent(self, limit: int = 50) -> list:
+        session: Session = SessionLocal()
+        try:
+            return [as_dict(job) for job in session.query(Job).order_by(Job.id.desc()).limit(limit)]
+        finally:
+            session.close()
+
+    def artifact_path(self, job_id: int, name: str = None):
+        """Путь к файлу результата (или к другому файлу задачи), если он есть."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        name = name or job["artifact"]
+        if not name or os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.job_dir(job_id), name)
+        return path if os.path.isfile(path) else None
+
+    # -- обслуживание --
+    def fail_stale(self, stale_seconds: int):
+        """Помечает как failed задачи, брошенные остановленным процессом."""
+        session: Session = SessionLocal(bind=write_engine)
+        try:
+            deadline = datetime.now() - timedelta(seconds=stale_seconds)
+            count = (
+                session.query(Job)
+                .filter(Job.status.in_(("queued", "running")), Job.updated_at < deadline)
+                .update({"status": "failed", "message": "Прервана перезапуском сервера",
+                         "finished_at": datetime.now()}, synchronize_session=False)
+            )
+            session.commit()
+            if count:
+                logger.warning("Помечено зависших задач: %s", count)
+        finally:
+            session.close()
+
+    def prune(self):
+        """Удаляет завершённые задачи старше keep_days вместе с файлами."""
+        session: Session = SessionLocal(bind=write_engine)
+        try:
+            deadline = datetime.now() - timedelta(days=self.keep_days)
+            old = [
+                job_id for (job_id,) in
+                session.query(Job.id).filter(Job.status.in_(("done", "failed")), Job.created_at < deadline)
+            ]
+            if not old:
+                return
+            session.query(Job).filter(Job.id.in_(old)).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+        for job_id in old:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+
+def as_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": json.loads(job.params or "{}"),
+        "status": job.status,
+        "progress": round(job.progress or 0.0, 3),
+        "message": job.message,
+        "artifact": job.artifact,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(timespec="seconds") if job.created_at else None,
+        "started_at": job.started_at.isoformat(timespec="seconds") if job.started_at else None,
+        "finished_at": job.finished_at.isoformat(timespec="seconds") if job.finished_at else None,
+    }
+
+
+job_runner = JobRunner()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=job_runner._reset_after_fork)
+
+
+def init_jobs(app):
+    job_runner.app = app
+    job_runner.directory = app.config["JOB_DIR"]
+    job_runner.workers = app.config.get("JOB_WORKERS", 2)
+    job_runner.keep_days = app.config.get("JOB_KEEP_DAYS", 7)
+    os.makedirs(job_runner.directory, exist_ok=True)
+    job_runner.fail_stale(app.config.get("JOB_STALE_SECONDS", 600))
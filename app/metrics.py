@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py — метрики приложения в текстовом формате Prometheus.
+
+Что собирается:
+- время обработки запроса по эндпоинтам (гистограмма) и число ответов по статусам;
+- число SQL-запросов и суммарное время в БД на один HTTP-запрос;
+- ожидание соединения из пула SQLAlchemy;
+- подозрения на N+1: один и тот же SQL, выполненный в запросе много раз
+  с разными параметрами (например, ленивая загрузка r.category в цикле).
+
+Метрики хранятся в памяти процесса; при нескольких воркерах каждый отдаёт свои.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+# -----------------------------
+# Примитивы метрик
+# -----------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, (counts, total, count) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                plain = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{plain} {total:.6f}")
+                lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "hotel_http_request_duration_seconds", "Время обработки HTTP-запроса.",
+    LATENCY_BUCKETS, ("endpoint", "method"))
+REQUESTS_TOTAL = Counter(
+    "hotel_http_requests_total", "Число HTTP-ответов.", ("endpoint", "method", "status"))
+DB_STATEMENTS = Histogram(
+    "hotel_db_statements_per_request", "Число SQL-запросов на один HTTP-запрос.",
+    STATEMENT_BUCKETS, ("endpoint",))
+DB_TIME = Histogram(
+    "hotel_db_time_per_request_seconds", "Суммарное время SQL на один HTTP-запрос.",
+    LATENCY_BUCKETS, ("endpoint",))
+POOL_CHECKOUT_WAIT = Histogram(
+    "hotel_db_pool_checkout_wait_seconds", "Ожидание соединения из пула SQLAlchemy.",
+    POOL_WAIT_BUCKETS)
+N_PLUS_ONE = Counter(
+    "hotel_db_n_plus_one_total", "Запросы, в которых один SQL повторился подозрительно много раз.",
+    ("endpoint",))
+
+REGISTRY = [REQUEST_DURATION, REQUESTS_TOTAL, DB_STATEMENTS, DB_TIME, POOL_CHECKOUT_WAIT, N_PLUS_ONE]
+
+# движки, на которые уже навешаны слушатели (create_app может вызываться несколько раз)
+_instrumented_engines = set()
+
+
+# -----------------------------
+# SQLAlchemy
+# -----------------------------
+def _instrument_engine(engine):
+    if id(engine) in _instrumented_engines:
+        return
+    _instrumented_engines.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        if not has_request_context() or "metrics" not in g:
+            return
+        stats = g.metrics
+        stats["statements"] += 1
+        stats["db_time"] += elapsed
+        stats["by_statement"][statement] += 1
+
+    # У пула нет события «перед выдачей соединения», поэтому ожидание
+    # меряем вокруг engine.raw_connection — через него соединения берут и
+    # Connection, и Session. Обёртка висит на движке и переживает dispose().
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+def _pool_gauges(engine) -> list:
+    pool = engine.pool
+    lines = []
+    for name, method, help_text in (
+        ("hotel_db_pool_checked_out", "checkedout", "Соединения, выданные из пула."),
+        ("hotel_db_pool_size", "size", "Размер пула."),
+        ("hotel_db_pool_overflow", "overflow", "Соединения сверх размера пула."),
+    ):
+        if hasattr(pool, method):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {getattr(pool, method)()}"]
+    return lines
+
+
+# -----------------------------
+# Flask
+# -----------------------------
+def _endpoint() -> str:
+    return request.endpoint or "unmatched"
+
+
+def init_metrics(app, engine, replicas=()):
+    """Подключает сбор метрик к приложению и движкам БД (основная база и реплики)."""
+    _instrument_engine(engine)
+    for replica in replicas:
+        _instrument_engine(replica)
+    threshold = app.config.get("N_PLUS_ONE_THRESHOLD", 5)
+
+    @app.before_request
+    def _start_metrics():
+        g.metrics = {
+            "started": time.perf_counter(),
+            "statements": 0,
+            "db_time": 0.0,
+            "by_statement": defaultdict(int),
+        }
+
+    @app.after_request
+    def _remember_status(response):
+        stats = g.get("metrics")
+        if stats is not None:
+            stats["status"] = response.status_code
+        return response
+
+    # пишем в teardown: after_request не вызывается для необработанных
+    # исключений, а именно эти 500 метрикам важнее всего показать
+    @app.teardown_request
+    def _record_metrics(exc):
+        stats = g.pop("metrics", None)
+        if stats is None:
+            return
+        status = 500 if exc is not None else stats.get("status", 500)
+        endpoint = _endpoint()
+        REQUEST_DURATION.observe(time.perf_counter() - stats["started"], endpoint, request.method)
+        REQUESTS_TOTAL.inc(endpoint, request.method, status)
+        DB_STATEMENTS.observe(stats["statements"], endpoint)
+        DB_TIME.observe(stats["db_time"], endpoint)
+
+        for statement, count in stats["by_statement"].items():
+            if count >= threshold:
+                N_PLUS_ONE.inc(endpoint)
+                logger.warning("Возможный N+1 в %s: SQL выполнен %d раз: %s",
+                               endpoint, count, " ".join(statement.split())[:200])
+
+
+def render_metrics(engine) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _pool_gauges(engine)
+    return "\n".join(lines) + "\n"
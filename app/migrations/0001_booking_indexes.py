@@ -0,0 +1,25 @@
+# app/migrations/0001_booking_indexes.py
+"""
+Индексы под горячие запросы:
+- проверка занятости (room_id = ? AND start_date < ? AND end_date > ?
+  AND status IN ...) — составной индекс, запрос не читает саму таблицу;
+- брони клиента (слияние дубликатов, история);
+- соединения выгрузок и аналитики: payments → bookings, transactions → payments.
+"""
+
+from app.migrations import create_index
+
+# CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_bookings_room_dates", "bookings", ["room_id", "start_date", "end_date", "status"]),
+    ("ix_bookings_customer_id", "bookings", ["customer_id"]),
+    ("ix_payments_booking_id", "payments", ["booking_id"]),
+    ("ix_transactions_payment_id", "transactions", ["payment_id"]),
+]
+
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        create_index(connection, name, table, columns)
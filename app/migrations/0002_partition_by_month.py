@@ -0,0 +1,21 @@
+# app/migrations/0002_partition_by_month.py
+"""
+Помесячное секционирование bookings, payments и transactions (PostgreSQL),
+см. services.partitions. На SQLite секционирования нет — архивирование
+там просто удаляет перенесённые в архив строки.
+
+Таблицы переносятся в одной транзакции и на это время заблокированы:
+на большой базе миграцию стоит запускать в окно обслуживания
+(MIGRATE_ON_STARTUP=0, python migrate.py).
+"""
+
+from app.config import Config
+from app.services.partitions import PARTITION_KEYS, is_partitioned, partition_table
+
+
+def upgrade(connection):
+    if connection.dialect.name != "postgresql":
+        return
+    for table in PARTITION_KEYS:
+        if not is_partitioned(connection, table):
+            partition_table(connection, table, Config.PARTITION_MONTHS_AHEAD)
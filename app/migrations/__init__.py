@@ -0,0 +1,167 @@
+# app/migrations/__init__.py
+"""
+Версионные миграции схемы.
+
+init_db создаёт недостающие таблицы (create_all), но не меняет уже
+существующие: новые индексы, колонки и т.п. на рабочей базе добавляют
+миграции — модули этого пакета с именами вида 0001_описание.py:
+
+    TRANSACTIONAL = True      # False — выполнять вне транзакции (PostgreSQL)
+
+    def upgrade(connection):
+        ...
+
+Применённые версии записываются в таблицу schema_migrations. Миграции
+выполняются по возрастанию номера при старте приложения (MIGRATE_ON_STARTUP)
+или из консоли (python migrate.py). Чтобы несколько процессов, стартующих
+одновременно, не применяли одно и то же дважды, на PostgreSQL прогон идёт
+под advisory-блокировкой, а на SQLite каждая миграция применяется в
+транзакции BEGIN IMMEDIATE, которая сначала проверяет, не записана ли уже
+её версия.
+
+Миграции должны быть идемпотентны (IF NOT EXISTS): на новой базе create_all
+уже создал всё, что описано в моделях, и миграция только отмечается.
+"""
+
+import importlib
+import os
+import pkgutil
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.engine import Engine
+
+from app.models import SchemaMigration
+
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)$")
+
+# ключ advisory-блокировки прогона миграций
+LOCK_KEY = 7302
+
+migrations_table = SchemaMigration.__table__
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    module: object
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+
+def discover() -> list:
+    """Все миграции пакета по возрастанию версии."""
+    found = []
+    for info in pkgutil.iter_modules([os.path.dirname(__file__)]):
+        match = MIGRATION_RE.match(info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            found.append(Migration(int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda m: m.version)
+    versions = [m.version for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся номера миграций: {versions}")
+    return found
+
+
+def applied(engine: Engine) -> dict:
+    """Версия → время применения."""
+    migrations_table.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        rows = connection.execute(select(migrations_table.c.version, migrations_table.c.applied_at))
+        return {version: applied_at for version, applied_at in rows}
+
+
+def status(engine: Engine) -> list:
+    """[(версия, имя, время применения или None), ...]"""
+    done = applied(engine)
+    return [(m.version, m.name, done.get(m.version)) for m in discover()]
+
+
+def migrate(engine: Engine, target: int = None, log=print) -> list:
+    """Применяет недостающие миграции (до target включительно). Возвращает их версии."""
+    postgres = engine.dialect.name == "postgresql"
+    lock_connection = None
+    if postgres:
+        lock_connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+    try:
+        # список применённых читаем уже под блокировкой
+        done = applied(engine)
+        result = []
+        for migration in discover():
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            if _apply(engine, migration, postgres, log):
+                result.append(migration.version)
+        return result
+    finally:
+        if lock_connection is not None:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+            lock_connection.close()
+
+
+def _is_recorded(connection, version: int) -> bool:
+    return connection.execute(
+        select(migrations_table.c.version).where(migrations_table.c.version == version)
+    ).first() is not None
+
+
+def _apply(engine: Engine, migration: Migration, postgres: bool, log=print) -> bool:
+    """Применяет миграцию. False — её уже применил другой процесс."""
+    record = insert(migrations_table).values(
+        version=migration.version, name=migration.name, applied_at=datetime.now()
+    )
+    if not postgres:
+        # SQLite выполняет и CREATE INDEX, и ALTER TABLE в транзакции. BEGIN
+        # IMMEDIATE сразу берёт блокировку записи: параллельный процесс ждёт
+        # коммита и затем видит версию уже записанной
+        with engine.connect().execution_options(sqlite_begin="IMMEDIATE") as connection:
+            with connection.begin():
+                if _is_recorded(connection, migration.version):
+                    return False
+                log(f"Миграция {migration.version:04d}_{migration.name}…")
+                migration.module.upgrade(connection)
+                connection.execute(record)
+        return True
+
+    log(f"Миграция {migration.version:04d}_{migration.name}…")
+    if migration.transactional:
+        with engine.begin() as connection:
+            migration.module.upgrade(connection)
+            connection.execute(record)
+        return True
+
+    with engine.connect() as connection:
+        migration.module.upgrade(connection.execution_options(isolation_level="AUTOCOMMIT"))
+    with engine.begin() as connection:
+        connection.execute(record)
+    return True
+
+
+# -----------------------------
+# Помощники для миграций
+# -----------------------------
+def create_index(connection, name: str, table: str, columns: list):
+    """
+    CREATE INDEX IF NOT EXISTS; на PostgreSQL — CONCURRENTLY, без блокировки
+    записи в таблицу (соединение должно быть в AUTOCOMMIT: TRANSACTIONAL = False).
+    Недостроенный индекс, оставшийся от прерванного CONCURRENTLY, пересоздаётся.
+    """
+    column_list = ", ".join(columns)
+    if connection.dialect.name != "postgresql":
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+        return
+
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
@@ -1,9 +1,10 @@
 """
 SQLAlchemy модели для системы бронирования.
-Содержат сущности: категории, номера, клиенты, бронирования, платежи, транзакции.
+Содержат сущности: категории, номера, клиенты, бронирования, платежи, транзакции,
+сезонные правила тарифов, а также служебные таблицы (счётчики изменений, миграции, фоновые задачи).
 """
 
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Float, Text, Index
 from sqlalchemy.orm import relationship
 from app.db import Base
 
@@ -69,6 +70,11 @@ class Booking(Base):
     Бронирование: даты, питание, скидки, итоговая сумма, статус.
     """
     __tablename__ = "bookings"
+    __table_args__ = (
+        # проверка занятости: номер + пересечение дат + активный статус
+        Index("ix_bookings_room_dates", "room_id", "start_date", "end_date", "status"),
+        Index("ix_bookings_customer_id", "customer_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey("rooms.id"))
@@ -113,6 +119,7 @@ class Payment(Base):
     Платёж: сумма, дата, метод, статус.
     """
     __tablename__ = "payments"
+    __table_args__ = (Index("ix_payments_booking_id", "booking_id"),)
 
     id = Column(Integer, primary_key=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"))
@@ -139,6 +146,7 @@ class Transaction(Base):
     Транзакция: доход или возврат.
     """
     __tablename__ = "transactions"
+    __table_args__ = (Index("ix_transactions_payment_id", "payment_id"),)
 
     id = Column(Integer, primary_key=True)
     payment_id = Column(Integer, ForeignKey("payments.id"))
@@ -147,4 +155,133 @@ class Transaction(Base):
     transaction_date = Column(Date)
     type = Column(String)  # income | refund
 
-    payment = relationship("Payment", back_populates="transactions")
\ No newline at end of file
+    payment = relationship("Payment", back_populates="transactions")
+
+
+# -----------------------------
+# RATE RULE
+# -----------------------------
+class RateRule(Base):
+    """
+    Сезонное правило тарифа: в дни [start_date, end_date) цена номера
+    умножается на multiplier. category_id = NULL — для всех категорий,
+    weekdays — дни недели через запятую (0 — понедельник), NULL — все дни.
+    """
+    __tablename__ = "rate_rules"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    weekdays = Column(String)
+    multiplier = Column(Float, nullable=False)
+
+    category = relationship("Category")
+
+
+# -----------------------------
+# CHANGE COUNTER
+# -----------------------------
+class ChangeCounter(Base):
+    """
+    Счётчик изменений таблицы: растёт при каждом UPDATE/DELETE через ORM.
+    Вместе с max(id) даёт дешёвую версию данных для ETag.
+    """
+    __tablename__ = "change_counters"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# -----------------------------
+# REPLICA HEARTBEAT
+# -----------------------------
+class ReplicaHeartbeat(Base):
+    """
+    «Пульс» основной базы: время последней записи (unix-время). На реплике
+    по нему видно отставание репликации (см. db.ReplicaRouter).
+    """
+    __tablename__ = "replica_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(Float, nullable=False)
+
+
+# -----------------------------
+# OUTBOX
+# -----------------------------
+class OutboxEvent(Base):
+    """
+    Событие жизненного цикла брони (создана, оплачена, отменена) для внешних
+    систем. Пишется в той же транзакции, что и само изменение; seq —
+    порядковый номер в потоке, его присваивает диспетчер (services.outbox).
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        Index("ix_outbox_events_seq", "seq", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    seq = Column(Integer)                          # NULL — ещё не опубликовано
+    event_type = Column(String, nullable=False)    # booking.created | booking.paid | booking.cancelled
+    booking_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)         # JSON
+    created_at = Column(DateTime, nullable=False)
+    published_at = Column(DateTime)
+
+
+class OutboxConsumer(Base):
+    """
+    Подписчик-вебхук: до какого seq события доставлены, кто сейчас доставляет
+    (аренда до lease_until, unix-время) и последняя ошибка.
+    """
+    __tablename__ = "outbox_consumers"
+
+    name = Column(String, primary_key=True)
+    url = Column(String, nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String)
+    lease_until = Column(Float, nullable=False, default=0.0)
+    failures = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    delivered_at = Column(DateTime)
+
+
+# -----------------------------
+# SCHEMA MIGRATION
+# -----------------------------
+class SchemaMigration(Base):
+    """
+    Применённая миграция схемы (см. app/migrations).
+    """
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+
+
+# -----------------------------
+# JOB
+# -----------------------------
+class Job(Base):
+    """
+    Фоновая задача: вид, параметры, статус, прогресс, файл-результат.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)      # export | dashboard | import
+    params = Column(Text)                      # JSON
+    status = Column(String, nullable=False)    # queued | running | done | failed
+    progress = Column(Float, default=0.0)      # 0..1
+    message = Column(String)
+    artifact = Column(String)                  # имя файла в каталоге задачи
+    error = Column(Text)
+
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+profiling.py — профилирование отдельных запросов без передеплоя.
+
+Запрос профилируется, если:
+- передан заголовок X-Profile или параметр ?_profile= со значением
+  Config.PROFILE_TOKEN (без токена — только в режиме отладки);
+- или он попал в случайную выборку (доля задаётся Config.PROFILE_SAMPLE_RATE
+  и меняется на лету на странице /admin/profiles).
+
+Режимы (X-Profile-Mode / ?_profile_mode=):
+- sample   — семплирующий профайлер: стек потока запроса снимается каждые
+             PROFILE_SAMPLE_INTERVAL_MS мс, результат — collapsed stacks
+             (формат flamegraph.pl / speedscope);
+- cprofile — детерминированный cProfile, результат — дамп pstats.
+
+Файлы складываются в Config.PROFILE_DIR, хранятся последние PROFILE_KEEP штук.
+"""
+
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+MODES = ("sample", "cprofile")
+EXTENSIONS = {"sample": ".collapsed", "cprofile": ".prof"}
+
+
+class StackSampler:
+    """Периодически снимает стек одного потока и считает одинаковые стеки."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.directory = None
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self.keep = 50
+        self.default_mode = "sample"
+        self.lock = threading.Lock()
+
+    # -- решение, профилировать ли запрос --
+    def _requested_mode(self, app):
+        token = request.headers.get("X-Profile") or request.args.get("_profile")
+        mode = request.headers.get("X-Profile-Mode") or request.args.get("_profile_mode") or self.default_mode
+        if mode not in MODES:
+            mode = self.default_mode
+        if token:
+            expected = app.config.get("PROFILE_TOKEN")
+            if (expected and token == expected) or (not expected and app.debug):
+                return mode
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.default_mode
+        return None
+
+    # -- запуск / остановка --
+    def start(self, app):
+        if (request.endpoint or "").startswith("admin.profile") or request.endpoint == "static":
+            return
+        mode = self._requested_mode(app)
+        if mode is None:
+            return
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        g.profile = (mode, profiler, time.perf_counter())
+
+    def finish(self, response):
+        state = g.pop("profile", None)
+        if state is None:
+            return response
+        mode, profiler, started = state
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        endpoint = re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unmatched")
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{endpoint}_{elapsed_ms:.0f}ms{EXTENSIONS[mode]}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        if mode == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.collapsed())
+
+        self._prune()
+        response.headers["X-Profile-Id"] = name
+        return response
+
+    def discard(self):
+        """
+        Останавливает профайлер, если finish не вызывался: при исключении в
+        обработчике after_request пропускается, а поток семплера и cProfile
+        остались бы работать.
+        """
+        state = g.pop("profile", None)
+        if state is None:
+            return
+        mode, profiler, _ = state
+        if mode == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+
+    # -- файлы --
+    def _prune(self):
+        with self.lock:
+            files = self.list_files()
+            for item in files[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, item["name"]))
+                except OSError:
+                    pass
+
+    def list_files(self) -> list:
+        """Файлы профилей, новые сверху."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        files = []
+        for name in os.listdir(self.directory):
+            if os.path.splitext(name)[1] in EXTENSIONS.values():
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append({"name": name, "size": stat.st_size, "mtime": stat.st_mtime})
+        return sorted(files, key=lambda f: f["name"], reverse=True)
+
+
+request_profiler = RequestProfiler()
+
+
+def init_profiling(app):
+    request_profiler.directory = app.config["PROFILE_DIR"]
+    request_profiler.sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    request_profiler.interval = app.config.get("PROFILE_SAMPLE_INTERVAL_MS", 5) / 1000
+    request_profiler.keep = app.config.get("PROFILE_KEEP", 50)
+    request_profiler.default_mode = app.config.get("PROFILE_MODE", "sample")
+
+    @app.before_request
+    def _start_profile():
+        request_profiler.start(app)
+
+    @app.after_request
+    def _finish_profile(response):
+        return request_profiler.finish(response)
+
+    @app.teardown_request
+    def _discard_profile(exc):
+        request_profiler.discard()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+server.py — продакшн-режим: многопроцессный WSGI-сервер gunicorn.
+
+- SERVER_WORKERS процессов по SERVER_THREADS потоков (по умолчанию — по
+  процессу на ядро);
+- приложение загружается один раз в мастере (preload) и наследуется
+  воркерами через fork; пул соединений SQLAlchemy в каждом воркере
+  создаётся заново (см. app/db.py);
+- плавная замена воркеров: kill -HUP $(cat instance/server.pid) — мастер
+  запускает новых воркеров и останавливает старых, дожидаясь завершения
+  текущих запросов (до SERVER_GRACEFUL_TIMEOUT сек). Приложение и Config
+  загружены в мастере до fork, поэтому новые воркеры получают те же код и
+  настройки. Новый код и новые переменные окружения подхватываются только
+  заменой мастера: kill -USR2 <pid>, затем kill -QUIT <старый pid> (или
+  полным перезапуском).
+
+gunicorn не входит в обязательные зависимости и работает только в Linux/macOS:
+    pip install gunicorn
+"""
+
+import os
+
+from sqlalchemy.engine import make_url
+
+from app.config import Config
+from app.db import _is_sqlite_memory
+
+
+def _options(workers: int, threads: int, bind: str) -> dict:
+    pidfile = Config.SERVER_PIDFILE
+    if pidfile:
+        os.makedirs(os.path.dirname(os.path.abspath(pidfile)), exist_ok=True)
+    return {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "preload_app": True,
+        "timeout": Config.SERVER_TIMEOUT,
+        "graceful_timeout": Config.SERVER_GRACEFUL_TIMEOUT,
+        "max_requests": Config.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": Config.SERVER_MAX_REQUESTS // 10,
+        "pidfile": pidfile or None,
+        "accesslog": "-",
+        "post_fork": _post_fork,
+    }
+
+
+def _post_fork(server, worker):
+    # register_at_fork в app/db.py уже сбросил пул; здесь — только запись в лог
+    server.log.info("Воркер %s запущен, пул соединений БД создан заново", worker.pid)
+
+
+def serve(app, workers: int = None, threads: int = None, bind: str = None):
+    """Запускает app под gunicorn; блокирует до остановки мастера."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("Для продакшн-режима нужен gunicorn: pip install gunicorn")
+
+    workers = workers or Config.SERVER_WORKERS
+    threads = threads or Config.SERVER_THREADS
+    bind = bind or Config.SERVER_BIND
+
+    url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() == "sqlite" and _is_sqlite_memory(url) and workers > 1:
+        raise SystemExit("In-memory SQLite у каждого процесса своя — запустите с --workers 1 или файлом БД.")
+
+    app.debug = False
+
+    class HotelApplication(BaseApplication):
+        def load_config(self):
+            for key, value in _options(workers, threads, bind).items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    HotelApplication().run()
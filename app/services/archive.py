@@ -0,0 +1,286 @@
+# app/services/archive.py
+"""
+Архив старых данных: месяцы старше ARCHIVE_RETENTION_MONTHS переносятся из
+bookings, payments и transactions в сжатые колоночные файлы
+
+    ARCHIVE_DIR/<таблица>/ГГГГ-ММ.parquet   (если установлен pyarrow)
+    ARCHIVE_DIR/<таблица>/ГГГГ-ММ.npz       (иначе — numpy, без зависимостей)
+
+и удаляются из базы; в ARCHIVE_DIR/manifest.json — какие месяцы в архиве,
+файлы и число строк. Месяц берётся по той же дате, что и секция
+(services.partitions): start_date, payment_date, transaction_date.
+
+Порядок: transactions → payments → bookings. Платёж остаётся в базе, пока у
+него есть неархивные транзакции, бронь — пока есть неархивные платежи:
+так ссылки из «горячих» строк не повисают, а бронь, оплаченная позже
+границы, не пропадает из рабочих данных.
+
+Файл пишется (и заносится в манифест) до удаления строк. Если процесс
+прервётся между этими шагами, повторный запуск дополнит файл месяца, а
+чтение (read_archived) отбрасывает строки архива, id которых ещё есть в базе.
+
+Аналитика читает архив прозрачно: read_archived отдаёт строки нужных
+месяцев в виде DataFrame; прочитанные файлы кэшируются в памяти.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, delete, exists, func, select
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.db import SessionLocal, write_engine
+from app.models import Booking, Payment, Transaction
+from app.services.partitions import PARTITION_KEYS, add_months, drop_partition, month_start
+from app.services.table_versions import mark_changed
+
+# порядок архивирования: сначала «листья»
+TABLES = (
+    (Transaction, None),
+    (Payment, (Transaction, "payment_id")),
+    (Booking, (Payment, "booking_id")),
+)
+
+DELETE_CHUNK = 5000
+MANIFEST = "manifest.json"
+
+_lock = threading.Lock()
+_file_cache = {}  # путь → (mtime, DataFrame)
+
+
+def _has_parquet() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# -----------------------------
+# Манифест
+# -----------------------------
+def _manifest_path(directory: str) -> str:
+    return os.path.join(directory, MANIFEST)
+
+
+def load_manifest(directory: str = None) -> dict:
+    path = _manifest_path(directory or Config.ARCHIVE_DIR)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(directory: str, manifest: dict):
+    path = _manifest_path(directory)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Колоночные файлы
+# -----------------------------
+def _frame(model, rows) -> pd.DataFrame:
+    columns = [column.name for column in model.__table__.columns]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _to_arrays(model, df: pd.DataFrame) -> dict:
+    """DataFrame → массивы numpy без object-типов (читаются без pickle)."""
+    arrays = {}
+    for column in model.__table__.columns:
+        series = df[column.name]
+        nulls = series.isna().to_numpy()
+        if isinstance(column.type, (Date, DateTime)):
+            unit = "D" if isinstance(column.type, Date) else "us"
+            arrays[column.name] = pd.to_datetime(series).to_numpy().astype(f"datetime64[{unit}]")
+            continue
+        if isinstance(column.type, Boolean):
+            values = series.fillna(False).astype(bool).to_numpy()
+        elif isinstance(column.type, Integer):
+            values = series.fillna(0).astype(np.int64).to_numpy()
+        elif isinstance(column.type, Float):
+            values = series.astype(np.float64).to_numpy()
+        else:
+            values = series.fillna("").astype(str).to_numpy(dtype=str)
+        arrays[column.name] = values
+        if nulls.any() and not isinstance(column.type, Float):
+            arrays[f"{column.name}__null"] = nulls
+    return arrays
+
+
+def _from_arrays(data) -> pd.DataFrame:
+    columns = {}
+    for name in data.files:
+        if name.endswith("__null"):
+            continue
+        values = data[name]
+        nulls = data[f"{name}__null"] if f"{name}__null" in data.files else None
+        if nulls is not None and nulls.any():
+            values = pd.Series(values).astype(object).where(~nulls, None)
+        columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def _write(model, df: pd.DataFrame, base_path: str) -> str:
+    """Пишет файл через временный и rename; возвращает имя файла."""
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    if _has_parquet():
+        path = base_path + ".parquet"
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, compression="zstd", index=False)
+    else:
+        path = base_path + ".npz"
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, **_to_arrays(model, df))
+    os.replace(tmp, path)
+    return os.path.basename(path)
+
+
+def _read(path: str) -> pd.DataFrame:
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _file_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            df = _from_arrays(data)
+    with _lock:
+        _file_cache[path] = (mtime, df)
+    return df
+
+
+# -----------------------------
+# Архивирование
+# -----------------------------
+def cutoff_date(retention_months: int = None) -> date:
+    """Первый день месяца, начиная с которого данные остаются в базе."""
+    months = Config.ARCHIVE_RETENTION_MONTHS if retention_months is None else retention_months
+    return add_months(month_start(date.today()), -months)
+
+
+def _candidates(model, guard, lower: date, upper: date):
+    key = getattr(model, PARTITION_KEYS[model.__table__.name])
+    query = select(model.__table__).where(key >= lower, key < upper)
+    if guard is not None:
+        child, column = guard
+        # строка нужна «горячим» дочерним записям — остаётся в базе
+        query = query.where(~exists().where(getattr(child, column) == model.id))
+    return query.order_by(model.id)
+
+
+def archive_month(session: Session, model, guard, month: date, directory: str, manifest: dict,
+                  dry_run: bool = False) -> int:
+    """Переносит в архив один месяц одной таблицы; возвращает число строк."""
+    table = model.__table__.name
+    upper = add_months(month, 1)
+    rows = session.execute(_candidates(model, guard, month, upper)).all()
+    if not rows or dry_run:
+        return len(rows)
+
+    df = _frame(model, rows)
+    label = f"{month:%Y-%m}"
+    entry = manifest["tables"].setdefault(table, {}).get(label)
+    if entry:
+        # прерванный прошлый запуск: дополняем файл месяца
+        previous = _read(os.path.join(directory, table, entry["file"]))
+        df = pd.concat([previous, df], ignore_index=True).drop_duplicates("id", keep="last")
+
+    filename = _write(model, df, os.path.join(directory, table, label))
+    manifest["tables"][table][label] = {
+        "file": filename,
+        "rows": int(len(df)),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    _save_manifest(directory, manifest)
+
+    ids = [row.id for row in rows]
+    # весь месяц ушёл в архив — на PostgreSQL удаляем секцию целиком
+    if session.get_bind().dialect.name == "postgresql" and \
+            drop_partition(session.connection(), table, month, len(ids)):
+        mark_changed(session, model)
+    else:
+        for i in range(0, len(ids), DELETE_CHUNK):
+            session.execute(
+                delete(model)
+                .where(model.id.in_(ids[i:i + DELETE_CHUNK]))
+                .execution_options(synchronize_session=False)
+            )
+    session.commit()
+    return len(ids)
+
+
+def archive(retention_months: int = None, dry_run: bool = False, log=print) -> dict:
+    """Архивирует все месяцы старше границы. Возвращает {таблица: строк}."""
+    directory = Config.ARCHIVE_DIR
+    cutoff = cutoff_date(retention_months)
+    manifest = load_manifest(directory)
+    result = {}
+
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        for model, guard in TABLES:
+            table = model.__table__.name
+            key = getattr(model, PARTITION_KEYS[table])
+            first = session.execute(select(func.min(key)).where(key < cutoff)).scalar()
+            moved = 0
+            month = month_start(first) if first else cutoff
+            while month < cutoff:
+                count = archive_month(session, model, guard, month, directory, manifest, dry_run)
+                if count:
+                    log(f"{table} {month:%Y-%m}: {count} строк{' (dry run)' if dry_run else ''}")
+                moved += count
+                month = add_months(month, 1)
+            result[table] = moved
+        return result
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# -----------------------------
+# Чтение архива
+# -----------------------------
+def archived_months(table: str, directory: str = None) -> dict:
+    """ГГГГ-ММ → запись манифеста."""
+    return load_manifest(directory)["tables"].get(table, {})
+
+
+def read_archived(table: str, start_date=None, end_date=None, columns=None,
+                  exclude_ids=None, directory: str = None) -> pd.DataFrame:
+    """
+    Строки таблицы из архива за месяцы, пересекающие [start_date, end_date]
+    (без границ — весь архив). Фильтр по самой дате — на вызывающей стороне.
+    exclude_ids — id (список или Series), которые уже прочитаны из базы.
+    """
+    directory = directory or Config.ARCHIVE_DIR
+    lower = f"{pd.Timestamp(start_date):%Y-%m}" if start_date else None
+    upper = f"{pd.Timestamp(end_date):%Y-%m}" if end_date else None
+
+    frames = []
+    for label, entry in sorted(archived_months(table, directory).items()):
+        if (lower and label < lower) or (upper and label > upper):
+            continue
+        df = _read(os.path.join(directory, table, entry["file"]))
+        frames.append(df[columns] if columns else df)
+    if not frames:
+        return pd.DataFrame(columns=columns or [])
+
+    df = pd.concat(frames, ignore_index=True)
+    if exclude_ids is not None and len(df):
+        df = df[~df["id"].isin(exclude_ids)]
+    return df
@@ -1,9 +1,72 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
 
+from app.config import Config
 from app.db import SessionLocal
-from app.models import Booking, Room, Category
+from app.models import Booking, Room, Category, Customer
+from app.services.outbox import record as record_event
+from app.services.rate_calendar import fresh_calendar
+from app.services.room_assignment import assign_rooms, pick_room
+from app.services.room_locks import begin_booking_write, lock_rooms
+
+# статусы, при которых бронь занимает номер
+ACTIVE_STATUSES = ("created", "paid")
+
+# максимальный размер групповой брони
+MAX_GROUP_SIZE = 200
+
+# сколько раз подбирать другой номер категории, если выбранный успели занять
+REASSIGN_ATTEMPTS = 3
+
+
+class BookingConflictError(ValueError):
+    """Номер(а) заняты на запрошенные даты; conflicts — список пересечений."""
+
+    def __init__(self, message: str, conflicts: list):
+        super().__init__(message)
+        self.conflicts = conflicts
+
+
+def _price(room: Room, category_name: str, data: dict, stay_factor: float = None) -> dict:
+    """
+    stay_factor — сумма тарифных коэффициентов за ночи проживания (см.
+    rate_calendar); без дат (None) все ночи идут по базовой цене номера.
+    """
+    base_price = float(room.price_per_night)
+
+    guests = int(data["guests_count"])
+    nights = int(data["nights"])
+    lunch_count = int(data.get("lunch_count", 0))
+    dinner_count = int(data.get("dinner_count", 0))
+
+    room_amount = base_price * (nights if stay_factor is None else stay_factor)
+    total = room_amount
+    total += lunch_count * Config.LUNCH_PRICE
+    total += dinner_count * Config.DINNER_PRICE
+
+    if nights > Config.LONG_STAY_NIGHTS:
+        total *= 1 - Config.LONG_STAY_DISCOUNT / 100
+
+    return {
+        "final_amount": round(total, 2),
+        "nights": nights,
+        "guests_count": guests,
+        "lunch_count": lunch_count,
+        "dinner_count": dinner_count,
+        "room_category": category_name,
+        # средняя цена ночи с учётом сезонных тарифов
+        "base_price_per_night": round(room_amount / nights, 2) if nights else base_price,
+    }
+
+
+def _stay_dates(data: dict):
+    if not data.get("start_date") or not data.get("end_date"):
+        return None
+    return (datetime.strptime(data["start_date"], "%Y-%m-%d").date(),
+            datetime.strptime(data["end_date"], "%Y-%m-%d").date())
+
 
 # -----------------------------
 # Расчёт стоимости бронирования
@@ -11,76 +74,109 @@ from app.models import Booking, Room, Category
 def calculate_booking(data: dict) -> dict:
     session: Session = SessionLocal()
     try:
-        room = session.query(Room).get(data["room_id"])
-        if not room:
-            raise ValueError("Комната не найдена")
+        return _calculate(session, data)
+    finally:
+        session.close()
 
-        category = session.query(Category).get(room.category_id)
-        category_name = category.name if category else "не указан"
 
-        base_price = float(room.price_per_night)
+def _calculate(session: Session, data: dict) -> dict:
+    room = session.query(Room).get(data["room_id"])
+    if not room:
+        raise ValueError("Комната не найдена")
 
-        guests = int(data["guests_count"])
-        nights = int(data["nights"])
-        lunch_count = int(data.get("lunch_count", 0))
-        dinner_count = int(data.get("dinner_count", 0))
+    category = session.query(Category).get(room.category_id)
+    category_name = category.name if category else "не указан"
 
-        total = base_price * nights
-        total += lunch_count * 500
-        total += dinner_count * 800
+    dates = _stay_dates(data)
+    factor = fresh_calendar(session).stay_factor(room.category_id, *dates) if dates else None
+    return _price(room, category_name, data, factor)
 
-        if nights > 3:
-            total *= 0.95  # скидка 5%
+def _assign_room(session: Session, data: dict, start_date, end_date) -> int:
+    room_id = pick_room(session, int(data["category_id"]), int(data.get("guests_count", 1)),
+                        start_date, end_date)
+    if room_id is None:
+        raise ValueError("Нет свободных номеров этой категории на выбранные даты.")
+    return room_id
 
-        return {
-            "final_amount": round(total, 2),
-            "nights": nights,
-            "guests_count": guests,
-            "lunch_count": lunch_count,
-            "dinner_count": dinner_count,
-            "room_category": category_name,
-            "base_price_per_night": base_price,
-        }
+
+def suggest_room(data: dict) -> int:
+    """Номер категории для превью; при подтверждении он будет проверен заново."""
+    session: Session = SessionLocal()
+    try:
+        start_date = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(data["end_date"], "%Y-%m-%d").date()
+        return _assign_room(session, data, start_date, end_date)
     finally:
         session.close()
 
 # -----------------------------
 # Создание бронирования с проверкой занятости
 # -----------------------------
-def create_booking(data: dict) -> dict:
+def create_booking(data: dict, quote: dict = None) -> dict:
+    """
+    Создаёт бронь. Если передан quote (готовый результат calculate_booking
+    из подписанного токена превью), повторный расчёт не выполняется.
+    """
     session: Session = SessionLocal()
     try:
         start_date = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
         end_date = datetime.strptime(data["end_date"], "%Y-%m-%d").date()
 
-        # Проверка занятости номера
-        existing = session.query(Booking).filter(
-            Booking.room_id == data["room_id"],
-            Booking.start_date < end_date,
-            Booking.end_date > start_date,
-            Booking.status == "created"  # активные брони
-        ).first()
+        category_id = data.get("category_id")
+
+        # Проверка занятости под блокировкой номера: параллельная бронь того же
+        # номера ждёт здесь до нашего коммита, брони других номеров — нет
+        for attempt in range(REASSIGN_ATTEMPTS):
+            # до первого чтения: на SQLite транзакция сразу берёт блокировку записи
+            begin_booking_write(session)
+
+            # гостю важна только категория — номер подбираем сами; если номер
+            # (в том числе из превью) успели занять — берём другой той же категории
+            if category_id and (attempt or not data.get("room_id")):
+                data = {**data, "room_id": _assign_room(session, data, start_date, end_date)}
+                quote = None
 
-        if existing:
-            raise ValueError("Комната занята на выбранные даты.")
+            lock_rooms(session, [data["room_id"]])
+            existing = session.query(Booking.id).filter(
+                Booking.room_id == data["room_id"],
+                Booking.start_date < end_date,
+                Booking.end_date > start_date,
+                Booking.status.in_(ACTIVE_STATUSES)  # активные брони (в т.ч. оплаченные)
+            ).first()
+            if not existing:
+                break
+            if not category_id:
+                raise ValueError("Комната занята на выбранные даты.")
+            # откатываем, снимая блокировку занятого номера: держать её и брать
+            # следующую значило бы блокировать номера не по возрастанию id, и две
+            # такие брони могли бы ждать друг друга по кругу
+            session.rollback()
+        else:
+            raise ValueError("Нет свободных номеров этой категории на выбранные даты.")
 
-        # расчёт суммы
-        result = calculate_booking(data)
+        # расчёт суммы (или готовый расчёт из превью) — в той же транзакции,
+        # без второго соединения из пула, пока держим блокировку
+        result = quote if quote is not None else _calculate(session, data)
 
         booking = Booking(
             room_id=data["room_id"],
             customer_id=data["customer_id"],
             start_date=start_date,
             end_date=end_date,
-            final_amount=result["final_amount"],
+            # колонка целочисленная: округляем сами, чтобы PostgreSQL и SQLite
+            # (который сохранил бы дробное значение как есть) хранили одно и то же
+            final_amount=round(result["final_amount"]),
             status="created"
         )
 
         session.add(booking)
+        session.flush()
+        record_event(session, "booking.created", booking)
         session.commit()
 
         return {
             "booking_id": booking.id,
+            "room_id": booking.room_id,
             "final_amount": result["final_amount"],
             "nights": result["nights"],
             "guests_count": result["guests_count"],
@@ -90,4 +186,160 @@ def create_booking(data: dict) -> dict:
             "base_price_per_night": result["base_price_per_night"],
         }
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+# -----------------------------
+# Групповое бронирование
+# -----------------------------
+def create_group_booking(items: list, customer_id: int) -> dict:
+    """
+    Бронирует сразу несколько номеров (заявка туроператора): все или ни одного.
+
+    items — словари как у create_booking (room_id или category_id, start_date,
+    end_date, nights, guests_count, lunch_count, dinner_count; customer_id — по
+    желанию, иначе общий). Позиции с одной лишь категорией распределяются по
+    номерам (room_assignment). Занятость всех номеров проверяется одним запросом, номера
+    с категориями загружаются одним запросом, брони вставляются в одной
+    транзакции. При любом пересечении — BookingConflictError и ничего не сохраняется.
+    """
+    if not items:
+        raise ValueError("Пустая заявка.")
+    if len(items) > MAX_GROUP_SIZE:
+        raise ValueError(f"Не больше {MAX_GROUP_SIZE} номеров в одной заявке.")
+
+    session: Session = SessionLocal()
+    try:
+        begin_booking_write(session)
+        return _create_group_booking(session, items, customer_id)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _create_group_booking(session: Session, items: list, customer_id: int) -> dict:
+    dates = [
+        (datetime.strptime(data["start_date"], "%Y-%m-%d").date(),
+         datetime.strptime(data["end_date"], "%Y-%m-%d").date())
+        for data in items
+    ]
+
+    # клиентов проверяем до блокировок: иначе несуществующий customer_id
+    # всплыл бы только при коммите — нарушением внешнего ключа
+    customer_ids = {int(data.get("customer_id") or customer_id) for data in items}
+    known = {cid for (cid,) in session.query(Customer.id).filter(Customer.id.in_(customer_ids))}
+    missing = sorted(customer_ids - known)
+    if missing:
+        raise ValueError(f"Клиенты не найдены: {missing}")
+
+    # позиции «любой номер категории» распределяем одним проходом
+    by_category = [i for i, data in enumerate(items) if not data.get("room_id") and data.get("category_id")]
+    if by_category:
+        assigned = assign_rooms(session, [
+            {"category_id": int(items[i]["category_id"]), "guests_count": items[i].get("guests_count", 1),
+             "start_date": dates[i][0], "end_date": dates[i][1]}
+            for i in by_category
+        ])
+        unplaced = [i for i, room_id in zip(by_category, assigned) if room_id is None]
+        if unplaced:
+            raise BookingConflictError(
+                "Нет свободных номеров нужной категории.",
+                [{"item": i, "category_id": int(items[i]["category_id"])} for i in unplaced],
+            )
+        items = list(items)
+        for i, room_id in zip(by_category, assigned):
+            items[i] = {**items[i], "room_id": room_id}
+
+    requested = [(int(data["room_id"]), start_date, end_date)
+                 for data, (start_date, end_date) in zip(items, dates)]
+
+    # пересечения внутри самой заявки
+    conflicts = []
+    by_room = {}
+    for i, (room_id, start_date, end_date) in enumerate(requested):
+        for j in by_room.get(room_id, []):
+            _, other_start, other_end = requested[j]
+            if start_date < other_end and end_date > other_start:
+                conflicts.append({"room_id": room_id, "item": i, "with_item": j})
+        by_room.setdefault(room_id, []).append(i)
+    if conflicts:
+        raise BookingConflictError("Номер повторяется в заявке на пересекающиеся даты.", conflicts)
+
+    # блокируем все номера заявки (по возрастанию id), затем
+    # один запрос на все номера и даты
+    lock_rooms(session, [room_id for room_id, _, _ in requested])
+    existing = (
+        session.query(Booking.id, Booking.room_id, Booking.start_date, Booking.end_date)
+        .filter(
+            Booking.status.in_(ACTIVE_STATUSES),
+            or_(*[
+                and_(Booking.room_id == room_id,
+                     Booking.start_date < end_date,
+                     Booking.end_date > start_date)
+                for room_id, start_date, end_date in requested
+            ]),
+        )
+        .all()
+    )
+    if existing:
+        conflicts = [
+            {"room_id": room_id, "booking_id": booking_id,
+             "start_date": start.isoformat(), "end_date": end.isoformat()}
+            for booking_id, room_id, start, end in existing
+        ]
+        raise BookingConflictError("Часть номеров занята на выбранные даты.", conflicts)
+
+    room_ids = {room_id for room_id, _, _ in requested}
+    rooms = {
+        room.id: room
+        for room in session.query(Room)
+        .options(joinedload(Room.category))
+        .filter(Room.id.in_(room_ids))
+    }
+    missing = sorted(room_ids - rooms.keys())
+    if missing:
+        raise ValueError(f"Комнаты не найдены: {missing}")
+
+    # тарифы всех позиций — одним обращением к календарю
+    factors = fresh_calendar(session).stay_factors(
+        [rooms[room_id].category_id for room_id, _, _ in requested],
+        [start_date for _, start_date, _ in requested],
+        [end_date for _, _, end_date in requested],
+    )
+
+    results = []
+    bookings = []
+    for data, (room_id, start_date, end_date), factor in zip(items, requested, factors):
+        room = rooms[room_id]
+        result = _price(room, room.category.name if room.category else "не указан", data, float(factor))
+        results.append(result)
+        bookings.append(Booking(
+            room_id=room_id,
+            customer_id=data.get("customer_id") or customer_id,
+            start_date=start_date,
+            end_date=end_date,
+            guests_count=result["guests_count"],
+            lunch_count=result["lunch_count"],
+            dinner_count=result["dinner_count"],
+            final_amount=round(result["final_amount"]),
+            status="created",
+        ))
+
+    # PostgreSQL вставит всё одним INSERT ... VALUES ... RETURNING;
+    # SQLite — построчно, но в той же транзакции
+    session.add_all(bookings)
+    session.flush()
+    booking_ids = [booking.id for booking in bookings]  # до коммита: после него объекты истекают
+    for booking in bookings:
+        record_event(session, "booking.created", booking)
+    session.commit()
+
+    return {
+        "booking_ids": booking_ids,
+        "total_amount": round(sum(result["final_amount"] for result in results), 2),
+        "items": [
+            {"booking_id": booking_id, "room_id": room_id, **result}
+            for booking_id, (room_id, _, _), result in zip(booking_ids, requested, results)
+        ],
+    }
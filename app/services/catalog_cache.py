@@ -0,0 +1,97 @@
+# app/services/catalog_cache.py
+"""
+Кэш каталога номеров для формы брони.
+
+Список <option> с номерами и категориями рендерится один раз (номера
+загружаются вместе с категориями одним запросом) и отдаётся готовым
+HTML-фрагментом. Кэш сбрасывается, когда через ORM меняются Room или
+Category, а изменения из других процессов (seed_data.py, другие воркеры)
+подхватываются по истечении CATALOG_CACHE_TTL_SECONDS.
+"""
+
+import threading
+import time
+
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from app.db import SessionLocal
+from app.models import Room, Category, Customer
+
+_lock = threading.Lock()
+_version = 0
+_cache = {}  # имя фрагмента → {"version", "built_at", "html"}
+
+
+def invalidate():
+    """Сбрасывает кэш каталога."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _invalidate_on_catalog_change(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Room, Category)):
+            invalidate()
+            return
+
+
+def _cached_fragment(name: str, build) -> Markup:
+    ttl = current_app.config.get("CATALOG_CACHE_TTL_SECONDS", 60)
+    with _lock:
+        version = _version
+        entry = _cache.get(name)
+        if entry and entry["version"] == version and time.monotonic() - entry["built_at"] < ttl:
+            return entry["html"]
+
+    html = Markup(build())
+
+    with _lock:
+        _cache[name] = {"version": version, "built_at": time.monotonic(), "html": html}
+    return html
+
+
+def room_options_html(session: Session) -> Markup:
+    """Готовый фрагмент <option> для выбора номера."""
+    def build():
+        rooms = (
+            session.query(Room)
+            .options(joinedload(Room.category))
+            .order_by(Room.number)
+            .all()
+        )
+        return render_template("_room_options.html", rooms=rooms)
+
+    return _cached_fragment("rooms", build)
+
+
+def category_options_html(session: Session) -> Markup:
+    """Готовый фрагмент <option> для выбора категории («любой номер категории»)."""
+    def build():
+        categories = session.query(Category.id, Category.name).order_by(Category.id).all()
+        return render_template("_category_options.html", categories=categories)
+
+    return _cached_fragment("categories", build)
+
+
+def recent_customers(session: Session) -> list:
+    """Последние клиенты для выпадающего списка (только id и ФИО)."""
+    limit = current_app.config.get("FORM_CUSTOMERS_LIMIT", 100)
+    return (
+        session.query(Customer.id, Customer.full_name)
+        .order_by(Customer.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def booking_form_context(session: Session) -> dict:
+    return {
+        "room_options": room_options_html(session),
+        "category_options": category_options_html(session),
+        "customers": recent_customers(session),
+    }
@@ -0,0 +1,250 @@
+# app/services/customer_dedupe.py
+"""
+Поиск и слияние дубликатов клиентов.
+
+Сравнивать каждого клиента с каждым — O(n²), поэтому пары-кандидаты
+отбираются блокировкой:
+- одинаковый нормализованный телефон;
+- одинаковый нормализованный email;
+- одна LSH-корзина по MinHash от триграмм ФИО (похожие имена с высокой
+  вероятностью совпадают хотя бы в одной полосе подписи) — в нечётком режиме.
+Слишком большие корзины (распространённые имена) пропускаются — в них
+нет смысла сравнивать всех со всеми, а контактные блоки всё равно сработают.
+
+Пара считается дубликатом, если совпадает телефон или email и ФИО похожи
+(сходство триграмм не ниже NAME_THRESHOLD). В нечётком режиме (fuzzy)
+дубликатом считается и пара, где ФИО совпадают почти полностью, а телефоны
+отличаются одной цифрой (опечатка); такие пары ищутся только по
+LSH-корзинам и требуют ручной проверки. Пары собираются
+в группы (union-find); в каждой группе основной записью остаётся самый
+старый клиент, брони остальных переносятся на него одним UPDATE на группу.
+"""
+
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy import update, delete
+from sqlalchemy.orm import Session
+
+from app.models import Booking, Customer
+from app.services.customer_search import customer_index, normalize
+from app.validation import normalize_phone, normalize_email
+
+# MinHash: BANDS полос по ROWS значений; вероятность попасть в одну корзину
+# для сходства s равна 1 - (1 - s^ROWS)^BANDS (≈0.98 при s=0.7, ≈0.2 при s=0.3)
+BANDS = 8
+ROWS = 3
+MAX_BLOCK_SIZE = 50
+
+NAME_THRESHOLD = 0.6
+NEAR_EXACT_NAME = 0.9
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240601)
+# a < 2^29 и x < 2^32: a*x + b умещается в uint64 без переполнения
+_A = _rng.integers(1, 1 << 29, size=BANDS * ROWS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=BANDS * ROWS, dtype=np.uint64)
+
+
+def _name_grams(name: str) -> frozenset:
+    text = f" {normalize(name)} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def _gram_hash(gram: str) -> int:
+    return int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "little")
+
+
+def _minhash(grams: frozenset, cache: dict) -> np.ndarray:
+    hashes = np.array([cache.get(g) or cache.setdefault(g, _gram_hash(g)) for g in grams], dtype=np.uint64)
+    # (a*x + b) mod p сразу для всех функций подписи
+    values = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return values.min(axis=1)
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class Record:
+    id: int
+    full_name: str
+    phone: str
+    email: str
+    grams: frozenset
+
+
+@dataclass
+class DuplicateGroup:
+    primary_id: int
+    duplicate_ids: list
+    reasons: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {"primary_id": self.primary_id, "duplicate_ids": self.duplicate_ids, "reasons": self.reasons}
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(x, x) != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # корнем остаётся меньший id — он же основная запись группы
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _load(session: Session) -> list:
+    rows = (
+        session.query(Customer.id, Customer.full_name, Customer.phone, Customer.email)
+        .order_by(Customer.id)
+        .yield_per(20000)
+    )
+    return [
+        Record(cid, name or "", normalize_phone(phone), normalize_email(email), _name_grams(name or ""))
+        for cid, name, phone, email in rows
+    ]
+
+
+def _blocks(records: list, fuzzy: bool):
+    """Ключ блока → индексы записей."""
+    blocks = defaultdict(list)
+    cache = {}
+    for i, rec in enumerate(records):
+        if rec.phone:
+            blocks["p:" + rec.phone].append(i)
+        if rec.email:
+            blocks["e:" + rec.email].append(i)
+        if fuzzy and rec.grams:
+            signature = _minhash(rec.grams, cache)
+            for band in range(BANDS):
+                key = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+                blocks[(band, key)].append(i)
+    return blocks
+
+
+def _match(a: Record, b: Record, fuzzy: bool):
+    """Причина, по которой пара считается дубликатом, или None."""
+    same_phone = a.phone and a.phone == b.phone
+    same_email = a.email and a.email == b.email
+    # то же ФИО и опечатка в одной цифре телефона
+    typo = fuzzy and not same_phone and not same_email and _one_digit_apart(a.phone, b.phone)
+    if not (same_phone or same_email or typo):
+        return None
+
+    name_sim = similarity(a.grams, b.grams)
+    if same_phone and name_sim >= NAME_THRESHOLD:
+        return "телефон"
+    if same_email and name_sim >= NAME_THRESHOLD:
+        return "email"
+    if typo and name_sim >= NEAR_EXACT_NAME:
+        return "ФИО"
+    return None
+
+
+def _one_digit_apart(a: str, b: str) -> bool:
+    if not a or not b or len(a) != len(b):
+        return False
+    # отличающаяся цифра — только в одной половине номера
+    half = len(a) // 2
+    if a[:half] != b[:half] and a[half:] != b[half:]:
+        return False
+    return sum(x != y for x, y in zip(a, b)) == 1
+
+
+def find_duplicates(session: Session, fuzzy: bool = False) -> list:
+    """
+    Группы вероятных дубликатов, от самых крупных к мелким.
+    fuzzy=True добавляет пары «похожее ФИО + опечатка в телефоне» — их
+    стоит просмотреть, прежде чем сливать.
+    """
+    records = _load(session)
+    uf = _UnionFind()
+    reasons = []
+    checked = set()
+
+    for members in _blocks(records, fuzzy).values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                reason = _match(records[i], records[j], fuzzy)
+                if reason:
+                    uf.union(records[i].id, records[j].id)
+                    reasons.append((records[i].id, reason))
+
+    groups = defaultdict(list)
+    for customer_id in list(uf.parent):
+        groups[uf.find(customer_id)].append(customer_id)
+
+    group_reasons = defaultdict(set)
+    for customer_id, reason in reasons:
+        group_reasons[uf.find(customer_id)].add(reason)
+
+    result = []
+    for primary_id, members in groups.items():
+        duplicates = sorted(cid for cid in members if cid != primary_id)
+        if duplicates:
+            result.append(DuplicateGroup(primary_id, duplicates, sorted(group_reasons[primary_id])))
+    return sorted(result, key=lambda g: (-len(g.duplicate_ids), g.primary_id))
+
+
+def merge_duplicates(session: Session, groups: list) -> dict:
+    """
+    Переносит брони дубликатов на основную запись и удаляет дубликаты.
+    Недостающий телефон/email основной записи берётся у дубликата.
+    Всё выполняется в одной транзакции.
+    """
+    moved = removed = 0
+    try:
+        for group in groups:
+            primary = session.get(Customer, group.primary_id)
+            if primary is None:
+                continue
+            duplicates = session.query(Customer).filter(Customer.id.in_(group.duplicate_ids)).all()
+            for dup in duplicates:
+                primary.phone = primary.phone or dup.phone
+                primary.email = primary.email or dup.email
+
+            ids = [dup.id for dup in duplicates]
+            if not ids:
+                continue
+            moved += session.execute(
+                update(Booking)
+                .where(Booking.customer_id.in_(ids))
+                .values(customer_id=primary.id)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            removed += session.execute(
+                delete(Customer)
+                .where(Customer.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    for group in groups:
+        for customer_id in group.duplicate_ids:
+            customer_index.remove(customer_id)
+    return {"groups": len(groups), "bookings_moved": moved, "customers_removed": removed}
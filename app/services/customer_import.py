@@ -0,0 +1,184 @@
+# app/services/customer_import.py
+"""
+Массовый импорт клиентов из CSV или JSONL.
+
+- каждая запись проверяется теми же шаблонами, что и форма брони
+  (ФИО и телефон обязательны, email — если указан);
+- дубликаты отсекаются по хэш-индексу нормализованных телефона и email:
+  индекс строится одним потоковым проходом по таблице customers и
+  пополняется записями самого файла;
+- новые клиенты вставляются пачками, по коммиту на пачку.
+
+Формат CSV: заголовок с колонками full_name, phone, email.
+Формат JSONL: по объекту {"full_name": ..., "phone": ..., "email": ...} на строку.
+"""
+
+import csv
+import hashlib
+import json
+from dataclasses import dataclass, field
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, write_engine
+from app.models import Customer
+from app.validation import (clean_phone, is_valid_phone, is_valid_email,
+                            normalize_phone, normalize_email)
+
+FORMATS = ("csv", "jsonl")
+
+# сколько ошибок валидации показывать в отчёте
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line}: {message}")
+
+
+def _key(kind: str, value: str) -> int:
+    """64-битный хэш нормализованного значения — компактнее самих строк."""
+    digest = hashlib.blake2b(f"{kind}:{value}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class ContactIndex:
+    """Хэш-индекс телефонов и email уже известных клиентов."""
+
+    def __init__(self):
+        self.keys = set()
+
+    @classmethod
+    def from_db(cls, session: Session) -> "ContactIndex":
+        index = cls()
+        rows = session.query(Customer.phone, Customer.email).yield_per(20000)
+        for phone, email in rows:
+            index.add(normalize_phone(phone), normalize_email(email))
+        return index
+
+    def add(self, phone: str, email: str):
+        if phone:
+            self.keys.add(_key("phone", phone))
+        if email:
+            self.keys.add(_key("email", email))
+
+    def contains(self, phone: str, email: str) -> bool:
+        return (bool(phone) and _key("phone", phone) in self.keys) or \
+               (bool(email) and _key("email", email) in self.keys)
+
+
+def iter_records(stream, fmt: str):
+    """Возвращает пары (номер строки, словарь с полями) из текстового потока."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+
+def _text(value) -> str:
+    """Значение поля как строка: в JSONL телефон может прийти числом."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"поле должно быть строкой, получено {type(value).__name__}")
+
+
+def import_customers(stream, fmt: str, batch_size: int = 5000, dry_run: bool = False,
+                     progress=None) -> ImportReport:
+    """
+    Импортирует клиентов из потока; при dry_run только проверяет и считает.
+    progress(report) вызывается после каждой пачки.
+    """
+    report = ImportReport()
+    # известные контакты читаем обычной сессией, чтобы не держать блокировку
+    # записи SQLite всё время загрузки индекса
+    reader: Session = SessionLocal()
+    try:
+        index = ContactIndex.from_db(reader)
+    finally:
+        reader.close()
+
+    # пачки пишутся транзакциями с BEGIN IMMEDIATE (см. db.write_engine)
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        batch = []
+
+        for line_no, record in iter_records(stream, fmt):
+            report.total += 1
+            if record is None:
+                report.error(line_no, "не удалось разобрать запись")
+                continue
+
+            try:
+                full_name = _text(record.get("full_name") or record.get("name")).strip()
+                phone = clean_phone(_text(record.get("phone")))
+                email = _text(record.get("email")).strip()
+            except ValueError as e:
+                report.error(line_no, str(e))
+                continue
+
+            if not full_name:
+                report.error(line_no, "не указано ФИО")
+                continue
+            if not is_valid_phone(phone):
+                report.error(line_no, f"некорректный телефон «{phone}»")
+                continue
+            if email and not is_valid_email(email):
+                report.error(line_no, f"некорректный email «{email}»")
+                continue
+
+            phone_key, email_key = normalize_phone(phone), normalize_email(email)
+            if index.contains(phone_key, email_key):
+                report.duplicates += 1
+                continue
+            index.add(phone_key, email_key)
+
+            batch.append({"full_name": full_name, "phone": phone_key, "email": email_key or None})
+            if len(batch) >= batch_size:
+                report.inserted += _flush(session, batch, dry_run)
+                batch = []
+                if progress:
+                    progress(report)
+
+        report.inserted += _flush(session, batch, dry_run)
+        return report
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _flush(session: Session, batch: list, dry_run: bool) -> int:
+    if not batch:
+        return 0
+    if not dry_run:
+        session.execute(insert(Customer.__table__), batch)
+        session.commit()
+    return len(batch)
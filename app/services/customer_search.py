@@ -0,0 +1,240 @@
+# app/services/customer_search.py
+"""
+Поиск клиентов для подсказок в форме брони (typeahead).
+
+Индекс держится в памяти процесса:
+- триграммы нормализованного текста (ФИО, цифры телефона, email) → id
+  клиентов — для поиска по подстроке от 3 символов;
+- «начала слов» (^и, ^ив) → id — для коротких запросов по префиксу.
+
+Списки id хранятся в array('I') и растут только вправо: id клиентов
+монотонны, поэтому списки остаются отсортированными, а поиск идёт от новых
+клиентов к старым и останавливается, набрав достаточно совпадений.
+
+Индекс строится при первом поиске одним потоковым запросом, новые клиенты
+добавляются после коммита сессии, а вставки мимо ORM и из других процессов
+подтягиваются не чаще раза в CUSTOMER_INDEX_SYNC_SECONDS запросом
+«id > последнего известного - ID_OVERLAP»: на PostgreSQL id выдаются до
+коммита, и клиент с меньшим id может появиться позже клиента с большим.
+Правки и удаления клиентов (слияние дубликатов) сдвигают счётчик изменений
+таблицы customers (см. table_versions) — тогда индекс строится заново.
+"""
+
+import bisect
+import re
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Customer
+from app.services.table_versions import table_version
+
+PHONE_QUERY_RE = re.compile(r"^[\d\s()+\-]+$")
+NON_DIGITS_RE = re.compile(r"\D")
+SPACES_RE = re.compile(r"\s+")
+
+# сколько совпадений набирать до ранжирования (от новых клиентов к старым)
+CANDIDATES_PER_RESULT = 5
+
+# сколько последних известных id перечитывать при синхронизации
+ID_OVERLAP = 1000
+
+
+def normalize(text: str) -> str:
+    return SPACES_RE.sub(" ", (text or "").lower().replace("ё", "е")).strip()
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _mask_phone(phone: str) -> str:
+    digits = NON_DIGITS_RE.sub("", phone or "")
+    return f"…{digits[-4:]}" if len(digits) >= 4 else ""
+
+
+def _mask_email(email: str) -> str:
+    if not email or "@" not in email:
+        return ""
+    local, _, domain = email.partition("@")
+    return f"{local[:2]}…@{domain}"
+
+
+class CustomerSearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.synced_at = 0.0
+        self.edits = None     # счётчик изменений customers, с которым строился индекс
+        self._reset()
+
+    def _reset(self):
+        self.postings = defaultdict(lambda: array("I"))
+        self.docs = {}        # id → (нормализованный текст, ФИО, телефон, email)
+        self.max_id = 0
+        self.loaded = False
+
+    # -- наполнение --
+    def add(self, customer_id: int, full_name: str, phone: str, email: str):
+        name = normalize(full_name)
+        digits = NON_DIGITS_RE.sub("", phone or "")
+        mail = normalize(email)
+        text = " ".join(part for part in (name, digits, mail) if part)
+
+        grams = _trigrams(text)
+        for token in text.split(" "):
+            grams.add("^" + token[:1])
+            grams.add("^" + token[:2])
+
+        with self.lock:
+            known = self.docs.get(customer_id)
+            if known is not None and known[0] == text:
+                return
+            # при повторном чтении клиента с новыми данными старые триграммы
+            # остаются в списках — поиск всё равно сверяет подстроку с текстом
+            self.docs[customer_id] = (text, full_name, phone, email)
+            for gram in grams:
+                posting = self.postings[gram]
+                # вставка «не по порядку» (редко: вставки из разных процессов,
+                # перечитанное окно id)
+                if posting and posting[-1] >= customer_id:
+                    position = bisect.bisect_left(posting, customer_id)
+                    if position == len(posting) or posting[position] != customer_id:
+                        posting.insert(position, customer_id)
+                else:
+                    posting.append(customer_id)
+            self.max_id = max(self.max_id, customer_id)
+
+    def remove(self, customer_id: int):
+        """Удалённые клиенты пропускаются при поиске (списки id не перестраиваются)."""
+        with self.lock:
+            self.docs.pop(customer_id, None)
+
+    def sync(self, session: Session, interval: float = 0.0):
+        """Строит индекс или дочитывает клиентов с id больше известного - ID_OVERLAP."""
+        with self.lock:
+            if self.loaded and time.monotonic() - self.synced_at < interval:
+                return
+            # счётчик читаем до клиентов: правка, закоммиченная между
+            # запросами, сдвинет его и перестроит индекс в следующий раз
+            _, edits = table_version(session, Customer)
+            if edits != self.edits:
+                self._reset()
+            rows = (
+                session.query(Customer.id, Customer.full_name, Customer.phone, Customer.email)
+                .filter(Customer.id > max(self.max_id - ID_OVERLAP, 0))
+                .order_by(Customer.id)
+                .yield_per(10000)
+            )
+            for row in rows:
+                self.add(*row)
+            self.edits = edits
+            self.loaded = True
+            self.synced_at = time.monotonic()
+
+    # -- поиск --
+    def _candidate_lists(self, query: str) -> list:
+        if len(query) >= 3:
+            grams = _trigrams(query)
+        else:
+            grams = {"^" + query}
+        lists = [self.postings.get(gram) for gram in grams]
+        if any(not posting for posting in lists):
+            return []
+        return sorted(lists, key=len)
+
+    def search(self, query: str, limit: int = 10) -> list:
+        query = query.strip()
+        if PHONE_QUERY_RE.match(query) and NON_DIGITS_RE.sub("", query):
+            query = NON_DIGITS_RE.sub("", query)
+        query = normalize(query)
+        if not query:
+            return []
+
+        with self.lock:
+            lists = self._candidate_lists(query)
+            if not lists:
+                return []
+            # самый короткий список id; проверка подстрокой ниже заменяет
+            # пересечение с остальными списками
+            rarest = lists[0]
+
+            matches = []
+            wanted = limit * CANDIDATES_PER_RESULT
+            for customer_id in reversed(rarest):
+                doc = self.docs.get(customer_id)
+                if doc is None:
+                    continue
+                text = doc[0]
+                position = text.find(query) if len(query) >= 3 else _prefix_position(text, query)
+                if position < 0:
+                    continue
+                # выше — совпадения с начала слова, затем более ранние в тексте
+                word_start = position == 0 or text[position - 1] == " "
+                matches.append((not word_start, position, -customer_id, customer_id, doc))
+                if len(matches) >= wanted:
+                    break
+
+        matches.sort()
+        return [
+            {
+                "id": customer_id,
+                "full_name": doc[1],
+                "phone": _mask_phone(doc[2]),
+                "email": _mask_email(doc[3]),
+            }
+            for *_, customer_id, doc in matches[:limit]
+        ]
+
+
+def _prefix_position(text: str, prefix: str) -> int:
+    if text.startswith(prefix):
+        return 0
+    position = text.find(" " + prefix)
+    return position + 1 if position >= 0 else -1
+
+
+customer_index = CustomerSearchIndex()
+
+
+# -----------------------------
+# Инкрементальное обновление после коммита
+# -----------------------------
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_new_customers(session, flush_context):
+    # значения снимаем сразу: после коммита атрибуты истекают, а SQL в
+    # after_commit выполнять нельзя
+    new = [(obj.id, obj.full_name, obj.phone, obj.email)
+           for obj in session.new if isinstance(obj, Customer)]
+    if new:
+        session.info.setdefault("new_customers", []).extend(new)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _index_new_customers(session):
+    new = session.info.pop("new_customers", [])
+    if customer_index.loaded:
+        for values in new:
+            customer_index.add(*values)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_new_customers(session):
+    session.info.pop("new_customers", None)
+
+
+def search_customers(query: str, limit: int = None) -> list:
+    """Топ-k клиентов по подстроке ФИО, телефона или email."""
+    limit = min(limit or current_app.config.get("CUSTOMER_SEARCH_LIMIT", 10), 50)
+    session: Session = SessionLocal()
+    try:
+        customer_index.sync(session, current_app.config.get("CUSTOMER_INDEX_SYNC_SECONDS", 5))
+    finally:
+        session.close()
+    return customer_index.search(query, limit)
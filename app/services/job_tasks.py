@@ -0,0 +1,122 @@
+# app/services/job_tasks.py
+"""
+Виды фоновых задач (см. app/jobs.py):
+- export    — полная выгрузка таблицы в CSV;
+- dashboard — расчёт аналитики и графиков для админки;
+- import    — массовый импорт клиентов из загруженного файла.
+"""
+
+import io
+import json
+import os
+import shutil
+import threading
+import zipfile
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import analysis
+from app.db import ReadSessionLocal
+from app.jobs import job_kind
+from app.models import Booking, Payment, Transaction
+from app.services.customer_import import import_customers
+
+# колонки выгрузок — те же, что у /admin/download/*.csv
+EXPORTS = {
+    "bookings": (Booking, ["id", "room_id", "customer_id", "start_date", "end_date",
+                           "guests_count", "total_amount", "final_amount", "status", "created_at"]),
+    "payments": (Payment, ["id", "booking_id", "amount", "method", "status", "payment_date"]),
+    "transactions": (Transaction, ["id", "payment_id", "amount", "type", "transaction_date"]),
+}
+
+# pyplot хранит текущую фигуру глобально — графики строим по одному
+_plot_lock = threading.Lock()
+
+
+@job_kind("export")
+def export_table(ctx, params):
+    table = params.get("table")
+    if table not in EXPORTS:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    model, header = EXPORTS[table]
+    filename = f"{table}.csv"
+
+    session: Session = ReadSessionLocal()
+    try:
+        total = session.query(func.count(model.id)).scalar() or 0
+        rows = (
+            session.query(*[getattr(model, name) for name in header])
+            .order_by(model.id)
+            .yield_per(10000)
+        )
+        with open(ctx.path(filename), "w", encoding="utf-8", newline="") as f:
+            f.write(",".join(header) + "\n")
+            for done, row in enumerate(rows, start=1):
+                f.write(",".join(str(value) for value in row) + "\n")
+                if done % 10000 == 0:
+                    ctx.progress(done / total if total else 1.0, f"{done} из {total} строк")
+        ctx.progress(1.0, f"Выгружено строк: {total}", force=True)
+    finally:
+        session.close()
+    return filename
+
+
+@job_kind("dashboard")
+def build_dashboard(ctx, params):
+    start_date = params.get("start_date") or None
+    end_date = params.get("end_date") or None
+
+    with _plot_lock:
+        ctx.progress(0.0, "Доходы по категориям", force=True)
+        income_df, income_plot = analysis.income_by_category(start_date, end_date)
+        ctx.progress(1 / 3, "Гости по месяцам", force=True)
+        guests_df, guests_plot = analysis.guests_by_month()
+        ctx.progress(2 / 3, "Топ номеров", force=True)
+        top_df, top_plot = analysis.top_rooms(limit=5)
+
+        # графики в static/plots перезаписываются следующим расчётом — копируем к себе
+        plots = {}
+        for key, plot in (("income", income_plot), ("guests", guests_plot), ("top", top_plot)):
+            if plot:
+                name = os.path.basename(plot)
+                shutil.copyfile(os.path.join(analysis.PLOTS_DIR, name), ctx.path(name))
+                plots[key] = name
+
+    result = {
+        "start_date": start_date or "",
+        "end_date": end_date or "",
+        "income_df": income_df.to_dict(orient="records") if not income_df.empty else [],
+        "guests_df": guests_df.to_dict(orient="records") if not guests_df.empty else [],
+        "top_df": top_df.to_dict(orient="records") if not top_df.empty else [],
+        "plots": plots,
+    }
+    with open(ctx.path("dashboard.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, default=str)
+
+    with zipfile.ZipFile(ctx.path("dashboard.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(ctx.path("dashboard.json"), "dashboard.json")
+        for name in plots.values():
+            archive.write(ctx.path(name), name)
+    return "dashboard.zip"
+
+
+@job_kind("import")
+def import_file(ctx, params):
+    path = ctx.path(params["filename"])
+    size = os.path.getsize(path) or 1
+
+    with open(path, "rb") as raw:
+        stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+        def progress(report):
+            ctx.progress(raw.tell() / size, f"Обработано записей: {report.total}")
+
+        report = import_customers(stream, params.get("format", "csv"),
+                                  dry_run=params.get("dry_run", False), progress=progress)
+
+    with open(ctx.path("report.json"), "w", encoding="utf-8") as f:
+        json.dump(report.__dict__, f, ensure_ascii=False, indent=2)
+    ctx.progress(1.0, f"Добавлено: {report.inserted}, дубликатов: {report.duplicates}, "
+                      f"с ошибками: {report.invalid}", force=True)
+    return "report.json"
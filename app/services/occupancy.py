@@ -0,0 +1,243 @@
+# app/services/occupancy.py
+"""
+Календарь занятости номеров: матрица uint8 «номер × день».
+
+    0 — свободно, 1 — бронь создана, 2 — бронь оплачена
+
+Матрица покрывает дни от (сегодня - OCCUPANCY_PAST_DAYS) до
+(сегодня + OCCUPANCY_FUTURE_DAYS) и строится одним запросом по броням,
+пересекающим этот интервал. Дальше она обновляется на месте:
+- изменения броней через ORM (создание, оплата, отмена) применяются после
+  коммита сессии — старый интервал брони очищается, новый заполняется;
+- изменения мимо ORM и из других процессов (воркеры gunicorn, скрипты)
+  замечаются по версии таблицы bookings (max(id) + счётчик изменений, см.
+  table_versions) не чаще раза в OCCUPANCY_SYNC_SECONDS — тогда матрица
+  строится заново. Свои изменения тоже сдвигают версию, так что при потоке
+  броней перестройка случается раз в интервал; на горизонте в два года это
+  один запрос на десятки тысяч строк.
+Брони одного номера не пересекаются (проверка в create_booking), поэтому
+очистка интервала отменённой брони не задевает соседние.
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Booking, Room
+from app.services.booking_service import ACTIVE_STATUSES
+from app.services.table_versions import table_version
+
+FREE, CREATED, PAID = 0, 1, 2
+STATUS_CODES = {"created": CREATED, "paid": PAID}
+
+
+class OccupancyCalendar:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.matrix = np.zeros((0, 0), dtype=np.uint8)
+        self.origin = None          # дата первого столбца
+        self.room_ids = []          # id номеров в порядке строк
+        self.room_numbers = []
+        self.rows = {}              # room_id → номер строки
+        self.version = None
+        self.checked_at = 0.0
+        self.stale = True
+
+    # -- построение --
+    def build(self, session: Session, past_days: int, future_days: int):
+        version = table_version(session, Booking)
+        origin = date.today() - timedelta(days=past_days)
+        end = date.today() + timedelta(days=future_days)
+        days = (end - origin).days
+
+        rooms = session.query(Room.id, Room.number).order_by(Room.number).all()
+        rows = {room_id: i for i, (room_id, _) in enumerate(rooms)}
+        bookings = (
+            session.query(Booking.room_id, Booking.start_date, Booking.end_date, Booking.status)
+            .filter(Booking.status.in_(ACTIVE_STATUSES),
+                    Booking.start_date < end,
+                    Booking.end_date > origin)
+            .all()
+        )
+
+        matrix = np.zeros((len(rooms), days), dtype=np.uint8)
+        for room_id, start, finish, status in bookings:
+            row = rows.get(room_id)
+            if row is None or start is None or finish is None:
+                continue
+            a = max((start - origin).days, 0)
+            b = min((finish - origin).days, days)
+            if a < b:
+                matrix[row, a:b] = STATUS_CODES[status]
+
+        with self.lock:
+            self.matrix = matrix
+            self.origin = origin
+            self.room_ids = [room_id for room_id, _ in rooms]
+            self.room_numbers = [number for _, number in rooms]
+            self.rows = rows
+            self.version = version
+            self.checked_at = time.monotonic()
+            self.stale = False
+
+    def ensure_fresh(self, session: Session, past_days: int, future_days: int, interval: float):
+        """Перестраивает матрицу, если она устарела (новый день, чужие изменения)."""
+        with self.lock:
+            expected_origin = date.today() - timedelta(days=past_days)
+            needs_build = self.stale or self.origin != expected_origin
+            if not needs_build and time.monotonic() - self.checked_at >= interval:
+                needs_build = table_version(session, Booking) != self.version
+                self.checked_at = time.monotonic()
+            if needs_build:
+                self.build(session, past_days, future_days)
+
+    # -- инкрементальные изменения --
+    def apply(self, changes: list):
+        """changes: [(room_id, start, end, код или None для очистки), ...] по порядку."""
+        with self.lock:
+            if self.origin is None:
+                return
+            days = self.matrix.shape[1]
+            for room_id, start, finish, code in changes:
+                row = self.rows.get(room_id)
+                if row is None:
+                    # новый номер — проще перестроить целиком
+                    self.stale = True
+                    return
+                a = max((start - self.origin).days, 0)
+                b = min((finish - self.origin).days, days)
+                if a < b:
+                    self.matrix[row, a:b] = FREE if code is None else code
+
+    # -- чтение --
+    def _columns(self, start: date, days: int):
+        a = (start - self.origin).days
+        if a < 0 or a + days > self.matrix.shape[1] or days <= 0:
+            last = self.origin + timedelta(days=self.matrix.shape[1] - 1)
+            raise ValueError(f"Окно должно лежать в пределах {self.origin} — {last}")
+        return a, a + days
+
+    def _room_rows(self, room_ids):
+        if not room_ids:
+            return list(range(len(self.room_ids)))
+        unknown = [room_id for room_id in room_ids if room_id not in self.rows]
+        if unknown:
+            raise ValueError(f"Номера не найдены: {unknown}")
+        return [self.rows[room_id] for room_id in room_ids]
+
+    def window(self, start: date, days: int, room_ids=None):
+        """(строки номеров, копия матрицы окна) — для любого набора номеров и дней за раз."""
+        with self.lock:
+            a, b = self._columns(start, days)
+            rows = self._room_rows(room_ids)
+            return rows, self.matrix[rows, a:b].copy()
+
+    def free_starts(self, start: date, days: int, nights: int, room_ids=None):
+        """
+        Матрица bool «номер × день заезда»: свободен ли номер nights ночей
+        подряд, начиная с этого дня. Окно поиска — days дней от start.
+        """
+        with self.lock:
+            a, b = self._columns(start, days + nights - 1)
+            rows = self._room_rows(room_ids)
+            busy = self.matrix[rows, a:b] != FREE
+        # скользящая сумма занятых ночей через накопленную сумму
+        counts = np.zeros((busy.shape[0], busy.shape[1] + 1), dtype=np.int32)
+        np.cumsum(busy, axis=1, out=counts[:, 1:])
+        return rows, (counts[:, nights:] - counts[:, :-nights]) == 0
+
+    def room_info(self, rows):
+        return [{"room_id": self.room_ids[r], "number": self.room_numbers[r]} for r in rows]
+
+
+occupancy = OccupancyCalendar()
+
+
+# -----------------------------
+# Инкрементальное обновление после коммита
+# -----------------------------
+def _old(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, attr)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_booking_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Booking) and obj.status in STATUS_CODES:
+            changes.append((obj.room_id, obj.start_date, obj.end_date, STATUS_CODES[obj.status]))
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        old_status = _old(state, "status")
+        if old_status in STATUS_CODES:
+            changes.append((_old(state, "room_id"), _old(state, "start_date"), _old(state, "end_date"), None))
+        if obj not in session.deleted and obj.status in STATUS_CODES:
+            changes.append((obj.room_id, obj.start_date, obj.end_date, STATUS_CODES[obj.status]))
+    changes = [c for c in changes if c[1] is not None and c[2] is not None]
+    if changes:
+        session.info.setdefault("occupancy_changes", []).extend(changes)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_booking_changes(session):
+    changes = session.info.pop("occupancy_changes", [])
+    if changes:
+        occupancy.apply(changes)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_booking_changes(session):
+    session.info.pop("occupancy_changes", None)
+
+
+def _fresh_calendar() -> OccupancyCalendar:
+    session: Session = SessionLocal()
+    try:
+        occupancy.ensure_fresh(
+            session,
+            current_app.config.get("OCCUPANCY_PAST_DAYS", 31),
+            current_app.config.get("OCCUPANCY_FUTURE_DAYS", 730),
+            current_app.config.get("OCCUPANCY_SYNC_SECONDS", 5),
+        )
+    finally:
+        session.close()
+    return occupancy
+
+
+def occupancy_grid(start: date, days: int, room_ids=None) -> dict:
+    """Занятость номеров × дней одним ответом."""
+    calendar = _fresh_calendar()
+    rows, matrix = calendar.window(start, days, room_ids)
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "dates": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+        "legend": {"0": "свободно", "1": "создана", "2": "оплачена"},
+        "rooms": [
+            {**info, "days": matrix[i].tolist()}
+            for i, info in enumerate(calendar.room_info(rows))
+        ],
+    }
+
+
+def free_rooms(start: date, days: int, nights: int, room_ids=None) -> dict:
+    """Для каждого номера — дни заезда в окне, когда он свободен nights ночей подряд."""
+    calendar = _fresh_calendar()
+    rows, free = calendar.free_starts(start, days, nights, room_ids)
+    result = []
+    for i, info in enumerate(calendar.room_info(rows)):
+        offsets = np.flatnonzero(free[i])
+        if offsets.size:
+            result.append({**info, "starts": [(start + timedelta(days=int(o))).isoformat() for o in offsets]})
+    return {"start": start.isoformat(), "days": days, "nights": nights, "rooms": result}
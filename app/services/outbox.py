@@ -0,0 +1,398 @@
+# app/services/outbox.py
+"""
+События жизненного цикла брони для внешних систем (уборка, channel
+manager, бухгалтерия) — транзакционный outbox.
+
+1. Запись. create_booking, групповая бронь, оплата и отмена добавляют
+   строку outbox_events (record) в той же сессии, что и само изменение:
+   событие сохраняется тогда и только тогда, когда закоммичена бронь.
+
+2. Публикация. Диспетчер (фоновый поток каждого процесса) присваивает
+   новым событиям порядковые номера seq — по одному писателю за раз
+   (advisory-блокировка на PostgreSQL, BEGIN IMMEDIATE на SQLite), по
+   возрастанию id. seq идут без пропусков и только у закоммиченных
+   событий, поэтому курсор «seq > N» ничего не теряет — в отличие от id,
+   который на PostgreSQL выдаётся до коммита, и строка с меньшим id может
+   появиться позже строки с большим.
+
+3. Чтение. Подписчики забирают события сами: GET /admin/events?after=N —
+   пачка с seq > N и курсор для следующего запроса. Курсор хранит
+   подписчик и сдвигает после обработки: доставка «хотя бы один раз».
+
+4. Вебхуки (OUTBOX_WEBHOOKS). Диспетчер отправляет подписчику пачки по
+   порядку (POST JSON) и сдвигает его позицию только после ответа 2xx;
+   при ошибке — повтор той же пачки с растущей паузой. Подписчика в один
+   момент обслуживает один процесс — аренда (lease) в outbox_consumers.
+
+Доставленные всем подписчикам события старше OUTBOX_KEEP_DAYS удаляются.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, event, func, select, text, update
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, write_engine
+from app.models import OutboxConsumer, OutboxEvent
+from app.services.room_locks import begin_booking_write
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("booking.created", "booking.paid", "booking.cancelled")
+
+# ключ advisory-блокировки публикации (см. room_locks, migrations)
+LOCK_KEY = 7303
+
+# чистка старых событий — не чаще раза в столько секунд
+PRUNE_INTERVAL = 3600
+
+# пауза перед повтором доставки: 2, 4, 8 … секунд, не больше MAX_BACKOFF
+MAX_BACKOFF = 300
+
+events = OutboxEvent.__table__
+consumers = OutboxConsumer.__table__
+
+
+# -----------------------------
+# Запись
+# -----------------------------
+def booking_data(booking) -> dict:
+    return {
+        "booking_id": booking.id,
+        "room_id": booking.room_id,
+        "customer_id": booking.customer_id,
+        "start_date": booking.start_date.isoformat() if booking.start_date else None,
+        "end_date": booking.end_date.isoformat() if booking.end_date else None,
+        "final_amount": booking.final_amount,
+        "status": booking.status,
+    }
+
+
+def record(session: Session, event_type: str, booking, **extra):
+    """
+    Добавляет событие в сессию; сохранится вместе с её коммитом.
+    У брони уже должен быть id (после flush).
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Неизвестный тип события: {event_type}")
+    session.add(OutboxEvent(
+        event_type=event_type,
+        booking_id=booking.id,
+        payload=json.dumps({**booking_data(booking), **extra}, ensure_ascii=False, default=str),
+        created_at=datetime.now(),
+    ))
+    session.info["outbox"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_dispatcher(session):
+    # новое событие публикуем сразу, не дожидаясь очередного опроса
+    if session.info.pop("outbox", False):
+        dispatcher.wake()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_events(session):
+    session.info.pop("outbox", None)
+
+
+# -----------------------------
+# Публикация и чтение
+# -----------------------------
+def publish(limit: int) -> int:
+    """Присваивает seq до limit неопубликованным событиям. Возвращает их число."""
+    session: Session = SessionLocal()
+    try:
+        # дешёвая проверка без блокировки записи
+        if session.execute(select(events.c.id).where(events.c.seq.is_(None)).limit(1)).first() is None:
+            return 0
+        session.rollback()
+
+        begin_booking_write(session)
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        last = session.execute(select(func.max(events.c.seq))).scalar() or 0
+        pending = session.execute(
+            select(events.c.id).where(events.c.seq.is_(None)).order_by(events.c.id).limit(limit)
+        ).scalars().all()
+        if pending:
+            now = datetime.now()
+            session.connection().execute(
+                update(events)
+                .where(events.c.id == bindparam("event_id"))
+                .values(seq=bindparam("new_seq"), published_at=now),
+                [{"event_id": event_id, "new_seq": last + i} for i, event_id in enumerate(pending, start=1)],
+            )
+        session.commit()
+        return len(pending)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def as_dict(row) -> dict:
+    return {
+        "seq": row.seq,
+        "id": row.id,
+        "type": row.event_type,
+        "booking_id": row.booking_id,
+        "created_at": row.created_at.isoformat(timespec="seconds") if row.created_at else None,
+        "data": json.loads(row.payload),
+    }
+
+
+def read_events(session: Session, after: int = 0, limit: int = 100, types=None, upto: int = None) -> list:
+    """Опубликованные события с after < seq <= upto по порядку; types — фильтр по типу."""
+    query = select(events).where(events.c.seq > after)
+    if upto is not None:
+        query = query.where(events.c.seq <= upto)
+    if types:
+        query = query.where(events.c.event_type.in_(types))
+    rows = session.execute(query.order_by(events.c.seq).limit(limit)).all()
+    return [as_dict(row) for row in rows]
+
+
+def last_seq(session: Session) -> int:
+    return session.execute(select(func.max(events.c.seq))).scalar() or 0
+
+
+# -----------------------------
+# Вебхуки
+# -----------------------------
+def parse_webhooks(value: str) -> dict:
+    """'имя=url,имя2=url2' → {имя: url}"""
+    result = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"OUTBOX_WEBHOOKS: ожидается имя=url, получено {item!r}")
+        result[name.strip()] = url.strip()
+    return result
+
+
+def sync_consumers(webhooks: dict):
+    """Создаёт строки подписчиков из настроек и обновляет их адреса."""
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        known = {consumer.name: consumer for consumer in session.query(OutboxConsumer)}
+        for name, url in webhooks.items():
+            if name in known:
+                known[name].url = url
+            else:
+                session.add(OutboxConsumer(name=name, url=url, position=0, lease_until=0.0, failures=0))
+        session.commit()
+    finally:
+        session.close()
+
+
+def consumers_status() -> list:
+    session: Session = SessionLocal()
+    try:
+        head = last_seq(session)
+        return [
+            {
+                "name": consumer.name,
+                "url": consumer.url,
+                "position": consumer.position,
+                "behind": head - consumer.position,
+                "failures": consumer.failures,
+                "error": consumer.error,
+                "delivered_at": consumer.delivered_at.isoformat(timespec="seconds") if consumer.delivered_at else None,
+            }
+            for consumer in session.query(OutboxConsumer).order_by(OutboxConsumer.name)
+        ]
+    finally:
+        session.close()
+
+
+def _acquire(name: str, owner: str, lease_seconds: float):
+    """Берёт аренду подписчика; возвращает (url, position) или None."""
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        now = time.time()
+        taken = session.execute(
+            update(consumers)
+            .where(consumers.c.name == name, consumers.c.lease_until < now)
+            .values(lease_owner=owner, lease_until=now + lease_seconds)
+        ).rowcount
+        session.commit()
+        if not taken:
+            return None
+        row = session.execute(
+            select(consumers.c.url, consumers.c.position).where(consumers.c.name == name)
+        ).first()
+        return tuple(row)
+    finally:
+        session.close()
+
+
+def _release(name: str, owner: str, position: int, delivered: int, error: str = None):
+    """Снимает аренду и сохраняет позицию; при ошибке — пауза перед повтором."""
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        values = {"lease_owner": None, "position": position, "error": error}
+        if delivered:
+            values["delivered_at"] = datetime.now()
+        if error is None:
+            values.update(lease_until=0.0, failures=0)
+        else:
+            # аренда держится до конца паузы — до тех пор подписчика никто не трогает
+            failures = session.execute(select(consumers.c.failures).where(consumers.c.name == name)).scalar() or 0
+            values.update(lease_until=time.time() + min(2 ** (failures + 1), MAX_BACKOFF), failures=failures + 1)
+            logger.warning("Доставка событий %s не удалась (%s подряд): %s", name, failures + 1, error)
+        session.execute(
+            update(consumers)
+            .where(consumers.c.name == name, consumers.c.lease_owner == owner)
+            .values(**values)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def _post(url: str, body: dict, timeout: float):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(url, data=data, method="POST",
+                                     headers={"Content-Type": "application/json"})
+    # ответы 4xx/5xx urlopen сам превращает в HTTPError
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if not 200 <= response.status < 300:
+            raise OSError(f"HTTP {response.status}")
+
+
+def deliver(name: str, owner: str, batch_size: int, lease_seconds: float, timeout: float) -> int:
+    """Отправляет подписчику следующие пачки событий; возвращает число доставленных."""
+    acquired = _acquire(name, owner, lease_seconds)
+    if acquired is None:
+        return 0
+    url, position = acquired
+    delivered = 0
+    started = time.monotonic()
+    error = None
+    try:
+        # пока аренда не истекла (с запасом на один запрос)
+        while time.monotonic() - started < lease_seconds - timeout:
+            session: Session = SessionLocal()
+            try:
+                batch = read_events(session, after=position, limit=batch_size)
+            finally:
+                session.close()
+            if not batch:
+                break
+            _post(url, {"consumer": name, "events": batch, "cursor": batch[-1]["seq"]}, timeout)
+            # позиция сдвигается только после 2xx: «хотя бы один раз»
+            position = batch[-1]["seq"]
+            delivered += len(batch)
+    except (OSError, ValueError) as e:  # URLError, HTTPError, таймаут — подклассы OSError
+        error = str(e) or e.__class__.__name__
+    _release(name, owner, position, delivered, error)
+    return delivered
+
+
+# -----------------------------
+# Чистка
+# -----------------------------
+def prune(keep_days: int, webhooks=()) -> int:
+    """Удаляет опубликованные события старше keep_days, уже доставленные вебхукам webhooks."""
+    session: Session = SessionLocal(bind=write_engine)
+    try:
+        query = events.delete().where(
+            events.c.seq.is_not(None),
+            events.c.created_at < datetime.now() - timedelta(days=keep_days),
+        )
+        if webhooks:
+            slowest = session.execute(
+                select(func.min(consumers.c.position)).where(consumers.c.name.in_(list(webhooks)))
+            ).scalar() or 0
+            query = query.where(events.c.seq <= slowest)
+        count = session.execute(query).rowcount
+        session.commit()
+        return count
+    finally:
+        session.close()
+
+
+# -----------------------------
+# Диспетчер
+# -----------------------------
+class OutboxDispatcher:
+    """Фоновый поток процесса: публикация, рассылка вебхуков, чистка."""
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 1.0
+        self.batch_size = 500
+        self.webhooks = {}
+        self.lease_seconds = 60.0
+        self.timeout = 10.0
+        self.keep_days = 7
+        self.pid = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pruned_at = 0.0
+
+    def ensure_running(self):
+        # поток не переживает fork: в каждом воркере запускаем свой
+        if not self.enabled or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.wakeup = threading.Event()
+            threading.Thread(target=self._loop, name="outbox-dispatcher", daemon=True).start()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def run_once(self) -> int:
+        published = 0
+        while True:
+            count = publish(self.batch_size)
+            published += count
+            if count < self.batch_size:
+                break
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        for name in self.webhooks:
+            deliver(name, owner, self.batch_size, self.lease_seconds, self.timeout)
+        if time.monotonic() - self.pruned_at > PRUNE_INTERVAL:
+            self.pruned_at = time.monotonic()
+            prune(self.keep_days, self.webhooks)
+        return published
+
+    def _loop(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Ошибка диспетчера событий")
+
+
+dispatcher = OutboxDispatcher()
+
+
+def init_outbox(app):
+    dispatcher.enabled = app.config.get("OUTBOX_DISPATCH", True)
+    dispatcher.interval = app.config.get("OUTBOX_DISPATCH_SECONDS", 1.0)
+    dispatcher.batch_size = app.config.get("OUTBOX_BATCH_SIZE", 500)
+    dispatcher.webhooks = parse_webhooks(app.config.get("OUTBOX_WEBHOOKS", ""))
+    dispatcher.lease_seconds = app.config.get("OUTBOX_LEASE_SECONDS", 60.0)
+    dispatcher.timeout = app.config.get("OUTBOX_WEBHOOK_TIMEOUT", 10.0)
+    dispatcher.keep_days = app.config.get("OUTBOX_KEEP_DAYS", 7)
+    if dispatcher.webhooks:
+        sync_consumers(dispatcher.webhooks)
+
+    @app.before_request
+    def _start_dispatcher():
+        dispatcher.ensure_running()
@@ -0,0 +1,198 @@
+# app/services/partitions.py
+"""
+Помесячное секционирование (PostgreSQL).
+
+bookings секционируется по start_date, payments — по payment_date,
+transactions — по transaction_date: секция <таблица>_pГГГГ_ММ на каждый
+месяц и <таблица>_default для строк без даты и для месяцев, секции которых
+ещё не созданы. Запросы с условием на дату читают только нужные секции,
+а архивирование (services.archive) удаляет старый месяц целиком — DROP
+секции вместо DELETE миллионов строк.
+
+Ограничения секционированных таблиц PostgreSQL:
+- первичный ключ и уникальные индексы обязаны включать ключ секционирования,
+  а он может быть NULL, поэтому вместо первичного ключа по id — обычный
+  индекс (id по-прежнему выдаёт последовательность);
+- внешний ключ на секционированную таблицу должен ссылаться на уникальный
+  ключ, поэтому payments → bookings и transactions → payments больше не
+  проверяются базой: эти строки создаёт только приложение, в одной транзакции.
+  Внешние ключи на rooms и customers сохраняются.
+
+Секции на PARTITION_MONTHS_AHEAD месяцев вперёд создаются при старте
+приложения и при архивировании; строки, успевшие попасть в default, при
+создании секции переносятся в неё.
+"""
+
+from datetime import date
+
+from sqlalchemy import text
+
+# таблица → колонка-ключ секционирования
+PARTITION_KEYS = {
+    "bookings": "start_date",
+    "payments": "payment_date",
+    "transactions": "transaction_date",
+}
+
+# внешние ключи, которые можно вернуть после секционирования
+KEPT_FOREIGN_KEYS = {
+    "bookings": [("room_id", "rooms"), ("customer_id", "customers")],
+    "payments": [],
+    "transactions": [],
+}
+
+# индексы секционированных таблиц (создаются на родительской таблице)
+PARTITION_INDEXES = {
+    "bookings": [
+        ("ix_bookings_id", ["id"]),
+        ("ix_bookings_room_dates", ["room_id", "start_date", "end_date", "status"]),
+        ("ix_bookings_customer_id", ["customer_id"]),
+    ],
+    "payments": [
+        ("ix_payments_id", ["id"]),
+        ("ix_payments_booking_id", ["booking_id"]),
+    ],
+    "transactions": [
+        ("ix_transactions_id", ["id"]),
+        ("ix_transactions_payment_id", ["payment_id"]),
+    ],
+}
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"
+    ), {"table": table}).first() is not None
+
+
+def partition_exists(connection, name: str) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE c.relname = :name"
+    ), {"name": name}).first() is not None
+
+
+def partition_table(connection, table: str, months_ahead: int):
+    """
+    Превращает обычную таблицу в секционированную по месяцам: создаёт новую
+    таблицу с той же структурой, секции по диапазону существующих данных и
+    переносит строки. Выполняется в одной транзакции (таблица на это время
+    заблокирована) — это разовая операция миграции.
+    """
+    key = PARTITION_KEYS[table]
+    old = f"{table}_unpartitioned"
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+
+    # внешние ключи, ссылающиеся на таблицу, секционирование не переживут
+    referencing = connection.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = CAST(:table AS regclass)"
+    ), {"table": table}).all()
+    for child, constraint in referencing:
+        connection.execute(text(f'ALTER TABLE {child} DROP CONSTRAINT "{constraint}"'))
+
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    if sequence:
+        # иначе последовательность удалится вместе со старой таблицей
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    connection.execute(text(
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({key})"
+    ))
+    connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    first = connection.execute(text(f"SELECT min({key}) FROM {old}")).scalar()
+    start = month_start(min(first or date.today(), date.today()))
+    end = add_months(month_start(date.today()), months_ahead)
+    month = start
+    while month <= end:
+        _create_partition(connection, table, month)
+        month = add_months(month, 1)
+
+    connection.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+    connection.execute(text(f"DROP TABLE {old}"))
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+    for column, target in KEPT_FOREIGN_KEYS[table]:
+        connection.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_{column} "
+            f"FOREIGN KEY ({column}) REFERENCES {target} (id)"
+        ))
+    for name, columns in PARTITION_INDEXES[table]:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+def _create_partition(connection, table: str, month: date):
+    key = PARTITION_KEYS[table]
+    name = partition_name(table, month)
+    if partition_exists(connection, name):
+        return
+    lower, upper = month, add_months(month, 1)
+    bounds = f"FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+
+    in_default = connection.execute(text(
+        f"SELECT 1 FROM {table}_default WHERE {key} >= :lower AND {key} < :upper LIMIT 1"
+    ), {"lower": lower, "upper": upper}).first()
+    if not in_default:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return
+
+    # строки этого месяца уже лежат в default: переносим их в новую таблицу
+    # и только потом подключаем её секцией
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {key} >= :lower AND {key} < :upper RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"lower": lower, "upper": upper})
+    connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+
+def ensure_partitions(engine, months_ahead: int) -> list:
+    """Создаёт недостающие секции до текущего месяца + months_ahead. Только PostgreSQL."""
+    if engine.dialect.name != "postgresql":
+        return []
+    created = []
+    with engine.begin() as connection:
+        for table in PARTITION_KEYS:
+            if not is_partitioned(connection, table):
+                continue
+            month = month_start(date.today())
+            end = add_months(month, months_ahead)
+            while month <= end:
+                name = partition_name(table, month)
+                if not partition_exists(connection, name):
+                    _create_partition(connection, table, month)
+                    created.append(name)
+                month = add_months(month, 1)
+    return created
+
+
+def drop_partition(connection, table: str, month: date, expected_rows: int) -> bool:
+    """
+    Отключает и удаляет секцию месяца, если в ней ровно expected_rows строк
+    (все они уже в архиве). Иначе ничего не делает — строки удаляются DELETE.
+    """
+    name = partition_name(table, month)
+    if not partition_exists(connection, name):
+        return False
+    # до COMMIT в секцию никто не пишет и не читает
+    connection.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+    if connection.execute(text(f"SELECT count(*) FROM {name}")).scalar() != expected_rows:
+        return False
+    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+    return True
@@ -0,0 +1,45 @@
+# app/services/quote_service.py
+"""
+Подписанные токены расчёта брони (quote).
+
+Превью рассчитывает стоимость и выдаёт токен, в котором лежат входные данные
+и результат расчёта. Подтверждение проверяет подпись и срок действия токена
+и использует готовый расчёт, не запрашивая Room/Category повторно.
+"""
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+QUOTE_SALT = "booking-quote"
+
+
+class QuoteError(ValueError):
+    """Токен расчёта отсутствует, подделан или просрочен."""
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.secret_key, salt=QUOTE_SALT)
+
+
+def issue_quote(data: dict, result: dict) -> str:
+    """Подписывает входные данные и результат calculate_booking."""
+    return _serializer().dumps({"data": data, "result": result})
+
+
+def load_quote(token: str) -> tuple:
+    """
+    Проверяет токен и возвращает (data, result).
+    Срок действия задаётся Config.QUOTE_TTL_SECONDS.
+    """
+    if not token:
+        raise QuoteError("Расчёт не найден, выполните предварительный расчёт заново.")
+
+    max_age = current_app.config.get("QUOTE_TTL_SECONDS", 900)
+    try:
+        payload = _serializer().loads(token, max_age=max_age)
+    except SignatureExpired:
+        raise QuoteError("Срок действия расчёта истёк, выполните расчёт заново.")
+    except BadSignature:
+        raise QuoteError("Некорректный расчёт, выполните расчёт заново.")
+
+    return payload["data"], payload["result"]
@@ -0,0 +1,198 @@
+# app/services/rate_calendar.py
+"""
+Календарь тарифов: плотная матрица коэффициентов «категория × день».
+
+Цена ночи = Room.price_per_night × коэффициент дня. Коэффициенты задаются
+сезонными правилами (RateRule): правило умножает цену в своём интервале
+дат, для одной категории или для всех, при желании — только в указанные
+дни недели; пересекающиеся правила перемножаются.
+
+Правила «разворачиваются» в матрицу один раз при построении, вместе с
+накопленной суммой по дням, поэтому сумма коэффициентов за проживание —
+разность двух элементов, сколько бы ночей и правил ни было:
+
+    factor(start, end) = prefix[row, end] - prefix[row, start]
+
+Строка 0 — категории без собственных правил (только общие правила),
+остальные строки — категории, у которых есть свои правила. Матрица
+покрывает дни от (сегодня - RATE_PAST_DAYS) до (сегодня + RATE_FUTURE_DAYS)
+и расширяется до границ самого дальнего правила; ночи вне неё правилами
+не покрыты и идут по базовой цене.
+
+Изменения правил через ORM сбрасывают матрицу после коммита, изменения из
+других процессов замечаются по версии таблицы rate_rules (см. table_versions)
+не чаще раза в RATE_SYNC_SECONDS. Настройки читаются из Config напрямую:
+расчёт цены вызывается и вне запроса (скрипты, бенчмарки).
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.db import SessionLocal
+from app.models import Category, RateRule
+from app.services.table_versions import table_version
+
+DEFAULT_ROW = 0
+
+
+def parse_weekdays(raw) -> list:
+    """«5,6» → [5, 6]; пустое значение — все дни недели."""
+    if not raw:
+        return []
+    days = sorted({int(part) for part in str(raw).split(",") if part.strip()})
+    if any(not 0 <= day <= 6 for day in days):
+        raise ValueError("Дни недели задаются числами от 0 (пн) до 6 (вс)")
+    return days
+
+
+class RateCalendar:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.factors = np.ones((1, 0))
+        self.prefix = np.zeros((1, 1))
+        self.origin = None          # дата первого столбца
+        self.built_on = None
+        self.rows = {}              # category_id → строка (категории со своими правилами)
+        self.version = None
+        self.checked_at = 0.0
+        self.stale = True
+
+    # -- построение --
+    def build(self, session: Session, past_days: int, future_days: int):
+        version = table_version(session, RateRule)
+        rules = session.query(RateRule).order_by(RateRule.id).all()
+
+        origin = date.today() - timedelta(days=past_days)
+        end = date.today() + timedelta(days=future_days)
+        if rules:
+            origin = min(origin, min(rule.start_date for rule in rules))
+            end = max(end, max(rule.end_date for rule in rules))
+        days = (end - origin).days
+
+        category_ids = sorted({rule.category_id for rule in rules if rule.category_id is not None})
+        rows = {category_id: i + 1 for i, category_id in enumerate(category_ids)}
+
+        factors = np.ones((len(rows) + 1, days))
+        # день недели каждого столбца
+        weekday = (np.arange(days) + origin.weekday()) % 7
+        for rule in rules:
+            a = max((rule.start_date - origin).days, 0)
+            b = min((rule.end_date - origin).days, days)
+            if a >= b:
+                continue
+            target = slice(None) if rule.category_id is None else rows[rule.category_id]
+            columns = np.arange(a, b)
+            weekdays = parse_weekdays(rule.weekdays)
+            if weekdays:
+                columns = columns[np.isin(weekday[a:b], weekdays)]
+            factors[target, columns] *= rule.multiplier
+
+        prefix = np.zeros((factors.shape[0], days + 1))
+        np.cumsum(factors, axis=1, out=prefix[:, 1:])
+
+        with self.lock:
+            self.factors = factors
+            self.prefix = prefix
+            self.origin = origin
+            self.built_on = date.today()
+            self.rows = rows
+            self.version = version
+            self.checked_at = time.monotonic()
+            self.stale = False
+
+    def ensure_fresh(self, session: Session, past_days: int, future_days: int, interval: float):
+        """Перестраивает матрицу, если она устарела (новый день, новые правила)."""
+        with self.lock:
+            needs_build = self.stale or self.built_on != date.today()
+            if not needs_build and time.monotonic() - self.checked_at >= interval:
+                needs_build = table_version(session, RateRule) != self.version
+                self.checked_at = time.monotonic()
+            if needs_build:
+                self.build(session, past_days, future_days)
+
+    # -- чтение --
+    def _span(self, start: date, end: date):
+        """Столбцы [a, b) внутри матрицы и число ночей вне её."""
+        days = self.factors.shape[1]
+        a = min(max((start - self.origin).days, 0), days)
+        b = min(max((end - self.origin).days, 0), days)
+        return a, b, (end - start).days - (b - a)
+
+    def stay_factor(self, category_id, start: date, end: date) -> float:
+        """Сумма коэффициентов за ночи [start, end): цена номера × это = стоимость проживания."""
+        with self.lock:
+            row = self.rows.get(category_id, DEFAULT_ROW)
+            a, b, outside = self._span(start, end)
+            return float(self.prefix[row, b] - self.prefix[row, a]) + outside
+
+    def stay_factors(self, category_ids, starts, ends) -> np.ndarray:
+        """То же для пачки проживаний одним векторным обращением к матрице."""
+        with self.lock:
+            rows = np.array([self.rows.get(c, DEFAULT_ROW) for c in category_ids], dtype=np.intp)
+            spans = np.array([self._span(s, e) for s, e in zip(starts, ends)], dtype=np.intp).reshape(-1, 3)
+            return self.prefix[rows, spans[:, 1]] - self.prefix[rows, spans[:, 0]] + spans[:, 2]
+
+    def nightly(self, category_id, start: date, days: int) -> list:
+        """Коэффициенты по дням — для показа тарифной сетки."""
+        with self.lock:
+            row = self.rows.get(category_id, DEFAULT_ROW)
+            values = np.ones(days)
+            offset = (start - self.origin).days
+            lo, hi = max(0, -offset), min(days, self.factors.shape[1] - offset)
+            if lo < hi:
+                values[lo:hi] = self.factors[row, offset + lo:offset + hi]
+            return values.tolist()
+
+
+rate_calendar = RateCalendar()
+
+
+# -----------------------------
+# Сброс после изменения правил
+# -----------------------------
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_rule_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, RateRule):
+            session.info["rate_rules_changed"] = True
+            return
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _reset_calendar(session):
+    if session.info.pop("rate_rules_changed", False):
+        with rate_calendar.lock:
+            rate_calendar.stale = True
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_rule_changes(session):
+    session.info.pop("rate_rules_changed", None)
+
+
+def fresh_calendar(session: Session) -> RateCalendar:
+    rate_calendar.ensure_fresh(session, Config.RATE_PAST_DAYS, Config.RATE_FUTURE_DAYS,
+                               Config.RATE_SYNC_SECONDS)
+    return rate_calendar
+
+
+def rate_grid(session: Session, start: date, days: int) -> dict:
+    """Цена ночи по категориям × дням (базовая цена категории × коэффициент)."""
+    calendar = fresh_calendar(session)
+    categories = session.query(Category.id, Category.name, Category.base_price).order_by(Category.id).all()
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "dates": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+        "categories": [
+            {"category_id": cid, "name": name,
+             "prices": [round(base_price * f, 2) for f in calendar.nightly(cid, start, days)]}
+            for cid, name, base_price in categories
+        ],
+    }
@@ -0,0 +1,191 @@
+# app/services/room_assignment.py
+"""
+Подбор конкретного номера, когда гостю важны только категория и даты.
+
+Для каждого номера держится отсортированный список занятых интервалов
+(брони не пересекаются, поэтому и начала, и концы идут по возрастанию);
+соседей запрошенного интервала находим бинарным поиском.
+
+Жадный алгоритм «лучшего совпадения»: заявки обрабатываются по дате
+заезда (при одной дате — сначала длинные), каждой достаётся тот подходящий номер, где она
+оставляет наименьшие «дыры» до соседних броней; при равенстве — номер
+меньшей вместимости (большие номера остаются для больших групп). Так брони
+укладываются плотно, и в календаре меньше непродаваемых одиночных ночей.
+
+Одиночная бронь (pick_room — внутри транзакции брони, под блокировкой)
+расписаний не загружает: для каждого номера категории читаются только две
+соседние брони — последняя, начавшаяся до заезда, и первая, начавшаяся в
+день заезда или позже. Брони номера не пересекаются, поэтому этих двух
+достаточно и для проверки занятости, и для «дыр».
+"""
+
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Booking, Room
+
+# «дыра» до соседа, которого нет: свободный с этой стороны номер хуже, чем
+# номер, где бронь встаёт вплотную к существующей
+OPEN_GAP = 366
+
+
+def _gap_score(previous_end, next_start, start: int, end: int):
+    """
+    Сумма «дыр» между интервалом и соседними бронями (концом предыдущей,
+    началом следующей; None — соседа нет) или None, если интервал не помещается.
+    """
+    if previous_end is not None and previous_end > start:
+        return None
+    if next_start is not None and next_start < end:
+        return None
+    before = min(start - previous_end, OPEN_GAP) if previous_end is not None else OPEN_GAP
+    after = min(next_start - end, OPEN_GAP) if next_start is not None else OPEN_GAP
+    return before + after
+
+
+class RoomSchedule:
+    __slots__ = ("room_id", "number", "capacity", "starts", "ends")
+
+    def __init__(self, room_id: int, number: int, capacity: int):
+        self.room_id = room_id
+        self.number = number
+        self.capacity = capacity
+        self.starts = []
+        self.ends = []
+
+    def add(self, start: int, end: int):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+    def gap_score(self, start: int, end: int):
+        """Сумма «дыр» до соседних броней или None, если интервал не помещается."""
+        i = bisect_right(self.starts, start)
+        return _gap_score(self.ends[i - 1] if i > 0 else None,
+                          self.starts[i] if i < len(self.starts) else None,
+                          start, end)
+
+
+class RoomAssigner:
+    """
+    Расписания номеров нужных категорий на нужный период для пакетного
+    подбора — загружаются двумя запросами (брони — с запасом OPEN_GAP дней,
+    чтобы видеть соседей).
+    """
+
+    def __init__(self, session: Session, category_ids, start: date, end: date):
+        start -= timedelta(days=OPEN_GAP)
+        end += timedelta(days=OPEN_GAP)
+        self.by_category = {}
+        schedules = {}
+        rooms = (
+            session.query(Room.id, Room.number, Room.category_id, Room.capacity)
+            .filter(Room.category_id.in_(set(category_ids)))
+            .all()
+        )
+        for room_id, number, category_id, capacity in rooms:
+            schedule = RoomSchedule(room_id, number, capacity or 0)
+            schedules[room_id] = schedule
+            self.by_category.setdefault(category_id, []).append(schedule)
+
+        # импорт здесь, чтобы не было цикла booking_service ↔ room_assignment
+        from app.services.booking_service import ACTIVE_STATUSES
+        if schedules:
+            bookings = (
+                session.query(Booking.room_id, Booking.start_date, Booking.end_date)
+                .filter(Booking.room_id.in_(schedules.keys()),
+                        Booking.status.in_(ACTIVE_STATUSES),
+                        Booking.start_date < end,
+                        Booking.end_date > start)
+                .order_by(Booking.room_id, Booking.start_date)
+                .all()
+            )
+            for room_id, booking_start, booking_end in bookings:
+                schedule = schedules[room_id]
+                schedule.starts.append(booking_start.toordinal())
+                schedule.ends.append(booking_end.toordinal())
+
+    def pick(self, category_id: int, guests: int, start: date, end: date):
+        """Лучший свободный номер категории для интервала; интервал сразу занимается."""
+        a, b = start.toordinal(), end.toordinal()
+        best, best_key = None, None
+        for schedule in self.by_category.get(category_id, ()):
+            if schedule.capacity < guests:
+                continue
+            score = schedule.gap_score(a, b)
+            if score is None:
+                continue
+            key = (score, schedule.capacity, schedule.number)
+            if best_key is None or key < best_key:
+                best, best_key = schedule, key
+        if best is None:
+            return None
+        best.add(a, b)
+        return best.room_id
+
+
+def assign_rooms(session: Session, requests: list) -> list:
+    """
+    requests — словари с category_id, guests_count, start_date, end_date (date).
+    Возвращает room_id для каждой заявки в исходном порядке (None — мест нет).
+    """
+    if not requests:
+        return []
+    assigner = RoomAssigner(
+        session,
+        {r["category_id"] for r in requests},
+        min(r["start_date"] for r in requests),
+        max(r["end_date"] for r in requests),
+    )
+    # по дате заезда; длина брони — только при равных датах (длинные раньше)
+    order = sorted(
+        range(len(requests)),
+        key=lambda i: (requests[i]["start_date"], requests[i]["start_date"] - requests[i]["end_date"]),
+    )
+    result = [None] * len(requests)
+    for i in order:
+        r = requests[i]
+        result[i] = assigner.pick(r["category_id"], int(r.get("guests_count", 1)), r["start_date"], r["end_date"])
+    return result
+
+
+def pick_room(session: Session, category_id: int, guests: int, start: date, end: date):
+    """Номер для одной заявки (None — в категории нет свободных подходящих номеров)."""
+    from app.services.booking_service import ACTIVE_STATUSES
+    active = Booking.status.in_(ACTIVE_STATUSES)
+    # соседи по индексу ix_bookings_room_dates: поиск останавливается на первой
+    # активной брони, сколько бы броней ни было у номера
+    previous_end = (
+        select(Booking.end_date)
+        .where(Booking.room_id == Room.id, active, Booking.start_date < start)
+        .order_by(Booking.start_date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    next_start = (
+        select(Booking.start_date)
+        .where(Booking.room_id == Room.id, active, Booking.start_date >= start)
+        .order_by(Booking.start_date)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rooms = (
+        session.query(Room.id, Room.number, Room.capacity, previous_end, next_start)
+        .filter(Room.category_id == category_id, Room.capacity >= guests)
+        .all()
+    )
+
+    a, b = start.toordinal(), end.toordinal()
+    best, best_key = None, None
+    for room_id, number, capacity, before, after in rooms:
+        score = _gap_score(before.toordinal() if before else None,
+                           after.toordinal() if after else None, a, b)
+        if score is None:
+            continue
+        key = (score, capacity or 0, number)
+        if best_key is None or key < best_key:
+            best, best_key = room_id, key
+    return best
@@ -0,0 +1,44 @@
+# app/services/room_locks.py
+"""
+Блокировки номеров при записи броней.
+
+Проверка занятости и вставка брони должны идти под блокировкой, иначе два
+параллельных запроса оба увидят свободный номер и оба его забронируют.
+Глобальная блокировка выстроила бы в очередь все брони отеля, поэтому:
+
+- PostgreSQL — транзакционные advisory-блокировки pg_advisory_xact_lock
+  по id номера: ждут друг друга только брони одного номера, блокировка
+  снимается сама при COMMIT/ROLLBACK. Несколько номеров (групповая бронь)
+  блокируются по возрастанию id — так две заявки не ждут друг друга по кругу;
+- SQLite — писатель в базе всё равно один, поэтому транзакция брони
+  начинается с BEGIN IMMEDIATE (см. db._begin): блокировка записи берётся
+  до проверки занятости, а не в момент INSERT, и вторая бронь ждёт первую
+  (busy_timeout) вместо того, чтобы прочитать устаревшие данные.
+  Читатели в режиме WAL при этом не блокируются.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# первый ключ двухключевой advisory-блокировки — «пространство» броней,
+# чтобы не пересекаться с другими advisory-блокировками в той же базе
+LOCK_NAMESPACE = 7301
+
+
+def begin_booking_write(session: Session):
+    """
+    Открывает транзакцию брони. Вызывать до первого запроса в сессии:
+    на SQLite транзакция начнётся с BEGIN IMMEDIATE.
+    """
+    session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def lock_rooms(session: Session, room_ids):
+    """Блокирует номера до конца текущей транзакции (PostgreSQL)."""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    for room_id in sorted({int(room_id) for room_id in room_ids}):
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :room_id)"),
+            {"namespace": LOCK_NAMESPACE, "room_id": room_id},
+        )
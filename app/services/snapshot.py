@@ -0,0 +1,404 @@
+# app/services/snapshot.py
+"""
+Колоночный снимок броней для аналитики.
+
+Каждая колонка — отдельный файл фиксированного типа без заголовка, который
+открывается через np.memmap: процесс не читает файл целиком, а отображает его
+в память, и все воркеры (gunicorn, фоновые задачи) делят одну копию данных в
+страничном кэше ОС.
+
+    SNAPSHOT_DIR/meta.json           — поколение, число строк, max(id), версия bookings
+    SNAPSHOT_DIR/gNNNNNN/<колонка>.bin
+    SNAPSHOT_DIR/gNNNNNN/room_category.bin  — id номера → id категории
+
+Колонки: id, room_id, дни заезда/выезда/создания (номер дня от 1970-01-01),
+гости, итоговая сумма, код статуса (список статусов — в meta.json). NULL
+хранится как NULL_INT, в сумме — как NaN (SQLite хранит в final_amount и
+дробные значения).
+
+Обновление (current) сверяется с версией таблицы bookings (table_versions):
+- версия та же, max(id) вырос — новые строки дописываются в конец файлов,
+  а meta.json (число строк) переписывается после fsync; читатели видят
+  только первые rows строк, поэтому недописанный хвост им не мешает;
+- счётчик изменений сдвинулся (оплата, отмена, архивирование) — снимок
+  строится заново в новом поколении, но не чаще раза в
+  SNAPSHOT_MAX_AGE_SECONDS; до этого новые строки дописываются, а статусы
+  старых могут отставать.
+Строки, закоммиченные позже строк с большим id (PostgreSQL), подбираются
+дозаписью: она перечитывает последние ID_OVERLAP id.
+
+Снимок включает заархивированные брони (services.archive), так что
+аналитика читает его вместо базы и архива.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.models import Booking, Room
+from app.services.archive import read_archived
+from app.services.table_versions import table_version
+
+try:
+    import fcntl
+except ImportError:  # Windows: между процессами не блокируем
+    fcntl = None
+
+META = "meta.json"
+LOCK = ".lock"
+NULL_INT = np.iinfo(np.int32).min
+
+# колонка снимка → (тип, колонка bookings)
+COLUMNS = {
+    "id": (np.int64, "id"),
+    "room_id": (np.int32, "room_id"),
+    "start_day": (np.int32, "start_date"),
+    "end_day": (np.int32, "end_date"),
+    "created_day": (np.int32, "created_at"),
+    "guests": (np.int32, "guests_count"),
+    "amount": (np.float64, "final_amount"),
+    "status": (np.int16, "status"),
+}
+SOURCE_COLUMNS = [source for _, source in COLUMNS.values()]
+
+ID_OVERLAP = 1000
+CHUNK = 50000
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_attached = None  # Snapshot последнего attach в этом процессе
+
+
+# -----------------------------
+# Чтение
+# -----------------------------
+@dataclass
+class Snapshot:
+    meta: dict
+    columns: dict        # имя → np.memmap (или пустой массив)
+    room_category: np.ndarray
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def category_id(self) -> np.ndarray:
+        """Категория номера каждой брони (NULL_INT, если номер неизвестен)."""
+        room_id = self.columns["room_id"]
+        known = (room_id >= 0) & (room_id < len(self.room_category))
+        return np.where(known, self.room_category[np.where(known, room_id, 0)], NULL_INT)
+
+    def frame(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Брони в виде DataFrame с колонками bookings (как из базы); фильтр по
+        дате заезда, включительно. Копируются только отобранные строки.
+        """
+        start = self.columns["start_day"]
+        mask = None
+        if start_date:
+            mask = (start != NULL_INT) & (start >= _day(start_date))
+        if end_date:
+            upper = (start != NULL_INT) & (start <= _day(end_date))
+            mask = upper if mask is None else mask & upper
+
+        data = {}
+        statuses = np.array(self.meta["statuses"], dtype=object)
+        for name, (_, source) in COLUMNS.items():
+            values = self.columns[name]
+            values = values[mask] if mask is not None else np.asarray(values)
+            if name == "status":
+                values = statuses[values]
+            elif name.endswith("_day"):
+                days = values.astype("datetime64[D]")
+                days[values == NULL_INT] = np.datetime64("NaT")
+                values = days
+            elif values.dtype.kind == "f":
+                values = np.asarray(values)
+            elif (values == NULL_INT).any():
+                values = np.where(values == NULL_INT, np.nan, values)
+            else:
+                values = values.astype(np.int64)  # как из базы
+            data[source] = values
+        return pd.DataFrame(data, columns=SOURCE_COLUMNS)
+
+
+def _day(value) -> int:
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+def _meta_path(directory: str) -> str:
+    return os.path.join(directory, META)
+
+
+def _generation_dir(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"g{generation:06d}")
+
+
+def load_meta(directory: str = None):
+    path = _meta_path(directory or Config.SNAPSHOT_DIR)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _map(path: str, dtype, rows: int):
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+
+def attach(directory: str = None):
+    """
+    Отображает снимок в память (без копирования). Пока поколение и число
+    строк не менялись, возвращает уже открытый Snapshot. None — снимка нет.
+    """
+    global _attached
+    directory = directory or Config.SNAPSHOT_DIR
+    meta = load_meta(directory)
+    if meta is None:
+        return None
+    with _lock:
+        current = _attached
+        if current and current.meta["dir"] == directory and \
+                (current.meta["generation"], current.rows) == (meta["generation"], meta["rows"]):
+            return current
+    meta["dir"] = directory
+    folder = _generation_dir(directory, meta["generation"])
+    columns = {
+        name: _map(os.path.join(folder, f"{name}.bin"), dtype, meta["rows"])
+        for name, (dtype, _) in COLUMNS.items()
+    }
+    room_category = np.fromfile(os.path.join(folder, "room_category.bin"), dtype=np.int32)
+    snapshot = Snapshot(meta, columns, room_category)
+    with _lock:
+        _attached = snapshot
+    return snapshot
+
+
+# -----------------------------
+# Запись
+# -----------------------------
+class _FileLock:
+    """Блокировка записи снимка: потоки процесса и (через flock) процессы."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, LOCK)
+        self.file = None
+
+    def __enter__(self):
+        _write_lock.acquire()
+        if fcntl is not None:
+            self.file = open(self.path, "a")
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+        _write_lock.release()
+
+
+def _save_meta(directory: str, meta: dict):
+    path = _meta_path(directory)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({k: v for k, v in meta.items() if k != "dir"}, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _to_int(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series).fillna(NULL_INT).to_numpy(dtype=np.int64)
+
+
+def _to_days(series: pd.Series) -> np.ndarray:
+    days = pd.to_datetime(series).to_numpy().astype("datetime64[D]")
+    values = days.astype(np.int64)
+    values[np.isnat(days)] = NULL_INT
+    return values
+
+
+def _arrays(df: pd.DataFrame, statuses: list) -> dict:
+    """DataFrame колонок bookings → массивы снимка; новые статусы дописываются в statuses."""
+    codes = {status: i for i, status in enumerate(statuses)}
+    for status in df["status"].drop_duplicates():
+        status = None if pd.isna(status) else status
+        if status not in codes:
+            codes[status] = len(statuses)
+            statuses.append(status)
+    arrays = {}
+    for name, (dtype, source) in COLUMNS.items():
+        series = df[source]
+        if name == "status":
+            values = series.map(lambda s: codes[None if pd.isna(s) else s]).to_numpy()
+        elif name.endswith("_day"):
+            values = _to_days(series)
+        elif np.dtype(dtype).kind == "f":
+            values = pd.to_numeric(series).to_numpy(dtype=np.float64)
+        else:
+            values = _to_int(series)
+        arrays[name] = values.astype(dtype)
+    return arrays
+
+
+def _append(folder: str, arrays: dict):
+    for name, values in arrays.items():
+        with open(os.path.join(folder, f"{name}.bin"), "ab") as f:
+            f.write(np.ascontiguousarray(values).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _db_chunks(session: Session, after_id: int, up_to_id: int):
+    query = (
+        select(*[getattr(Booking, source) for source in SOURCE_COLUMNS])
+        .where(Booking.id > after_id, Booking.id <= up_to_id)
+        .order_by(Booking.id)
+        .execution_options(yield_per=CHUNK)
+    )
+    for partition in session.execute(query).partitions():
+        yield pd.DataFrame(partition, columns=SOURCE_COLUMNS)
+
+
+def _write_room_category(session: Session, folder: str):
+    rooms = session.execute(select(Room.id, Room.category_id)).all()
+    size = max((room_id for room_id, _ in rooms), default=-1) + 1
+    lookup = np.full(size, NULL_INT, dtype=np.int32)
+    for room_id, category_id in rooms:
+        lookup[room_id] = NULL_INT if category_id is None else category_id
+    tmp = os.path.join(folder, "room_category.bin.tmp")
+    lookup.tofile(tmp)
+    os.replace(tmp, os.path.join(folder, "room_category.bin"))
+
+
+def rebuild(session: Session, directory: str = None) -> dict:
+    """Строит снимок заново (база + архив) в новом поколении."""
+    directory = directory or Config.SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    with _FileLock(directory):
+        return _rebuild(session, directory)
+
+
+def _rebuild(session: Session, directory: str) -> dict:
+    max_id, version = table_version(session, Booking)
+    previous = load_meta(directory)
+    generation = previous["generation"] + 1 if previous else 1
+    folder = _generation_dir(directory, generation)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    for name in COLUMNS:
+        open(os.path.join(folder, f"{name}.bin"), "wb").close()
+
+    statuses = [None]
+    rows = 0
+    ids = []
+    for df in _db_chunks(session, 0, max_id):
+        _append(folder, _arrays(df, statuses))
+        ids.append(df["id"].to_numpy())
+        rows += len(df)
+
+    archived = read_archived("bookings", columns=SOURCE_COLUMNS,
+                             exclude_ids=np.concatenate(ids) if ids else None)
+    if not archived.empty:
+        _append(folder, _arrays(archived, statuses))
+        rows += len(archived)
+
+    _write_room_category(session, folder)
+    meta = {
+        "generation": generation,
+        "rows": rows,
+        "max_id": max_id,
+        "version": version,
+        "statuses": statuses,
+        "built_at": time.time(),
+        "refreshed_at": time.time(),
+    }
+    _save_meta(directory, meta)
+
+    # старые поколения: соединения-читатели держат отображение, файлы
+    # освобождаются после их закрытия (на Windows удаление может не пройти)
+    for name in os.listdir(directory):
+        if name.startswith("g") and name != os.path.basename(folder) and \
+                name != os.path.basename(_generation_dir(directory, generation - 1)):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return meta
+
+
+def _append_new(session: Session, directory: str, meta: dict, max_id: int) -> dict:
+    folder = _generation_dir(directory, meta["generation"])
+    # хвост прерванной дозаписи (после последнего meta.json) отбрасываем
+    for name, (dtype, _) in COLUMNS.items():
+        os.truncate(os.path.join(folder, f"{name}.bin"), meta["rows"] * np.dtype(dtype).itemsize)
+
+    lower = max(meta["max_id"] - ID_OVERLAP, 0)
+    known = _map(os.path.join(folder, "id.bin"), np.int64, meta["rows"])
+    known = np.asarray(known[known > lower])
+
+    statuses = list(meta["statuses"])
+    rows = meta["rows"]
+    for df in _db_chunks(session, lower, max_id):
+        df = df[~df["id"].isin(known)]
+        if df.empty:
+            continue
+        _append(folder, _arrays(df, statuses))
+        rows += len(df)
+
+    _write_room_category(session, folder)
+    meta = dict(meta, rows=rows, max_id=max(max_id, meta["max_id"]), statuses=statuses,
+                refreshed_at=time.time())
+    _save_meta(directory, meta)
+    return meta
+
+
+def _action(meta, max_id: int, version: int, max_age: float):
+    """None — снимок годится, "append" — дописать новые строки, "rebuild" — построить заново."""
+    if meta is None:
+        return "rebuild"
+    changed = meta["version"] != version or max_id < meta["max_id"]
+    if changed and time.time() - meta["built_at"] >= max_age:
+        return "rebuild"
+    if max_id > meta["max_id"]:
+        return "append"
+    return None
+
+
+def refresh(session: Session, directory: str = None, max_age: float = None) -> dict:
+    """
+    Приводит снимок к версии bookings в session: дозапись новых строк или,
+    если строки менялись и снимок старше max_age, перестройка. Возвращает meta.
+    """
+    directory = directory or Config.SNAPSHOT_DIR
+    max_age = Config.SNAPSHOT_MAX_AGE_SECONDS if max_age is None else max_age
+    max_id, version = table_version(session, Booking)
+    meta = load_meta(directory)
+    if _action(meta, max_id, version, max_age) is None:
+        return meta
+
+    os.makedirs(directory, exist_ok=True)
+    with _FileLock(directory):
+        meta = load_meta(directory)  # другой процесс мог успеть обновить
+        action = _action(meta, max_id, version, max_age)
+        if action == "rebuild":
+            return _rebuild(session, directory)
+        if action == "append":
+            return _append_new(session, directory, meta, max_id)
+        return meta
+
+
+def current(session: Session, directory: str = None) -> Snapshot:
+    """Обновляет снимок по базе (см. refresh) и отображает его в память."""
+    refresh(session, directory)
+    return attach(directory)
@@ -0,0 +1,138 @@
+# app/services/table_versions.py
+"""
+Версии таблиц для условных запросов (ETag / 304).
+
+Версия таблицы — пара (max(id), счётчик изменений):
+- вставки видны по росту max(id) — это поиск по первичному ключу, без
+  сканирования таблицы;
+- UPDATE и DELETE через ORM (в том числе массовые session.execute(update(...)))
+  увеличивают счётчик в change_counters.
+Изменения мимо ORM (сырой SQL, psql) счётчик не видят.
+
+Счётчик сдвигается отдельной короткой транзакцией сразу после коммита, а не
+внутри неё: строка счётчика общая для всей таблицы, и на PostgreSQL её
+блокировка выстроила бы в очередь все параллельные оплаты и отмены до их
+коммита. Цена — короткое окно между коммитом и сдвигом, когда новые данные
+отдаются со старой версией; после сдвига клиенты получают их заново.
+
+Счётчики ведутся только для таблиц из TRACKED_TABLES — тех, что отдаются
+выгрузками или кэшируются в памяти (правила тарифов, поиск клиентов): служебные таблицы
+(jobs и т.п.) обновляются часто и не должны писать в счётчики. Строка
+счётчика создаётся при первом изменении таблицы.
+"""
+
+import hashlib
+import logging
+
+from sqlalchemy import event, func, select, update, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import ChangeCounter
+
+logger = logging.getLogger(__name__)
+
+counters = ChangeCounter.__table__
+
+TRACKED_TABLES = {"bookings", "payments", "transactions", "rate_rules", "customers"}
+
+
+def _bump(connection, table_names):
+    for name in sorted(table_names):
+        result = connection.execute(
+            update(counters)
+            .where(counters.c.table_name == name)
+            .values(version=counters.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(counters).values(table_name=name, version=1))
+
+
+def _bump_now(bind, table_names):
+    """Сдвигает счётчики отдельной транзакцией (после коммита изменений)."""
+    for attempt in range(2):
+        try:
+            with bind.begin() as connection:
+                _bump(connection, table_names)
+            return
+        except IntegrityError:
+            # первую строку счётчика одновременно вставил другой процесс —
+            # теперь она есть, повторяем UPDATE
+            if attempt:
+                raise
+
+
+def _remember(session: Session, table_names):
+    session.info.setdefault("changed_tables", set()).update(table_names)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _count_flushed_changes(session, flush_context):
+    tables = {obj.__table__.name for obj in session.deleted}
+    tables.update(obj.__table__.name for obj in session.dirty if session.is_modified(obj))
+    tables &= TRACKED_TABLES
+    if tables:
+        _remember(session, tables)
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _count_bulk_changes(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+        table = orm_execute_state.bind_mapper.local_table.name
+        if table in TRACKED_TABLES:
+            _remember(orm_execute_state.session, {table})
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _keep_committed_changes(session):
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        session.info["committed_tables"] = tables
+
+
+@event.listens_for(SessionLocal, "after_transaction_end")
+def _bump_after_commit(session, transaction):
+    # сдвигаем, когда соединение транзакции уже вернулось в пул (в
+    # after_commit оно ещё занято): иначе каждая запись держала бы два
+    # соединения, и при нагрузке пул кончался бы
+    if transaction.parent is not None:
+        return
+    tables = session.info.pop("committed_tables", None)
+    if not tables:
+        return
+    try:
+        _bump_now(session.get_bind(), tables)
+    except SQLAlchemyError:
+        # изменения уже закоммичены: не ломаем запрос, версия сдвинется
+        # при следующем изменении таблицы
+        logger.exception("Не удалось сдвинуть версию таблиц %s", sorted(tables))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("changed_tables", None)
+
+
+def mark_changed(session: Session, model):
+    """Сдвигает версию таблицы после изменений мимо ORM (DROP секции и т.п.) — при коммите."""
+    if model.__table__.name in TRACKED_TABLES:
+        _remember(session, {model.__table__.name})
+
+
+def table_version(session: Session, model) -> tuple:
+    """(max(id), счётчик изменений) таблицы модели."""
+    max_id = session.execute(select(func.max(model.id))).scalar() or 0
+    version = session.execute(
+        select(counters.c.version).where(counters.c.table_name == model.__table__.name)
+    ).scalar() or 0
+    return max_id, version
+
+
+def etag_for(session: Session, *models, variant: str = "") -> str:
+    """ETag для ответа, построенного из данных перечисленных таблиц."""
+    parts = [variant]
+    for model in models:
+        max_id, version = table_version(session, model)
+        parts.append(f"{model.__table__.name}:{max_id}:{version}")
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+slow_queries.py — журнал медленных SQL-запросов.
+
+Каждый запрос дольше порога (Config.SLOW_QUERY_THRESHOLD_MS) к основной
+базе или к репликам чтения попадает в кольцевой буфер: текст SQL, параметры
+(в журнале — только типы значений), маршрут, из которого он выполнен, база,
+на которой он выполнялся, и план выполнения. План снимается на той же базе
+фоновым потоком (один раз на каждый уникальный SQL, вне обработки запроса)
+или по кнопке на странице /admin/slow-queries.
+
+Исходные значения параметров хранятся только в памяти процесса и нужны
+лишь для EXPLAIN; наружу они не отдаются.
+
+Время меряется вокруг cursor.execute. В PostgreSQL это время всего запроса;
+SQLite же выполняет SELECT по мере выборки строк, поэтому там в журнал
+попадают запросы, долго ищущие первую строку (например, проверка занятости
+без индекса), а не долгие выгрузки.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# сколько разных планов держать в памяти
+PLAN_CACHE_SIZE = 256
+SKIP_OPTION = "skip_slow_query_log"
+
+
+def redact(parameters, executemany: bool = False):
+    """Заменяет значения параметров их типами: <int>, <str:12>, <date>..."""
+    if executemany:
+        return f"<{len(parameters)} наборов параметров>"
+
+    def mask(value):
+        if value is None:
+            return "NULL"
+        if isinstance(value, str):
+            return f"<str:{len(value)}>"
+        return f"<{type(value).__name__}>"
+
+    if isinstance(parameters, dict):
+        return {key: mask(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [mask(value) for value in parameters]
+    return mask(parameters)
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.engines = []
+        self.threshold = 0.2
+        self.auto_explain = True
+        self.entries = deque(maxlen=200)
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.explain_queue = queue.Queue(maxsize=100)
+        self.worker = None
+
+    # -- настройка --
+    def configure(self, threshold_ms: float, size: int, auto_explain: bool):
+        self.threshold = threshold_ms / 1000
+        self.auto_explain = auto_explain
+        if self.entries.maxlen != size:
+            self.entries = deque(self.entries, maxlen=size)
+
+    def attach(self, engine):
+        if any(known is engine for known in self.engines):
+            return
+        self.engines.append(engine)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["slow_query_start"].pop()
+            if elapsed >= self.threshold and not conn.get_execution_options().get(SKIP_OPTION):
+                self.record(engine, statement, parameters, executemany, elapsed)
+
+    # -- запись --
+    def record(self, engine, statement: str, parameters, executemany: bool, elapsed: float):
+        route = None
+        if has_request_context():
+            route = f"{request.method} {request.path} ({request.endpoint})"
+        entry = {
+            "id": next(self.ids),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "duration_ms": round(elapsed * 1000, 1),
+            "statement": statement,
+            "parameters": redact(parameters, executemany),
+            "route": route,
+            "engine": engine.url.render_as_string(hide_password=True),
+            "_engine": engine,
+            "_raw_parameters": None if executemany else parameters,
+        }
+        with self.lock:
+            self.entries.append(entry)
+            known = _plan_key(entry) in self.plans
+        logger.warning("Медленный SQL (%.1f мс) в %s на %s: %s", elapsed * 1000, route or "—",
+                       entry["engine"], " ".join(statement.split())[:200])
+
+        if self.auto_explain and not known and not executemany:
+            self._ensure_worker()
+            try:
+                self.explain_queue.put_nowait(entry)
+            except queue.Full:
+                pass
+
+    # -- планы --
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+            self.worker.start()
+
+    def _explain_loop(self):
+        while True:
+            entry = self.explain_queue.get()
+            if _plan_key(entry) not in self.plans:
+                self.explain(entry["id"])
+
+    def _run_explain(self, engine, statement: str, parameters) -> str:
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return "EXPLAIN снимается только для SELECT."
+        sqlite = engine.dialect.name == "sqlite"
+        prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+        with engine.connect() as conn:
+            conn = conn.execution_options(**{SKIP_OPTION: True})
+            rows = conn.exec_driver_sql(prefix + statement, parameters or ()).fetchall()
+        return "\n".join(str(row[-1]) if sqlite else str(row[0]) for row in rows)
+
+    def explain(self, entry_id: int) -> str:
+        """Снимает (или берёт из кэша) план для записи журнала."""
+        entry = self.get(entry_id)
+        if entry is None:
+            return None
+        key = _plan_key(entry)
+        with self.lock:
+            plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+        try:
+            # на той базе, где запрос выполнялся: у реплики план может быть другим
+            plan = self._run_explain(entry["_engine"], entry["statement"], entry["_raw_parameters"])
+        except Exception as e:
+            return f"Не удалось получить план: {e}"
+        with self.lock:
+            self.plans[key] = plan
+            while len(self.plans) > PLAN_CACHE_SIZE:
+                self.plans.popitem(last=False)
+        return plan
+
+    # -- чтение --
+    def get(self, entry_id: int):
+        with self.lock:
+            for entry in self.entries:
+                if entry["id"] == entry_id:
+                    return entry
+        return None
+
+    def snapshot(self) -> list:
+        """Записи от новых к старым, без исходных параметров, с планами."""
+        with self.lock:
+            return [
+                {**{k: v for k, v in entry.items() if not k.startswith("_")},
+                 "plan": self.plans.get(_plan_key(entry))}
+                for entry in reversed(self.entries)
+            ]
+
+
+def _plan_key(entry) -> tuple:
+    return entry["engine"], entry["statement"]
+
+
+slow_query_log = SlowQueryLog()
+
+
+def init_slow_query_log(app, engine, replicas=()):
+    """Подключает журнал к основной базе и репликам чтения."""
+    slow_query_log.configure(
+        threshold_ms=app.config.get("SLOW_QUERY_THRESHOLD_MS", 200),
+        size=app.config.get("SLOW_QUERY_LOG_SIZE", 200),
+        auto_explain=app.config.get("SLOW_QUERY_AUTO_EXPLAIN", True),
+    )
+    slow_query_log.attach(engine)
+    for replica in replicas:
+        slow_query_log.attach(replica)
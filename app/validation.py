@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+validation.py — проверка и нормализация контактных данных клиентов.
+Шаблоны компилируются один раз при импорте модуля.
+"""
+
+import re
+
+PHONE_RE = re.compile(r"^\+?\d{10,15}$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+PHONE_SEPARATORS_RE = re.compile(r"[\s()\-]")
+_NON_DIGITS = re.compile(r"\D")
+
+
+def clean_phone(phone: str) -> str:
+    """Убирает пробелы, скобки и дефисы: «+7 (999) 123-45-67» → «+79991234567»."""
+    return PHONE_SEPARATORS_RE.sub("", (phone or "").strip())
+
+
+def is_valid_phone(phone: str) -> bool:
+    return bool(PHONE_RE.fullmatch(phone or ""))
+
+
+def is_valid_email(email: str) -> bool:
+    return bool(EMAIL_RE.fullmatch(email or ""))
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Канонический вид телефона для сравнения: +7XXXXXXXXXX для российских
+    номеров (8XXXXXXXXXX и 9XXXXXXXXX приводятся к нему), иначе + и цифры.
+    """
+    digits = _NON_DIGITS.sub("", phone or "")
+    if len(digits) == 11 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    elif len(digits) == 10 and digits[0] == "9":
+        digits = "7" + digits
+    return "+" + digits if digits else ""
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
@@ -0,0 +1,49 @@
+"""
+archive.py — перенос старых броней, платежей и транзакций в архив.
+
+Месяцы старше ARCHIVE_RETENTION_MONTHS (по умолчанию 24) записываются в
+сжатые колоночные файлы в ARCHIVE_DIR и удаляются из базы; аналитика
+продолжает их учитывать.
+
+Примеры:
+    python archive.py --dry-run          # сколько строк уйдёт в архив
+    python archive.py
+    python archive.py --retention 12     # оставить в базе 12 месяцев
+    python archive.py --list             # что уже в архиве
+"""
+
+import argparse
+
+from app.config import Config
+from app.db import engine, init_db
+from app.services.archive import archive, cutoff_date, load_manifest
+from app.services.partitions import ensure_partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архивирование старых данных.")
+    parser.add_argument("--retention", type=int, help="сколько месяцев оставить в базе")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать строки")
+    parser.add_argument("--list", action="store_true", help="показать содержимое архива и выйти")
+    args = parser.parse_args()
+
+    if args.list:
+        for table, months in sorted(load_manifest()["tables"].items()):
+            total = sum(entry["rows"] for entry in months.values())
+            print(f"{table}: {len(months)} мес., {total} строк")
+            for label, entry in sorted(months.items()):
+                print(f"  {label}: {entry['rows']} ({entry['file']})")
+        return
+
+    init_db()
+    print(f"Граница: данные до {cutoff_date(args.retention)} уходят в архив ({Config.ARCHIVE_DIR})")
+    result = archive(args.retention, dry_run=args.dry_run)
+    for table, count in result.items():
+        print(f"{table}: {count} строк{' (dry run)' if args.dry_run else ''}")
+    created = ensure_partitions(engine, Config.PARTITION_MONTHS_AHEAD)
+    if created:
+        print(f"Созданы секции: {', '.join(created)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+cases.py — замеры одного масштаба данных.
+
+Запускается отдельным процессом из benchmarks/run.py: движок SQLAlchemy
+создаётся при импорте app.db, поэтому DATABASE_URL должен быть выставлен
+до импорта приложения, а каждому масштабу нужна своя база.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import seed_data
+from sqlalchemy import func
+from app import create_app
+from app import analysis
+from app.db import SessionLocal
+from app.models import Booking, Room
+from app.services.booking_service import calculate_booking, create_booking
+
+EXPORTS = ["bookings.csv", "payments.csv", "transactions.csv"]
+
+
+# -----------------------------
+# Подготовка данных
+# -----------------------------
+def ensure_dataset(bookings: int, seed: int):
+    """Заполняет базу, если в ней ещё нет нужного числа броней."""
+    session = SessionLocal()
+    try:
+        existing = session.query(Booking.id).count()
+    except Exception:
+        existing = 0
+    finally:
+        session.close()
+    if existing >= bookings:
+        return
+
+    rooms = max(50, bookings // 200)
+    seed_data.run(rooms=rooms, customers=max(80, bookings // 10), bookings=bookings,
+                  days=730, seed=seed, batch_size=20000)
+
+
+# -----------------------------
+# Замер
+# -----------------------------
+def measure(fn, iterations: int) -> dict:
+    """
+    Время каждой итерации меряется без tracemalloc (он заметно замедляет код),
+    пиковая память — отдельным прогоном под tracemalloc.
+    """
+    fn(0)  # прогрев: кэши SQLAlchemy, шаблоны Jinja, импорт matplotlib
+
+    timings = []
+    started = time.perf_counter()
+    for i in range(1, iterations + 1):
+        t0 = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn(iterations + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "throughput": iterations / total if total else 0.0,
+        "timings": timings,
+        "peak_memory": peak,
+    }
+
+
+# -----------------------------
+# Сценарии
+# -----------------------------
+def build_cases(quick: bool) -> dict:
+    app = create_app()
+    client = app.test_client()
+
+    session = SessionLocal()
+    try:
+        room_ids = [r.id for r in session.query(Room.id).order_by(Room.id)]
+        customer_id = session.query(Booking.customer_id).first()[0]
+        last_end = session.query(func.max(Booking.end_date)).scalar()
+    finally:
+        session.close()
+
+    rng = random.Random(0)
+    # брони бенчмарка уходят далеко за окно seed_data, чтобы не пересекаться;
+    # база .bench/<масштаб> переиспользуется, поэтому повторный прогон
+    # начинает после броней прошлых прогонов
+    far_future = date.today() + timedelta(days=3650)
+    if last_end and last_end >= far_future:
+        far_future = last_end + timedelta(days=1)
+    heavy = 3 if quick else 10
+    light = 50 if quick else 300
+
+    def bench_calculate(i):
+        calculate_booking({
+            "room_id": rng.choice(room_ids),
+            "guests_count": 2,
+            "nights": 3,
+            "lunch_count": 2,
+            "dinner_count": 1,
+        })
+
+    booking_counter = iter(range(10 ** 9))
+
+    def bench_create(i):
+        n = next(booking_counter)
+        room_id = room_ids[n % len(room_ids)]
+        start = far_future + timedelta(days=3 * (n // len(room_ids)))
+        create_booking({
+            "room_id": room_id,
+            "customer_id": customer_id,
+            "guests_count": 2,
+            "nights": 2,
+            "lunch_count": 0,
+            "dinner_count": 0,
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": (start + timedelta(days=2)).strftime("%Y-%m-%d"),
+        })
+
+    def export(name):
+        def bench(i):
+            response = client.get(f"/admin/download/{name}")
+            for _ in response.response:
+                pass
+            response.close()
+        return bench
+
+    cases = {
+        "calculate_booking": (bench_calculate, light),
+        "create_booking": (bench_create, light),
+    }
+    for name in EXPORTS:
+        cases[f"export:{name}"] = (export(name), heavy)
+    cases["analysis:income_by_category"] = (lambda i: analysis.income_by_category(), heavy)
+    cases["analysis:guests_by_month"] = (lambda i: analysis.guests_by_month(), heavy)
+    cases["analysis:top_rooms"] = (lambda i: analysis.top_rooms(limit=5), heavy)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--plots-dir", required=True)
+    parser.add_argument("--result-file", required=True)
+    parser.add_argument("--only", default="", help="подстрока имени сценария")
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+
+    # графики бенчмарка не должны перезаписывать static/plots
+    analysis.PLOTS_DIR = args.plots_dir
+    os.makedirs(args.plots_dir, exist_ok=True)
+
+    ensure_dataset(args.bookings, args.seed)
+
+    results = {}
+    for name, (fn, iterations) in build_cases(args.quick).items():
+        if args.only and args.only not in name:
+            continue
+        print(f"  {name} ({iterations} итераций)...", flush=True)
+        results[name] = measure(fn, iterations)
+
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+if __name__ == "__main__":
+    main()
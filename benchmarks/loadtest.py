@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+loadtest.py — нагрузочный прогон и воспроизведение записанного трафика.
+
+Примеры:
+    python -m benchmarks.loadtest                                  # тест-клиент Flask, смесь по умолчанию
+    python -m benchmarks.loadtest --concurrency 1,8,32 --requests 2000
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --duration 60
+    python -m benchmarks.loadtest --mix form=20,preview=30,confirm=30,pay=10,cancel=5,export=5
+    python -m benchmarks.loadtest --replay traffic.jsonl --concurrency 16
+
+Формат записи для --replay (одна JSON-строка на запрос):
+    {"method": "POST", "path": "/client/booking/preview", "form": {...}, "ts": 1.25}
+ts — смещение от начала записи в секундах (необязательно; учитывается с --speed).
+Строки без method/path пропускаются. Для /client/booking/confirm без поля quote
+харнесс сначала делает превью с теми же данными и подставляет свежий токен.
+
+Отчёт: для каждого эндпоинта — число запросов, доля ошибок, p50/p90/p99,
+а для подтверждений — доля конфликтов «комната занята».
+"""
+
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.run import percentile
+
+DEFAULT_MIX = "form=25,preview=25,confirm=20,pay=10,cancel=5,export=15"
+EXPORTS = ["bookings.csv", "payments.csv", "transactions.csv"]
+
+CONFLICT_MARKER = "занята"
+ERROR_MARKERS = ("Ошибка", "Некорректн", "не найден")
+
+QUOTE_RE = re.compile(r'name="quote" value="([^"]+)"')
+BOOKING_ID_RE = re.compile(r"ID брони:</strong>\s*(\d+)")
+ROOM_SELECT_RE = re.compile(r'<select name="room_id".*?</select>', re.S)
+CUSTOMER_SELECT_RE = re.compile(r'<select name="customer_id".*?</select>', re.S)
+OPTION_RE = re.compile(r'<option value="(\d+)"')
+
+
+# -----------------------------
+# Транспорт: тест-клиент Flask или живой сервер
+# -----------------------------
+class Response:
+    def __init__(self, status: int, text: str, location: str = None):
+        self.status = status
+        self.text = text
+        self.location = location
+
+
+class TestClientTransport:
+    """Отдельный тест-клиент (со своими cookie) на каждый поток."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def _client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def request(self, method: str, path: str, form: dict = None) -> Response:
+        response = self._client().open(path, method=method, data=form)
+        text = response.get_data(as_text=True)
+        return Response(response.status_code, text, response.headers.get("Location"))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """HTTP к запущенному серверу; cookie (flash-сообщения) — свои у каждого потока."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.local = threading.local()
+
+    def _opener(self):
+        if not hasattr(self.local, "opener"):
+            self.local.opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+            )
+        return self.local.opener
+
+    def request(self, method: str, path: str, form: dict = None) -> Response:
+        body = urllib.parse.urlencode(form).encode() if form is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self._opener().open(req, timeout=60) as resp:
+                return Response(resp.status, resp.read().decode("utf-8", "replace"))
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read().decode("utf-8", "replace"), e.headers.get("Location"))
+
+
+# -----------------------------
+# Статистика
+# -----------------------------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.confirms = 0
+        self.conflicts = 0
+
+    def record(self, endpoint: str, latency: float, error: bool):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            if error:
+                self.errors[endpoint] += 1
+
+    def record_confirm(self, conflict: bool):
+        with self.lock:
+            self.confirms += 1
+            if conflict:
+                self.conflicts += 1
+
+    def report(self, title: str, elapsed: float):
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\n== {title}: {total} запросов за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.1f} rps)")
+        header = f"{'эндпоинт':<36} {'запросов':>9} {'ошибки':>8} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9}"
+        print(header)
+        print("-" * len(header))
+        for endpoint in sorted(self.latencies):
+            values = self.latencies[endpoint]
+            error_rate = self.errors[endpoint] / len(values) * 100
+            print(f"{endpoint:<36} {len(values):>9} {error_rate:>7.1f}% "
+                  f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 90) * 1000:>9.1f} "
+                  f"{percentile(values, 99) * 1000:>9.1f}")
+        if self.confirms:
+            print(f"конфликты бронирования: {self.conflicts}/{self.confirms} "
+                  f"({self.conflicts / self.confirms * 100:.1f}%)")
+
+
+# -----------------------------
+# Сценарии
+# -----------------------------
+class Harness:
+    def __init__(self, transport, stats: Stats, horizon_days: int, seed: int):
+        self.transport = transport
+        self.stats = stats
+        self.horizon_days = horizon_days
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.booking_ids = []
+        self.booking_ids_lock = threading.Lock()
+        self.room_ids, self.customer_ids = self._discover()
+
+    def _discover(self):
+        """Номера и клиенты берутся со страницы формы — как у настоящего браузера."""
+        text = self.transport.request("GET", "/client/booking/form").text
+        rooms = ROOM_SELECT_RE.search(text)
+        customers = CUSTOMER_SELECT_RE.search(text)
+        room_ids = OPTION_RE.findall(rooms.group(0)) if rooms else []
+        customer_ids = OPTION_RE.findall(customers.group(0)) if customers else []
+        if not room_ids:
+            raise SystemExit("На форме брони нет номеров — заполните базу (seed_data.py).")
+        return room_ids, customer_ids
+
+    def _pick(self, seq):
+        with self.rng_lock:
+            return self.rng.choice(seq)
+
+    def _randint(self, a, b):
+        with self.rng_lock:
+            return self.rng.randint(a, b)
+
+    def _timed(self, endpoint: str, method: str, path: str, form: dict = None) -> Response:
+        t0 = time.perf_counter()
+        try:
+            response = self.transport.request(method, path, form)
+        except Exception:
+            self.stats.record(endpoint, time.perf_counter() - t0, True)
+            return None
+        latency = time.perf_counter() - t0
+        error = response.status >= 400
+        self.stats.record(endpoint, latency, error)
+        return response
+
+    def _flashed(self, response: Response) -> str:
+        """Для редиректа после POST забираем страницу с flash-сообщением (вне замера)."""
+        if response is None or response.status not in (301, 302, 303) or not response.location:
+            return ""
+        location = urllib.parse.urlsplit(response.location)
+        path = location.path + (f"?{location.query}" if location.query else "")
+        return self.transport.request("GET", path).text
+
+    def _booking_form(self) -> dict:
+        start = date.today() + timedelta(days=self._randint(1, self.horizon_days))
+        form = {
+            "room_id": self._pick(self.room_ids),
+            "guests_count": "1",
+            "lunch_count": str(self._randint(0, 2)),
+            "dinner_count": str(self._randint(0, 2)),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=self._randint(1, 5))).isoformat(),
+        }
+        if self.customer_ids:
+            form["customer_id"] = self._pick(self.customer_ids)
+        else:
+            form.update(customer_id="new", full_name="Нагрузочный Тест", phone="+79990000000")
+        return form
+
+    def _preview(self, form: dict):
+        response = self._timed("POST /client/booking/preview", "POST", "/client/booking/preview", form)
+        if response is None:
+            return None
+        match = QUOTE_RE.search(response.text)
+        return match.group(1) if match else None
+
+    def _confirm(self, quote: str, endpoint: str = "POST /client/booking/confirm"):
+        response = self._timed(endpoint, "POST", "/client/booking/confirm", {"quote": quote})
+        if response is None:
+            self.stats.record_confirm(False)
+            return
+        match = BOOKING_ID_RE.search(response.text)
+        if match:
+            with self.booking_ids_lock:
+                self.booking_ids.append(match.group(1))
+            self.stats.record_confirm(False)
+            return
+        self.stats.record_confirm(CONFLICT_MARKER in self._flashed(response))
+
+    def _known_booking_id(self) -> str:
+        with self.booking_ids_lock:
+            if self.booking_ids:
+                return self.rng.choice(self.booking_ids)
+        return str(self._randint(1, 100))
+
+    def _post_with_flash(self, endpoint: str, path: str, form: dict):
+        response = self._timed(endpoint, "POST", path, form)
+        text = self._flashed(response)
+        if any(marker in text for marker in ERROR_MARKERS):
+            with self.stats.lock:
+                self.stats.errors[endpoint] += 1
+
+    # -- действия смеси --
+    def action_form(self):
+        self._timed("GET /client/booking/form", "GET", "/client/booking/form")
+
+    def action_preview(self):
+        self._preview(self._booking_form())
+
+    def action_confirm(self):
+        quote = self._preview(self._booking_form())
+        if quote:
+            self._confirm(quote)
+
+    def action_pay(self):
+        self._post_with_flash("POST /client/booking/pay", "/client/booking/pay",
+                              {"booking_id": self._known_booking_id(), "method": "card", "confirm": "yes"})
+
+    def action_cancel(self):
+        self._post_with_flash("POST /client/booking/cancel", "/client/booking/cancel",
+                              {"booking_id": self._known_booking_id()})
+
+    def action_export(self):
+        name = self._pick(EXPORTS)
+        self._timed(f"GET /admin/download/{name}", "GET", f"/admin/download/{name}")
+
+    # -- воспроизведение --
+    def replay(self, entry: dict):
+        method = entry["method"].upper()
+        path = entry["path"]
+        form = entry.get("form")
+        endpoint = f"{method} {urllib.parse.urlsplit(path).path}"
+        if path.startswith("/client/booking/confirm") and form is not None and "quote" not in form:
+            quote = self._preview(form)
+            if quote:
+                self._confirm(quote, endpoint)
+            return
+        if path.startswith("/client/booking/confirm"):
+            self._confirm((form or {}).get("quote", ""), endpoint)
+            return
+        self._timed(endpoint, method, path, form)
+
+
+# -----------------------------
+# Запуск
+# -----------------------------
+def parse_mix(value: str) -> list:
+    mix = []
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Harness, f"action_{name}"):
+            raise SystemExit(f"Неизвестное действие в --mix: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def load_replay(path: str) -> list:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, dict) and entry.get("method") and entry.get("path"):
+                entries.append(entry)
+    return entries
+
+
+def run_mix(harness: Harness, mix: list, concurrency: int, requests: int, duration: float):
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    deadline = time.perf_counter() + duration if duration else None
+    counter = iter(range(requests if not duration else 10 ** 12))
+    counter_lock = threading.Lock()
+
+    def worker():
+        rng = random.Random()
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            if deadline and time.perf_counter() > deadline:
+                return
+            getattr(harness, f"action_{rng.choices(names, weights)[0]}")()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+
+
+def run_replay(harness: Harness, entries: list, concurrency: int, speed: float):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for entry in entries:
+            if speed and "ts" in entry:
+                delay = float(entry["ts"]) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(harness.replay, entry))
+        for future in futures:
+            future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест и воспроизведение трафика.")
+    parser.add_argument("--url", default="", help="адрес запущенного сервера; по умолчанию тест-клиент Flask")
+    parser.add_argument("--concurrency", default="1,8,32", help="уровни параллельности через запятую")
+    parser.add_argument("--requests", type=int, default=500, help="действий на каждый уровень")
+    parser.add_argument("--duration", type=float, default=0, help="длительность уровня в секундах (вместо --requests)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса действий: form,preview,confirm,pay,cancel,export")
+    parser.add_argument("--replay", default="", help="JSONL с записанными запросами")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="темп воспроизведения по ts (1 = как в записи, 0 = без пауз)")
+    parser.add_argument("--horizon", type=int, default=90, help="на сколько дней вперёд выбирать даты брони")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        from app import create_app
+        transport = TestClientTransport(create_app())
+
+    entries = load_replay(args.replay) if args.replay else None
+    if args.replay and not entries:
+        raise SystemExit(f"В {args.replay} нет записей с method/path.")
+    mix = parse_mix(args.mix)
+
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        stats = Stats()
+        harness = Harness(transport, stats, args.horizon, args.seed)
+        started = time.perf_counter()
+        if entries:
+            run_replay(harness, entries, concurrency, args.speed)
+            title = f"replay {args.replay}, параллельность {concurrency}"
+        else:
+            run_mix(harness, mix, concurrency, args.requests, args.duration)
+            title = f"смесь, параллельность {concurrency}"
+        stats.report(title, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
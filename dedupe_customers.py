@@ -0,0 +1,56 @@
+"""
+dedupe_customers.py — поиск и слияние дубликатов клиентов.
+
+Примеры:
+    python dedupe_customers.py                      # показать группы дубликатов
+    python dedupe_customers.py --csv duplicates.csv # выгрузить кандидатов
+    python dedupe_customers.py --fuzzy --csv fuzzy.csv
+    python dedupe_customers.py --merge              # перенести брони и удалить дубликаты
+"""
+
+import argparse
+import csv
+
+from app.db import SessionLocal, write_engine
+from app.services.customer_dedupe import find_duplicates, merge_duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск и слияние дубликатов клиентов.")
+    parser.add_argument("--csv", help="сохранить группы-кандидаты в CSV")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="искать и похожие ФИО с опечаткой в телефоне (проверьте перед слиянием)")
+    parser.add_argument("--merge", action="store_true", help="слить найденные группы")
+    parser.add_argument("--limit", type=int, default=20, help="сколько групп показать")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        groups = find_duplicates(session, fuzzy=args.fuzzy)
+        print(f"Групп дубликатов: {len(groups)}, лишних записей: {sum(len(g.duplicate_ids) for g in groups)}")
+        for group in groups[:args.limit]:
+            print(f"  {group.primary_id} ← {', '.join(map(str, group.duplicate_ids))} ({', '.join(group.reasons)})")
+
+        if args.csv:
+            with open(args.csv, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["primary_id", "duplicate_id", "reasons"])
+                for group in groups:
+                    for duplicate_id in group.duplicate_ids:
+                        writer.writerow([group.primary_id, duplicate_id, ";".join(group.reasons)])
+            print(f"Кандидаты сохранены в {args.csv}")
+
+    finally:
+        session.close()
+
+    if args.merge and groups:
+        session = SessionLocal(bind=write_engine)
+        try:
+            result = merge_duplicates(session, groups)
+        finally:
+            session.close()
+        print(f"Перенесено броней: {result['bookings_moved']}, удалено клиентов: {result['customers_removed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+import_customers.py — массовый импорт клиентов из CSV или JSONL.
+
+Примеры:
+    python import_customers.py partners.csv
+    python import_customers.py agency.jsonl --batch-size 10000
+    python import_customers.py partners.csv --dry-run     # только проверка
+"""
+
+import argparse
+import os
+
+from app.services.customer_import import FORMATS, import_customers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт клиентов с проверкой и удалением дубликатов.")
+    parser.add_argument("path", help="файл CSV (full_name, phone, email) или JSONL")
+    parser.add_argument("--format", choices=FORMATS, help="формат файла (по умолчанию — по расширению)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="записей в одной пачке INSERT")
+    parser.add_argument("--dry-run", action="store_true", help="проверить файл, ничего не записывая")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if os.path.splitext(args.path)[1].lower() in (".jsonl", ".ndjson") else "csv")
+    with open(args.path, encoding="utf-8-sig", newline="") as stream:
+        report = import_customers(stream, fmt, batch_size=args.batch_size, dry_run=args.dry_run)
+
+    print(f"Записей: {report.total}")
+    print(f"Добавлено: {report.inserted}{' (dry run)' if args.dry_run else ''}")
+    print(f"Дубликатов: {report.duplicates}")
+    print(f"С ошибками: {report.invalid}")
+    for message in report.errors:
+        print("  " + message)
+
+
+if __name__ == "__main__":
+    main()
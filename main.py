@@ -1,6 +1,19 @@
+import argparse
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Запуск веб-приложения.")
+    parser.add_argument("--prod", action="store_true", help="многопроцессный сервер gunicorn вместо отладочного")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию SERVER_WORKERS)")
+    parser.add_argument("--threads", type=int, help="потоков в процессе (по умолчанию SERVER_THREADS)")
+    parser.add_argument("--bind", help="адрес:порт (по умолчанию SERVER_BIND)")
+    args = parser.parse_args()
+
+    if args.prod:
+        from app.server import serve
+        serve(app, workers=args.workers, threads=args.threads, bind=args.bind)
+    else:
+        app.run(debug=app.config["DEBUG"])
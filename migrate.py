@@ -0,0 +1,34 @@
+"""
+migrate.py — миграции схемы базы данных.
+
+Примеры:
+    python migrate.py             # применить все недостающие
+    python migrate.py --status    # что применено, что нет
+    python migrate.py --to 1      # применить миграции до 0001 включительно
+"""
+
+import argparse
+
+from app.db import engine, init_db
+from app.migrations import migrate, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Применение миграций схемы.")
+    parser.add_argument("--status", action="store_true", help="показать состояние миграций и выйти")
+    parser.add_argument("--to", type=int, help="последняя применяемая версия")
+    args = parser.parse_args()
+
+    if args.status:
+        for version, name, applied_at in status(engine):
+            mark = f"применена {applied_at:%Y-%m-%d %H:%M}" if applied_at else "не применена"
+            print(f"{version:04d}_{name}: {mark}")
+        return
+
+    init_db()
+    done = migrate(engine, target=args.to)
+    print(f"Применено миграций: {len(done)}" if done else "Схема актуальна.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,179 +1,350 @@
+"""
+seed_data.py — генератор тестовых данных произвольного объёма.
+
+Примеры:
+    python seed_data.py                                  # 50 номеров, 80 клиентов, 100 броней
+    python seed_data.py --rooms 5000 --customers 1000000 --bookings 10000000 --days 3650
+    python seed_data.py --bookings 100000 --seed 7 --batch-size 20000
+
+Генерация детерминирована (--seed), расписание каждого номера строится без
+пересечений. Данные пишутся пачками: на PostgreSQL через COPY, на остальных
+СУБД — через executemany (INSERT ... VALUES пачкой).
+"""
+
+import argparse
+import csv
+import io
 import random
-from datetime import datetime, timedelta, date
+import time
+from datetime import date, timedelta
+
 from faker import Faker
+from sqlalchemy import func, insert, select, text
 
-from app.db import SessionLocal
+from app.config import Config
+from app.db import SessionLocal, engine, init_db
 from app.models import Category, Room, Customer, Booking, Payment, Transaction
 
-fake = Faker("ru_RU")
-db = SessionLocal()
-
-BREAKFAST_PRICE = 0      # завтрак включён
-LUNCH_PRICE = 600
-DINNER_PRICE = 800
+# цены питания — те же, что при расчёте брони (завтрак включён)
+BREAKFAST_PRICE = Config.BREAKFAST_PRICE
+LUNCH_PRICE = Config.LUNCH_PRICE
+DINNER_PRICE = Config.DINNER_PRICE
+
+CATEGORIES = [
+    ("Стандарт", "Базовый номер для 1–2 гостей", 3500),
+    ("Комфорт", "Улучшенный номер с рабочей зоной", 4500),
+    ("Семейный", "Большой номер для семьи", 6000),
+    ("Люкс", "Просторный номер с гостиной", 9000),
+    ("Премиум Люкс", "VIP номер с панорамным видом", 15000),
+]
+
+BOOKING_COLUMNS = [
+    "id", "room_id", "customer_id", "start_date", "end_date", "created_at",
+    "guests_count", "breakfast_count", "lunch_count", "dinner_count",
+    "is_repeat_within_year", "discount_repeat", "discount_nights",
+    "total_amount", "final_amount", "status",
+]
+PAYMENT_COLUMNS = ["id", "booking_id", "amount", "payment_date", "method", "status"]
+TRANSACTION_COLUMNS = ["id", "payment_id", "amount", "transaction_date", "type"]
+CUSTOMER_COLUMNS = ["id", "full_name", "phone", "email"]
+
+# размер пула сгенерированных Faker имён: Faker на каждую строку слишком медленный
+NAME_POOL_SIZE = 5000
 
 
 # -----------------------------
-# 1. Категории
+# Загрузка пачками
 # -----------------------------
-def seed_categories():
-    categories = [
-        ("Стандарт", "Базовый номер для 1–2 гостей", 3500),
-        ("Комфорт", "Улучшенный номер с рабочей зоной", 4500),
-        ("Семейный", "Большой номер для семьи", 6000),
-        ("Люкс", "Просторный номер с гостиной", 9000),
-        ("Премиум Люкс", "VIP номер с панорамным видом", 15000),
-    ]
-
-    for name, desc, price in categories:
-        db.add(Category(name=name, description=desc, base_price=price))
-
-    db.commit()
-    print("Категории созданы.")
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _copy_rows(conn, table_name: str, columns: list, rows: list):
+    """COPY ... FROM STDIN для PostgreSQL (psycopg2)."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+    finally:
+        cursor.close()
 
 
-# -----------------------------
-# 2. Номера
-# -----------------------------
-def seed_rooms():
-    categories = db.query(Category).all()
-
-    for i in range(1, 51):
-        category = random.choice(categories)
-        room = Room(
-            number=i,
-            category_id=category.id,
-            capacity=random.choice([1, 2, 3, 4]),
-            price_per_night=category.base_price + random.randint(0, 2000)
-        )
-        db.add(room)
+def _insert_rows(conn, table, columns: list, rows: list, use_copy: bool):
+    if not rows:
+        return
+    if use_copy:
+        _copy_rows(conn, table.name, columns, rows)
+    else:
+        conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
 
-    db.commit()
-    print("50 номеров созданы.")
 
+def _supports_copy(conn) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    cursor = conn.connection.cursor()
+    try:
+        return hasattr(cursor, "copy_expert")
+    finally:
+        cursor.close()
 
-# -----------------------------
-# 3. Клиенты
-# -----------------------------
-def seed_customers():
-    for _ in range(80):
-        customer = Customer(
-            full_name=fake.name(),
-            phone=fake.phone_number(),
-            email=fake.email()
-        )
-        db.add(customer)
 
-    db.commit()
-    print("80 клиентов созданы.")
+def _reset_sequences(conn):
+    """После вставки с явными id выравниваем последовательности PostgreSQL."""
+    if engine.dialect.name != "postgresql":
+        return
+    for model in (Category, Room, Customer, Booking, Payment, Transaction):
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
 
 
 # -----------------------------
-# 4. Бронирования
+# 1. Категории
 # -----------------------------
-def seed_bookings():
-    rooms = db.query(Room).all()
-    customers = db.query(Customer).all()
-
-    for _ in range(100):
-        room = random.choice(rooms)
-        customer = random.choice(customers)
-
-        start_date = fake.date_between(start_date="-6M", end_date="today")
-        end_date = start_date + timedelta(days=random.randint(1, 14))
-        nights = (end_date - start_date).days
-        guests = random.randint(1, room.capacity)
-
-        # питание
-        breakfast_count = guests * nights
-        lunch_selected = random.choice([True, False])
-        dinner_selected = random.choice([True, False])
-
-        lunch_count = guests * nights if lunch_selected else 0
-        dinner_count = guests * nights if dinner_selected else 0
-
-        # скидки
-        is_repeat = random.choice([True, False])
-        discount_repeat = 5.0 if is_repeat else 0.0
-        discount_nights = 5.0 if nights >= 3 else 0.0
-        discount_sum = discount_repeat + discount_nights
-
-        # расчёт стоимости
-        base_amount = nights * room.price_per_night
-        meals_total = (
-            breakfast_count * BREAKFAST_PRICE +
-            lunch_count * LUNCH_PRICE +
-            dinner_count * DINNER_PRICE
-        )
-        subtotal = base_amount + meals_total
-        final_amount = round(subtotal * (1 - discount_sum / 100))
-
-        status = random.choice(["created", "paid", "cancelled"])
-
-        booking = Booking(
-            room_id=room.id,
-            customer_id=customer.id,
-            start_date=start_date,
-            end_date=end_date,
-            created_at=start_date - timedelta(days=random.randint(1, 30)),
-            guests_count=guests,
-            breakfast_count=breakfast_count,
-            lunch_count=lunch_count,
-            dinner_count=dinner_count,
-            is_repeat_within_year=is_repeat,
-            discount_repeat=discount_repeat,
-            discount_nights=discount_nights,
-            total_amount=subtotal,
-            final_amount=final_amount,
-            status=status
-        )
+def seed_categories(session):
+    if session.query(Category.id).first():
+        print("Категории уже есть — пропускаем.")
+        return
 
-        db.add(booking)
+    for name, desc, price in CATEGORIES:
+        session.add(Category(name=name, description=desc, base_price=price))
 
-    db.commit()
-    print("100 бронирований созданы.")
+    session.commit()
+    print("Категории созданы.")
 
 
 # -----------------------------
-# 5. Платежи и транзакции
+# 2. Номера
 # -----------------------------
-def seed_payments_and_transactions():
-    bookings = db.query(Booking).all()
+def seed_rooms(session, rng: random.Random, count: int):
+    if count <= 0:
+        return
+    categories = session.query(Category).order_by(Category.id).all()
+    first_number = (session.query(func.max(Room.number)).scalar() or 0) + 1
+
+    rows = []
+    for number in range(first_number, first_number + count):
+        category = rng.choice(categories)
+        rows.append({
+            "number": number,
+            "category_id": category.id,
+            "capacity": rng.choice([1, 2, 3, 4]),
+            "price_per_night": category.base_price + rng.randint(0, 2000),
+        })
+    session.execute(insert(Room.__table__), rows)
+    session.commit()
+    print(f"{count} номеров созданы.")
 
-    for booking in bookings:
-        if booking.status != "paid":
-            continue
 
-        payment = Payment(
-            booking_id=booking.id,
-            amount=booking.final_amount,
-            payment_date=booking.start_date,
-            method=random.choice(["cash", "card", "online", "bank"]),
-            status="success"
-        )
-        db.add(payment)
-        db.commit()
-
-        transaction = Transaction(
-            payment_id=payment.id,
-            amount=payment.amount,
-            transaction_date=payment.payment_date,
-            type="income"
-        )
-        db.add(transaction)
+# -----------------------------
+# 3. Клиенты
+# -----------------------------
+def seed_customers(session, rng: random.Random, fake: Faker, count: int,
+                   batch_size: int, use_copy: bool):
+    if count <= 0:
+        return
+    names = [fake.name() for _ in range(min(count, NAME_POOL_SIZE))]
+    domains = [fake.free_email_domain() for _ in range(20)]
+
+    conn = session.connection()
+    next_id = _next_id(conn, Customer)
+    batch = []
+    for customer_id in range(next_id, next_id + count):
+        # телефон и email выводим из id — уникальны и воспроизводимы
+        phone = f"+79{customer_id % 1_000_000_000:09d}"
+        email = f"guest{customer_id}@{rng.choice(domains)}"
+        batch.append((customer_id, rng.choice(names), phone, email))
+        if len(batch) >= batch_size:
+            _insert_rows(conn, Customer.__table__, CUSTOMER_COLUMNS, batch, use_copy)
+            session.commit()
+            conn = session.connection()
+            batch = []
+    _insert_rows(conn, Customer.__table__, CUSTOMER_COLUMNS, batch, use_copy)
+    session.commit()
+    print(f"{count} клиентов созданы.")
 
-    db.commit()
-    print("Платежи и транзакции созданы.")
+
+# -----------------------------
+# 4. Бронирования, платежи и транзакции
+# -----------------------------
+def _room_schedules(session, rooms, count: int, days: int):
+    """
+    Распределяет count броней по номерам и возвращает для каждого номера
+    (room, сколько броней, с какой даты можно начинать, длина слота в днях).
+    """
+    last_end = dict(
+        session.query(Booking.room_id, func.max(Booking.end_date))
+        .group_by(Booking.room_id).all()
+    )
+    per_room, extra = divmod(count, len(rooms))
+    window_start = date.today() - timedelta(days=days // 2)
+
+    schedules = []
+    for i, room in enumerate(rooms):
+        n = per_room + (1 if i < extra else 0)
+        if n == 0:
+            continue
+        slot = days // n
+        if slot < 1:
+            raise SystemExit(
+                f"{n} броней не помещаются в {days} дней для одного номера: "
+                f"увеличьте --rooms или --days."
+            )
+        cursor = max(window_start, last_end.get(room.id) or window_start)
+        schedules.append((room, n, cursor, slot))
+    return schedules
+
+
+def _booking_row(rng: random.Random, booking_id: int, room, customer_id: int,
+                 start_date: date, nights: int) -> tuple:
+    end_date = start_date + timedelta(days=nights)
+    guests = rng.randint(1, room.capacity)
+
+    # питание
+    breakfast_count = guests * nights
+    lunch_count = guests * nights if rng.random() < 0.5 else 0
+    dinner_count = guests * nights if rng.random() < 0.5 else 0
+
+    # скидки
+    is_repeat = rng.random() < 0.5
+    discount_repeat = 5.0 if is_repeat else 0.0
+    discount_nights = 5.0 if nights >= 3 else 0.0
+    discount_sum = discount_repeat + discount_nights
+
+    # расчёт стоимости
+    base_amount = nights * room.price_per_night
+    meals_total = (
+        breakfast_count * BREAKFAST_PRICE +
+        lunch_count * LUNCH_PRICE +
+        dinner_count * DINNER_PRICE
+    )
+    subtotal = base_amount + meals_total
+    final_amount = round(subtotal * (1 - discount_sum / 100))
+
+    status = rng.choice(["created", "paid", "cancelled"])
+
+    return (
+        booking_id, room.id, customer_id, start_date, end_date,
+        start_date - timedelta(days=rng.randint(1, 30)),
+        guests, breakfast_count, lunch_count, dinner_count,
+        is_repeat, discount_repeat, discount_nights,
+        subtotal, final_amount, status,
+    )
+
+
+def seed_bookings(session, rng: random.Random, count: int, days: int,
+                  batch_size: int, use_copy: bool):
+    """
+    Брони генерируются по расписанию каждого номера: следующая начинается
+    не раньше окончания предыдущей, поэтому пересечений нет. Для оплаченных
+    броней сразу создаются платёж и транзакция дохода.
+    """
+    if count <= 0:
+        return
+    rooms = session.query(Room).order_by(Room.id).all()
+    min_customer, max_customer = session.query(
+        func.min(Customer.id), func.max(Customer.id)
+    ).one()
+    if not rooms or min_customer is None:
+        raise SystemExit("Нет номеров или клиентов — сначала создайте их.")
+
+    conn = session.connection()
+    booking_id = _next_id(conn, Booking)
+    payment_id = _next_id(conn, Payment)
+    transaction_id = _next_id(conn, Transaction)
+
+    bookings, payments, transactions = [], [], []
+    created = 0
+
+    def flush():
+        nonlocal conn, bookings, payments, transactions
+        _insert_rows(conn, Booking.__table__, BOOKING_COLUMNS, bookings, use_copy)
+        _insert_rows(conn, Payment.__table__, PAYMENT_COLUMNS, payments, use_copy)
+        _insert_rows(conn, Transaction.__table__, TRANSACTION_COLUMNS, transactions, use_copy)
+        session.commit()
+        conn = session.connection()
+        bookings, payments, transactions = [], [], []
+
+    for room, n, cursor, slot in _room_schedules(session, rooms, count, days):
+        max_nights = max(1, min(14, slot))
+        for _ in range(n):
+            nights = rng.randint(1, max_nights)
+            start_date = cursor + timedelta(days=rng.randint(0, slot - nights))
+            row = _booking_row(rng, booking_id, room,
+                               rng.randint(min_customer, max_customer),
+                               start_date, nights)
+            bookings.append(row)
+            cursor += timedelta(days=slot)
+
+            if row[-1] == "paid":
+                amount = row[14]
+                payments.append((payment_id, booking_id, amount, start_date,
+                                 rng.choice(["cash", "card", "online", "bank"]), "success"))
+                transactions.append((transaction_id, payment_id, amount, start_date, "income"))
+                payment_id += 1
+                transaction_id += 1
+
+            booking_id += 1
+            created += 1
+            if len(bookings) >= batch_size:
+                flush()
+                print(f"  ... {created} броней")
+    flush()
+    print(f"{created} бронирований с платежами и транзакциями созданы.")
 
 
 # -----------------------------
 # Запуск
 # -----------------------------
-if __name__ == "__main__":
-    seed_categories()
-    seed_rooms()
-    seed_customers()
-    seed_bookings()
-    seed_payments_and_transactions()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор тестовых данных для базы отеля.")
+    parser.add_argument("--rooms", type=int, default=50, help="сколько номеров добавить")
+    parser.add_argument("--customers", type=int, default=80, help="сколько клиентов добавить")
+    parser.add_argument("--bookings", type=int, default=100, help="сколько броней добавить")
+    parser.add_argument("--days", type=int, default=365,
+                        help="длина календаря в днях, в который укладываются брони (половина — в прошлом)")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генератора случайных чисел")
+    parser.add_argument("--batch-size", type=int, default=10000, help="строк в одной пачке")
+    parser.add_argument("--no-copy", action="store_true",
+                        help="не использовать COPY на PostgreSQL (только INSERT пачками)")
+    return parser.parse_args(argv)
+
+
+def run(rooms: int = 50, customers: int = 80, bookings: int = 100, days: int = 365,
+        seed: int = 42, batch_size: int = 10000, use_copy: bool = True):
+    rng = random.Random(seed)
+    Faker.seed(seed)
+    fake = Faker("ru_RU")
+
+    init_db()
+    session = SessionLocal()
+    try:
+        use_copy = use_copy and _supports_copy(session.connection())
+        started = time.perf_counter()
+
+        seed_categories(session)
+        seed_rooms(session, rng, rooms)
+        seed_customers(session, rng, fake, customers, batch_size, use_copy)
+        seed_bookings(session, rng, bookings, days, batch_size, use_copy)
+
+        _reset_sequences(session.connection())
+        session.commit()
+        print(f"\nГотово за {time.perf_counter() - started:.1f} с.")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
 
-    print("\nГотово! База данных заполнена тестовыми данными.")
\ No newline at end of file
+if __name__ == "__main__":
+    args = parse_args()
+    run(rooms=args.rooms, customers=args.customers, bookings=args.bookings,
+        days=args.days, seed=args.seed, batch_size=args.batch_size,
+        use_copy=not args.no_copy)
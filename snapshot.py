@@ -0,0 +1,49 @@
+"""
+snapshot.py — колоночный снимок броней для аналитики.
+
+Аналитика обновляет снимок сама (дописывает новые брони, перестраивает
+после изменений), скрипт нужен, чтобы построить его заранее — например,
+после развёртывания или по расписанию, — и посмотреть состояние.
+
+Примеры:
+    python snapshot.py              # дописать новые брони / перестроить при изменениях
+    python snapshot.py --rebuild    # построить заново
+    python snapshot.py --info       # поколение, строки, возраст
+"""
+
+import argparse
+import time
+
+from app.config import Config
+from app.db import ReadSessionLocal, init_db
+from app.services.snapshot import load_meta, rebuild, refresh
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок броней для аналитики.")
+    parser.add_argument("--rebuild", action="store_true", help="построить снимок заново")
+    parser.add_argument("--info", action="store_true", help="показать состояние снимка и выйти")
+    args = parser.parse_args()
+
+    if not args.info:
+        init_db()
+        session = ReadSessionLocal()
+        try:
+            started = time.perf_counter()
+            meta = rebuild(session) if args.rebuild else refresh(session)
+            print(f"Готово за {time.perf_counter() - started:.2f} с")
+        finally:
+            session.close()
+
+    meta = load_meta()
+    if meta is None:
+        print(f"Снимка нет ({Config.SNAPSHOT_DIR})")
+        return
+    print(f"{Config.SNAPSHOT_DIR}: поколение {meta['generation']}, строк {meta['rows']}, "
+          f"max(id) {meta['max_id']}")
+    print(f"построен {time.time() - meta['built_at']:.0f} с назад, "
+          f"обновлён {time.time() - meta['refreshed_at']:.0f} с назад")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+sync_replica.py — локальная «реплика» SQLite для проверки чтения с реплик.
+
+Копирует основную базу (DATABASE_URL, файл SQLite) в файл реплики через
+backup API SQLite — согласованный снимок без остановки приложения. С
+--interval копирует повторно, имитируя асинхронную репликацию с задержкой;
+без --interval реплика «отстаёт» всё больше и через REPLICA_MAX_LAG_SECONDS
+чтение вернётся на основную базу.
+
+В продакшне реплики — потоковая репликация PostgreSQL, этот скрипт не нужен.
+
+Примеры:
+    python sync_replica.py instance/replica.db
+    python sync_replica.py instance/replica.db --interval 5
+    DATABASE_REPLICA_URLS=sqlite:///instance/replica.db python main.py
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+from app.config import Config
+from app.db import init_db, router
+
+
+def copy_database(source: str, target: str):
+    # копируем прямо в файл реплики: backup пишет его одной транзакцией,
+    # открытые соединения приложения видят либо старый, либо новый снимок
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target, timeout=Config.SQLITE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Копия основной базы SQLite в файл реплики.")
+    parser.add_argument("target", help="файл реплики")
+    parser.add_argument("--interval", type=float, help="повторять каждые N секунд")
+    args = parser.parse_args()
+
+    url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        parser.error("нужна основная база в файле SQLite (DATABASE_URL=sqlite:///...)")
+
+    init_db()
+    while True:
+        # свежий «пульс» попадает в копию: отставание реплики считается от него
+        router.beat()
+        copy_database(url.database, args.target)
+        print(f"{time.strftime('%H:%M:%S')} {url.database} → {args.target}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()